@@ -20,7 +20,7 @@ setup(
 
             # --- 3. 资源文件包含 ---
             'include_patterns': [
-                '**/*.pkl',      # 缓存文件
+                '**/*.bin',      # 3D 词库
                 '**/*.mp3',      # 音乐
                 '**/*.wav',      # 音效
                 '**/*.otf',      # 字体 otf
@@ -0,0 +1,149 @@
+"""
+演出回放基准测试 (Benchmark)
+以无窗口确定性模式完整回放一份表演脚本, 统计每帧模拟耗时与各阶段耗时, 结果输出为 JSON,
+便于对比不同版本, 在正式演出前发现 ParticleSystem / ExplosionStrategies 的性能退化.
+
+用法 (在 src 目录下):
+    python benchmark.py [脚本路径] [--seed 0] [--fps 60] [--duration 70] [--out result.json]
+                        [--per-frame] [--compare baseline.json] [--cull]
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from headless import HeadlessShow
+from main import ParticleSystem, load_script, prepare_text_resources
+
+PHASES = ("director", "firework", "particle", "cleanup")
+
+
+def _percentiles(ms):
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"mean": float(ms.mean()), "p50": float(p50), "p95": float(p95), "p99": float(p99),
+            "max": float(ms.max())}
+
+
+def _count_stats(values):
+    return {"peak": int(values.max()), "mean": float(values.mean())}
+
+
+def run_benchmark(data, seed=0, fps=60, duration=None, per_frame=False, cull=False):
+    """
+    回放脚本并返回测量结果
+    Args:
+        data (dict): 表演脚本
+        per_frame (bool): 结果中是否包含逐帧耗时
+        cull (bool): 按摄像机视锥剔除爆炸的视觉更新, 并统计每帧节省的粒子数
+    Returns:
+        dict: 可直接序列化为 JSON 的测量结果
+    """
+    show = HeadlessShow(data, seed=seed, fps=fps, cull=cull)
+    store = ParticleSystem.store
+    timings = {}
+    frame_ms, live, ghosts, fireworks, culled, far = [], [], [], [], [], []
+
+    clock = time.perf_counter
+    wall = clock()
+    while not show.finished:
+        if duration is not None and show.time >= duration:
+            break
+        t0 = clock()
+        show.step(timings)
+        frame_ms.append((clock() - t0) * 1000.0)
+        live.append(store.live_count)
+        ghosts.append(store.trails.active_count)
+        fireworks.append(len(ParticleSystem.fireworks))
+        culled.append(store.cull_stats["culled"])
+        far.append(store.cull_stats["far"])
+    wall = clock() - wall
+
+    frames = len(frame_ms)
+    if frames == 0:
+        raise ValueError("脚本没有产生任何帧")
+    frame_ms = np.array(frame_ms)
+    sim_seconds = show.time
+    total = frame_ms.sum()
+
+    result = {
+        "seed": seed,
+        "fps": fps,
+        "frames": frames,
+        "sim_seconds": round(sim_seconds, 6),
+        "wall_seconds": wall,
+        "frame_ms": _percentiles(frame_ms),
+        "phases_ms": {
+            name: {"total": timings.get(name, 0.0) * 1000.0,
+                   "per_frame": timings.get(name, 0.0) * 1000.0 / frames,
+                   "share": timings.get(name, 0.0) * 1000.0 / total if total else 0.0}
+            for name in PHASES
+        },
+        # 旧版的残影粒子 (ghost) 已由轨迹条带取代, 这里统计活动轨迹数
+        "live_particles": _count_stats(np.array(live)),
+        "ghosts": _count_stats(np.array(ghosts)),
+        "fireworks": _count_stats(np.array(fireworks)),
+        "spawned": store.spawned,
+        "spawns_per_sec": store.spawned / sim_seconds if sim_seconds else 0.0,
+        "dropped": store.dropped,
+        "evicted": store.evicted,
+        "final_digest": show.snapshot()["digest"],
+    }
+    if cull:
+        # 每帧跳过视觉更新 (视锥外) 与丢弃轨迹/闪烁 (远处) 的粒子数
+        result["culled_particles"] = _count_stats(np.array(culled))
+        result["far_particles"] = _count_stats(np.array(far))
+    if per_frame:
+        result["per_frame_ms"] = [round(v, 4) for v in frame_ms.tolist()]
+    return result
+
+
+def compare(result, baseline):
+    """与基准结果对比主要耗时指标, 返回 {指标: 变化比例}"""
+    diff = {}
+    for key in ("mean", "p50", "p95", "p99"):
+        old = baseline["frame_ms"][key]
+        diff[f"frame_ms.{key}"] = (result["frame_ms"][key] - old) / old if old else 0.0
+    for name in PHASES:
+        old = baseline["phases_ms"][name]["per_frame"]
+        diff[f"phases_ms.{name}"] = (result["phases_ms"][name]["per_frame"] - old) / old if old else 0.0
+    if result["final_digest"] != baseline.get("final_digest"):
+        print("[Benchmark] 注意: 最终状态摘要与基准不同, 模拟结果已发生变化")
+    return diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description="烟花演出回放基准测试")
+    parser.add_argument("script", nargs="?", help="表演脚本路径 (默认 config/config.json)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--duration", type=float, default=None, help="最长回放秒数")
+    parser.add_argument("--out", help="结果 JSON 输出路径 (默认打印到标准输出)")
+    parser.add_argument("--per-frame", action="store_true", help="输出逐帧耗时")
+    parser.add_argument("--compare", help="与之前保存的结果 JSON 对比")
+    parser.add_argument("--cull", action="store_true", help="按摄像机视锥剔除, 并统计剔除的粒子数")
+    args = parser.parse_args()
+
+    data = load_script(args.script)
+    prepare_text_resources(data)
+    result = run_benchmark(data, seed=args.seed, fps=args.fps, duration=args.duration,
+                           per_frame=args.per_frame, cull=args.cull)
+    result["script"] = args.script or "config/config.json"
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            result["compare"] = compare(result, json.load(f))
+
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+        fm = result["frame_ms"]
+        print(f"[Benchmark] {result['frames']} 帧, p50 {fm['p50']:.2f} ms, p95 {fm['p95']:.2f} ms, "
+              f"p99 {fm['p99']:.2f} ms -> {args.out}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+泛光 (Bloom) 的 GLSL 实现
+Panda3D 1.10 的 CommonFilters 只提供 Cg 着色器, 在 Cg 运行库不支持的驱动上 (例如无显卡机器上的
+Mesa 软件渲染 llvmpipe) 无法编译, 画面会缺失泛光甚至不完整.
+这里按 CommonFilters.setBloom() 相同的步骤与参数用 GLSL 1.30 重新实现:
+    亮度提取 (1/2 分辨率) -> 缩小到 1/scale -> 横向模糊 -> 纵向模糊 -> 与原画面做屏幕混合
+
+中间纹理可能被补齐为 2 的幂, 有效区域只占左下角; Cg 版本用 texpad_* 换算, GLSL 中没有对应的输入,
+因此每个采样源的有效尺寸 (*_size) 由这里按窗口尺寸计算后传入, 窗口尺寸变化时重新设置.
+"""
+from direct.filter.FilterManager import FilterManager
+from direct.showbase.DirectObject import DirectObject
+from panda3d.core import Shader, Texture
+
+_QUAD_VERTEX = """
+#version 130
+uniform mat4 p3d_ModelViewProjectionMatrix;
+in vec4 p3d_Vertex;
+in vec2 p3d_MultiTexCoord0;
+out vec2 uv;
+
+void main() {
+    gl_Position = p3d_ModelViewProjectionMatrix * p3d_Vertex;
+    uv = p3d_MultiTexCoord0;
+}
+"""
+
+# 2x2 采样求平均; 亮度 = dot(颜色 - (0,0,0,0.5), blend), 在 [min, max] 触发区间内线性增强
+_BRIGHT_PASS = """
+#version 130
+uniform sampler2D src;
+uniform vec2 src_size;
+uniform vec4 blend;
+uniform vec4 trigger;
+uniform float desat;
+in vec2 uv;
+out vec4 o_color;
+
+vec4 bright(vec2 at) {
+    vec4 c = texture(src, at) - vec4(0, 0, 0, 0.5);
+    float scale = clamp((dot(c, blend) - trigger.x) * trigger.y, 0.0, 1.0);
+    return scale * mix(c, vec4(1), desat);
+}
+
+void main() {
+    vec2 px = 0.5 / vec2(textureSize(src, 0));
+    vec2 c = uv * src_size * px * 2.0;
+    o_color = (bright(c + vec2(px.x, -px.y)) + bright(c + px) + bright(c - px) + bright(c + vec2(-px.x, px.y))) * 0.25;
+}
+"""
+
+_DOWNSAMPLE = """
+#version 130
+uniform sampler2D src;
+uniform vec2 src_size;
+uniform float taps;
+in vec2 uv;
+out vec4 o_color;
+
+void main() {
+    vec2 px = 1.0 / vec2(textureSize(src, 0));
+    vec2 c = uv * src_size * px;
+    if (taps < 4.0) {
+        o_color = texture(src, c);
+        return;
+    }
+    o_color = texture(src, c + vec2(px.x, -px.y)) + texture(src, c + px)
+            + texture(src, c - px) + texture(src, c + vec2(-px.x, px.y));
+}
+"""
+
+# 9 点模糊, 权重与 CommonFilters 相同 (50 100 150 200 200 200 150 100 50) / 1200
+_BLUR = """
+#version 130
+uniform sampler2D src;
+uniform vec2 src_size;
+uniform vec2 direction;
+uniform vec4 intensity;
+in vec2 uv;
+out vec4 o_color;
+
+void main() {
+    vec2 px = 1.0 / vec2(textureSize(src, 0));
+    vec2 c = uv * src_size * px;
+    vec2 step = direction * px;
+    float weights[9] = float[](50.0, 100.0, 150.0, 200.0, 200.0, 200.0, 150.0, 100.0, 50.0);
+    vec4 color = vec4(0);
+    for (int i = 0; i < 9; i++) {
+        color += weights[i] * texture(src, c + step * float(i - 4));
+    }
+    o_color = color / 1200.0 * intensity;
+}
+"""
+
+_COMPOSITE = """
+#version 130
+uniform sampler2D color;
+uniform sampler2D bloom;
+uniform vec2 color_size;
+uniform vec2 bloom_size;
+in vec2 uv;
+out vec4 o_color;
+
+void main() {
+    vec4 base = clamp(texture(color, uv * color_size / vec2(textureSize(color, 0))), 0.0, 1.0);
+    vec4 glow = 0.5 * texture(bloom, uv * bloom_size / vec2(textureSize(bloom, 0)));
+    o_color = 1.0 - (1.0 - glow) * (1.0 - base);
+}
+"""
+
+_SCALES = {"small": 2, "medium": 4, "large": 8}
+
+
+def supports_cg_filters(gsg):
+    """当前驱动能否运行 CommonFilters 的 Cg 着色器"""
+    return gsg is not None and gsg.getSupportsCgProfile("arbfp1")
+
+
+class GlslBloom(DirectObject):
+    """
+    与 CommonFilters.setBloom() 参数一致的泛光
+    Args:
+        win (GraphicsOutput): 渲染目标窗口 / 离屏缓冲
+        cam (NodePath): 场景摄像机
+    """
+    def __init__(self, win, cam, blend=(0.3, 0.4, 0.3, 0.0), mintrigger=0.6, maxtrigger=1.0, desat=0.6,
+                 intensity=1.0, size="medium"):
+        scale = _SCALES[size]
+        self.manager = FilterManager(win, cam)
+        color = Texture("bloom-color")
+        final = self.manager.renderSceneInto(colortex=color)
+        textures = [Texture(f"bloom{i}") for i in range(4)]
+        for tex in [color] + textures:
+            # 模糊采样越过边缘时取边缘像素, 不要卷到另一侧
+            tex.setWrapU(Texture.WM_clamp)
+            tex.setWrapV(Texture.WM_clamp)
+
+        passes = [
+            self.manager.renderQuadInto("bloom-bright", colortex=textures[0], div=2, align=scale),
+            self.manager.renderQuadInto("bloom-down", colortex=textures[1], div=scale, align=scale),
+            self.manager.renderQuadInto("bloom-x", colortex=textures[2], div=scale, align=scale),
+            self.manager.renderQuadInto("bloom-y", colortex=textures[3], div=scale, align=scale),
+        ]
+        bright, down, blur_x, blur_y = passes
+        bright.setShader(Shader.make(Shader.SL_GLSL, _QUAD_VERTEX, _BRIGHT_PASS))
+        bright.setShaderInput("src", color)
+        bright.setShaderInput("blend", (blend[0], blend[1], blend[2], blend[3] * 2.0))
+        bright.setShaderInput("trigger", (mintrigger, 1.0 / (maxtrigger - mintrigger), 0.0, 0.0))
+        bright.setShaderInput("desat", desat)
+
+        down.setShader(Shader.make(Shader.SL_GLSL, _QUAD_VERTEX, _DOWNSAMPLE))
+        down.setShaderInput("src", textures[0])
+        down.setShaderInput("taps", 4.0 if size == "large" else 1.0)
+
+        for quad, src, direction, gain in ((blur_x, textures[1], (1, 0), 1.0),
+                                           (blur_y, textures[2], (0, 1), intensity * 3.0)):
+            quad.setShader(Shader.make(Shader.SL_GLSL, _QUAD_VERTEX, _BLUR))
+            quad.setShaderInput("src", src)
+            quad.setShaderInput("direction", direction)
+            quad.setShaderInput("intensity", (gain, gain, gain, gain))
+
+        final.setShader(Shader.make(Shader.SL_GLSL, _QUAD_VERTEX, _COMPOSITE))
+        final.setShaderInput("color", color)
+        final.setShaderInput("bloom", textures[3])
+        self.textures = [color] + textures
+
+        # (节点, 输入名, 采样源的缩小倍数): 采样源的有效尺寸与 FilterManager 创建缓冲时的计算一致
+        self._sizes = ((bright, "src_size", 1), (down, "src_size", 2), (blur_x, "src_size", scale),
+                       (blur_y, "src_size", scale), (final, "color_size", 1), (final, "bloom_size", scale))
+        self._scale = scale
+        self._resize()
+        self.accept("window-event", self._resize)
+
+    def _resize(self, win=None):
+        for quad, name, div in self._sizes:
+            quad.setShaderInput(name, self.manager.getScaledSize(1, div, self._scale))
+
+    def cleanup(self):
+        self.ignoreAll()
+        self.manager.cleanup()
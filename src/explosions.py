@@ -0,0 +1,414 @@
+"""
+声明式爆炸策略
+每种爆炸用一段 JSON 描述: 速度分布 (shape)、速度范围、颜色模式、寿命、阻力、trace、tail 与 flash.
+加载时编译为 BurstKernel, 爆炸时用一次数组运算生成整批粒子, 新增效果不需要修改代码.
+
+脚本顶层的 "strategies" 对象可以新增策略或覆盖内置策略:
+    "strategies": {
+        "gold_ring": {"shape": "ring", "count": 80, "speed": {"min": 18, "max": 20},
+                      "color": [1, 0.8, 0.3], "life": 2000, "drag": 0.05, "trace": 20}
+    }
+
+同一策略在一场演出中往往触发上百次, 因此每种 (策略, 参数) 组合在加载时预先采样若干个变体 (TemplateBank),
+爆炸时随机选取一个变体并整体旋转后直接写入粒子池.
+"""
+import random
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+import text_manager
+from particle_engine import GRAVITY, damping_of
+
+# 速度分布
+#   sphere: 球面方向, 速率取自 speed; sampling 决定方向的分布 (见 SPHERE_SAMPLINGS)
+#   ring:   垂直于 axis 的平面内均匀分布的圆环
+#   curve:  参数曲线, x / y / z 为以 t, layer, speed, u 表示的速度表达式
+#   points: 点云, 速度 = (点坐标 + 抖动) * speed; points 为坐标列表, 或 "text" 表示取策略参数中的文字
+SHAPES = ("sphere", "ring", "curve", "points")
+
+# 球面方向的采样方式
+#   uniform: 各向同性
+#   angles:  经纬度各自均匀 (旧版 standard 的写法, 粒子在南北两极较密)
+#   cube:    立方体内均匀取点后归一化 (旧版 glitter 的写法, 朝向立方体顶点的方向较密)
+SPHERE_SAMPLINGS = ("uniform", "angles", "cube")
+
+# 颜色模式: "inherit" 使用烟花弹颜色, "random" 每个粒子随机, 或固定的 [r, g, b]
+COLOR_MODES = ("inherit", "random")
+
+_DEFAULTS = {
+    "count": 100,
+    "speed": 1.0,
+    "color": "inherit",
+    "size": 0.6,     # 相对烟花弹尺寸
+    "life": 1500,    # 毫秒
+    "drag": 0.0,
+    "trace": 0,
+    "tail": None,    # {"count": 每秒发射数, "velocity": 速度, "color": 颜色模式, "time": 寿命(毫秒)}
+    "flash": None,   # [幅度, 周期(秒)]
+    "sampling": "uniform",
+    "axis": [0, 1, 0],
+    "layers": [0],
+    "x": "0", "y": "0", "z": "0",
+    "points": None,
+    "jitter": 0.0,
+}
+
+_SHAPE_KEYS = {
+    "sphere": ("sampling",),
+    "ring": ("axis",),
+    "curve": ("layers", "x", "y", "z"),
+    "points": ("points", "jitter"),
+}
+
+# 曲线表达式中可用的名称
+_CURVE_NAMES = {name: getattr(np, name) for name in
+                ("sin", "cos", "tan", "arctan2", "abs", "sqrt", "exp", "log", "sign", "pi",
+                 "minimum", "maximum", "where")}
+
+# 内置策略 (原 ExplosionStrategies 中的手写循环)
+BUILTIN_STRATEGIES = {
+    "standard": {
+        "shape": "sphere", "sampling": "angles", "count": 100, "speed": {"min": 10, "max": 25},
+        "size": 0.6, "life": 1500, "drag": 0.05, "trace": 35,
+    },
+    "standard_rc": {
+        "shape": "sphere", "sampling": "angles", "count": 100, "speed": {"min": 10, "max": 25}, "color": "random",
+        "size": 0.6, "life": 1500, "drag": 0.05, "trace": 25,
+    },
+    "heart": {
+        "shape": "curve", "count": 50, "speed": 20, "layers": [-1, 0, 1],
+        "x": "layer", "y": "speed * (1 - sin(t)) * cos(t)", "z": "speed * (1 - sin(t)) * sin(t)",
+        "size": 0.6, "life": 2400, "drag": 0.05,
+        "tail": {"count": 20, "velocity": 2, "color": "random", "time": 400}, "flash": [1.5, 0.2],
+    },
+    "glitter": {
+        # 闪光弹：强闪烁，不规则运动
+        "shape": "sphere", "sampling": "cube", "count": 120, "speed": {"min": 15, "max": 30},
+        "size": 0.5, "life": 4500, "drag": 0.1, "flash": [2.0, 1],
+    },
+    "text_shape_3d": {
+        # 文字形状: 点云取自词库, 参数为文字
+        "shape": "points", "points": "text", "jitter": 0.3, "speed": 2,
+        "size": 0.5, "life": 4500, "drag": 0.2,
+    },
+}
+
+
+def _speed_range(value):
+    """数字或 {"min": a, "max": b}"""
+    if isinstance(value, dict):
+        lo, hi = float(value["min"]), float(value["max"])
+    else:
+        lo = hi = float(value)
+    if lo > hi:
+        raise ValueError(f"speed 的 min 大于 max: {value!r}")
+    return lo, hi
+
+
+def _color_mode(value, where):
+    if isinstance(value, str):
+        if value not in COLOR_MODES:
+            raise ValueError(f"{where} 应为 {' / '.join(COLOR_MODES)} 或 [r, g, b]: {value!r}")
+        return value
+    if len(value) != 3:
+        raise ValueError(f"{where} 应为 [r, g, b]: {value!r}")
+    return tuple(float(c) for c in value)
+
+
+class BurstKernel:
+    """
+    编译后的爆炸策略
+    所有参数在构造时校验并转换为数组运算所需的形式, 调用时整批生成粒子.
+
+    Args:
+        name (str): 策略名 (用于报错)
+        spec (dict): 策略声明, 未写出的键取 _DEFAULTS
+    Raises:
+        ValueError: 声明不合法
+    """
+    def __init__(self, name, spec):
+        self.name = name
+        shape = spec.get("shape")
+        if shape not in SHAPES:
+            raise ValueError(f"策略 {name}: shape 应为 {' / '.join(SHAPES)}: {shape!r}")
+        unknown = set(spec) - {"shape"} - set(_DEFAULTS)
+        if unknown:
+            raise ValueError(f"策略 {name}: 未知的键 {', '.join(sorted(unknown))}")
+        misplaced = {k for k in spec if k in _DEFAULTS and any(k in keys for keys in _SHAPE_KEYS.values())}
+        misplaced -= set(_SHAPE_KEYS[shape])
+        if misplaced:
+            raise ValueError(f"策略 {name}: {', '.join(sorted(misplaced))} 不适用于 shape={shape}")
+        cfg = dict(_DEFAULTS, **spec)
+
+        self.shape = shape
+        self.count = int(cfg["count"])
+        self.speed = _speed_range(cfg["speed"])
+        self.color = _color_mode(cfg["color"], f"策略 {name} 的 color")
+        self.size = float(cfg["size"])
+        self.life = float(cfg["life"]) / 1000.0
+        self.drag = float(cfg["drag"])
+        self.trace = int(cfg["trace"])
+
+        flash = cfg["flash"]
+        self.flash = (float(flash[0]), float(flash[1])) if flash else (0.0, 0.0)
+
+        tail = cfg["tail"]
+        if tail:
+            self.tail = (float(tail.get("count", 20)), float(tail.get("velocity", 5)),
+                         _color_mode(tail.get("color", "inherit"), f"策略 {name} 的 tail.color"),
+                         float(tail.get("time", 500)))
+        else:
+            self.tail = None
+
+        if shape == "sphere":
+            self.sampling = cfg["sampling"]
+            if self.sampling not in SPHERE_SAMPLINGS:
+                raise ValueError(f"策略 {name}: sampling 应为 {' / '.join(SPHERE_SAMPLINGS)}: {self.sampling!r}")
+        elif shape == "ring":
+            axis = np.asarray(cfg["axis"], dtype=np.float64)
+            if axis.shape != (3,) or not np.linalg.norm(axis) > 0:
+                raise ValueError(f"策略 {name}: axis 应为非零的 [x, y, z]")
+            self.basis = self._plane_basis(axis / np.linalg.norm(axis))
+        elif shape == "curve":
+            self.layers = np.asarray(cfg["layers"], dtype=np.float64).ravel()
+            self.exprs = [compile(str(cfg[axis]), f"<{name}.{axis}>", "eval") for axis in "xyz"]
+            for code in self.exprs:
+                missing = set(code.co_names) - set(_CURVE_NAMES) - {"t", "layer", "speed", "u"}
+                if missing:
+                    raise ValueError(f"策略 {name}: 曲线表达式中未知的名称 {', '.join(sorted(missing))}")
+        elif shape == "points":
+            points = cfg["points"]
+            if points == "text":
+                self.points = None
+            else:
+                self.points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+            self.jitter = float(cfg["jitter"])
+
+    @property
+    def needs_text(self):
+        """点云取自文字, 需要一个文字参数"""
+        return self.shape == "points" and self.points is None
+
+    @property
+    def lifespan(self):
+        """爆炸后粒子 (含其尾焰) 最长存活时间 (秒)"""
+        return self.life + (self.tail[3] / 1000.0 if self.tail else 0.0)
+
+    @staticmethod
+    def _plane_basis(axis):
+        """垂直于 axis 的一对正交单位向量"""
+        helper = np.array([0.0, 0.0, 1.0]) if abs(axis[2]) < 0.9 else np.array([1.0, 0.0, 0.0])
+        e1 = np.cross(axis, helper)
+        e1 /= np.linalg.norm(e1)
+        return e1, np.cross(axis, e1)
+
+    def _velocities(self, gen, args):
+        lo, hi = self.speed
+        if self.shape == "sphere":
+            n = self.count
+            if self.sampling == "angles":
+                theta = gen.uniform(0, 2 * np.pi, n)
+                phi = gen.uniform(0, np.pi, n)
+                dirs = np.stack([np.sin(phi) * np.cos(theta), np.sin(phi) * np.sin(theta), np.cos(phi)], axis=1)
+            else:
+                dirs = gen.normal(size=(n, 3)) if self.sampling == "uniform" else gen.uniform(-1, 1, (n, 3))
+                dirs /= np.maximum(np.linalg.norm(dirs, axis=1, keepdims=True), 1e-9)
+            return dirs * gen.uniform(lo, hi, n)[:, None]
+
+        if self.shape == "ring":
+            n = self.count
+            angle = np.arange(n) * (2 * np.pi / max(n, 1))
+            e1, e2 = self.basis
+            dirs = np.cos(angle)[:, None] * e1 + np.sin(angle)[:, None] * e2
+            return dirs * gen.uniform(lo, hi, n)[:, None]
+
+        if self.shape == "curve":
+            t = np.repeat(np.arange(self.count) * (2 * np.pi / max(self.count, 1)), len(self.layers))
+            n = len(t)
+            env = dict(_CURVE_NAMES, t=t, layer=np.tile(self.layers, self.count),
+                       speed=gen.uniform(lo, hi, n), u=gen.random(n))
+            vel = np.empty((n, 3))
+            for i, code in enumerate(self.exprs):
+                vel[:, i] = eval(code, {"__builtins__": {}}, env)
+            return vel
+
+        points = self.points
+        if points is None:
+            points = np.asarray(text_manager.get_manager().get_word_data(args[0]), dtype=np.float64)
+        jitter = gen.uniform(-self.jitter, self.jitter, points.shape) if self.jitter else 0.0
+        return (points + jitter) * gen.uniform(lo, hi, len(points))[:, None]
+
+    @staticmethod
+    def _random_colors(mode, gen, n):
+        """逐粒子随机的颜色; 其余模式在爆炸时才取值, 这里返回 None"""
+        return gen.random((n, 3)).astype(np.float32) if mode == "random" else None
+
+    def sample(self, gen, args=()):
+        """
+        采样一次爆炸中与烟花弹无关的部分
+        Returns:
+            tuple: (速度 (N, 3), 逐粒子颜色或 None, 逐粒子尾焰颜色或 None), 均为 float32
+        """
+        vel = self._velocities(gen, args).astype(np.float32)
+        n = len(vel)
+        tail_colors = self._random_colors(self.tail[2], gen, n) if self.tail else None
+        return vel, self._random_colors(self.color, gen, n), tail_colors
+
+    def rotation(self, gen):
+        """
+        复用模板时施加的随机旋转, 使同一变体的多次爆炸互不相同
+        各向同性的球形任意旋转, 其余采样方式只绕竖直轴旋转 (保持其分布), 圆环绕自身轴旋转;
+        曲线与点云的朝向有意义, 不旋转
+        Returns:
+            np.ndarray | None: 3x3 旋转矩阵
+        """
+        if self.shape == "sphere" and self.sampling != "uniform":
+            # 经纬度采样绕竖直轴任意旋转不变, 立方体采样只在四分之一圈的旋转下不变
+            angle = gen.uniform(0, 2 * np.pi) if self.sampling == "angles" else gen.integers(4) * (np.pi / 2)
+            c, s = np.cos(angle), np.sin(angle)
+            return np.array([[c, -s, 0], [s, c, 0], [0, 0, 1]], dtype=np.float32)
+        if self.shape == "sphere":
+            # 均匀随机的单位四元数
+            w, x, y, z = gen.normal(size=4)
+            norm = np.sqrt(w * w + x * x + y * y + z * z) or 1.0
+            w, x, y, z = w / norm, x / norm, y / norm, z / norm
+            return np.array([
+                [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+                [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+                [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+            ], dtype=np.float32)
+        if self.shape == "ring":
+            e1, e2 = self.basis
+            angle = gen.uniform(0, 2 * np.pi)
+            c, s = np.cos(angle), np.sin(angle)
+            # 在 (e1, e2) 平面内旋转 angle, 轴向分量不变
+            plane = np.outer(e1, e1) + np.outer(e2, e2)
+            return (np.eye(3) - plane + c * plane + s * (np.outer(e2, e1) - np.outer(e1, e2))).astype(np.float32)
+        return None
+
+    def __call__(self, store, pos, color, size_scale, *args, rng=random, templates=None):
+        """
+        在 pos 处生成一整批爆炸粒子
+        Args:
+            store (ParticleStore): 目标粒子池
+            args: 脚本中的策略参数 (例如文字)
+            rng (random.Random): 该烟花的随机数流
+            templates (TemplateBank): 若提供, 从预采样的变体中选取, 否则当场采样
+        Returns:
+            np.ndarray: 新粒子所在槽位
+        """
+        gen = np.random.default_rng(rng.getrandbits(64))
+        if templates is not None:
+            vel, colors, tail_colors = templates.pick(self, args, gen)
+            rot = self.rotation(gen)
+            if rot is not None:
+                vel = vel @ rot.T
+        else:
+            vel, colors, tail_colors = self.sample(gen, args)
+        if store.detail < 1.0 and len(vel):
+            # 降级: 等间隔抽取, 保持圆环、曲线与文字的整体形状
+            m = max(int(len(vel) * store.detail), 1)
+            keep = np.arange(m) * len(vel) // m
+            vel = vel[keep]
+            colors = colors[keep] if colors is not None else None
+            tail_colors = tail_colors[keep] if tail_colors is not None else None
+        n = len(vel)
+        if n == 0:
+            return np.empty(0, dtype=np.int32)
+
+        tail = {}
+        if self.tail:
+            rate, speed, tail_color, tail_life = self.tail
+            tail = dict(tail_rate=rate, tail_speed=speed, tail_life=tail_life,
+                        tail_color=color if tail_color == "inherit" else
+                        tail_color if tail_colors is None else tail_colors)
+        if colors is None:
+            colors = color if self.color == "inherit" else self.color
+        burst = store.bursts.acquire(pos, float(np.linalg.norm(vel, axis=1).max()), damping_of(self.drag),
+                                     margin=self._margin(size_scale))
+        slots = store.spawn(
+            np.broadcast_to(np.asarray(pos, dtype=np.float32), (n, 3)), vel, colors, self.size * size_scale,
+            self.life, drag=self.drag, trace=self.trace, flash_amp=self.flash[0], flash_period=self.flash[1],
+            burst=burst, **tail
+        )
+        if len(slots) == 0:
+            store.bursts.discard(burst)
+        return slots
+
+    def _margin(self, size_scale):
+        """
+        包围球的额外半径: 粒子尺寸 (含闪烁放大), 以及尾焰火花在寿命内相对爆炸球心的最大偏移
+        (火花自身的飞行距离 + 下落距离 + 这段时间内球心的下落, 均按无阻力估计上界)
+        """
+        margin = self.size * size_scale * max(self.flash[0], 1.0)
+        if self.tail:
+            speed, life = self.tail[1], self.tail[3] / 1000.0
+            margin += speed * life + GRAVITY * life * (self.life + life)
+        return margin
+
+
+class TemplateBank:
+    """
+    爆炸模板库
+    每种 (策略, 参数) 组合预先采样 variants 个变体, 爆炸时只需选取、旋转与整体写入.
+    变体由策略名与参数决定的固定种子生成, 被淘汰后重建的结果完全相同.
+    总内存超过 max_bytes 时淘汰最久未使用的组合.
+
+    Args:
+        variants (int): 每种组合的变体数
+        max_bytes (int): 模板总内存上限 (字节)
+    """
+    def __init__(self, variants=8, max_bytes=32 * 1024 * 1024):
+        self.variants = max(int(variants), 1)
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (kernel, args) -> (变体列表, 字节数)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def warm(self, kernel, args=()):
+        """预先生成 (加载时调用)"""
+        self._get(kernel, tuple(args))
+
+    def pick(self, kernel, args, gen):
+        """随机选取一个变体: (速度, 逐粒子颜色或 None, 逐粒子尾焰颜色或 None)"""
+        variants = self._get(kernel, tuple(args))
+        return variants[int(gen.integers(len(variants)))]
+
+    def _get(self, kernel, args):
+        key = (kernel, args)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+        self.misses += 1
+        seed = zlib.crc32(repr((kernel.name, args)).encode("utf-8"))
+        variants = [kernel.sample(np.random.default_rng([seed, i]), args) for i in range(self.variants)]
+        if kernel.needs_text and len(variants[0][0]) == 0:
+            print(f"Warning: Empty points for text '{args[0]}'")
+        size = sum(a.nbytes for v in variants for a in v if a is not None)
+        self._entries[key] = (variants, size)
+        self.nbytes += size
+        # 至少保留刚生成的这一项
+        while self.nbytes > self.max_bytes and len(self._entries) > 1:
+            _, (_, freed) = self._entries.popitem(last=False)
+            self.nbytes -= freed
+        return variants
+
+
+def compile_strategies(declared=None):
+    """
+    编译内置策略与脚本中声明的策略 (同名时脚本优先)
+    Returns:
+        dict: 策略名 -> BurstKernel
+    """
+    specs = dict(BUILTIN_STRATEGIES)
+    specs.update(declared or {})
+    return {name: BurstKernel(name, spec) for name, spec in specs.items()}
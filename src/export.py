@@ -0,0 +1,311 @@
+"""
+离线导出 (Export)
+在离屏缓冲中按固定步长逐帧渲染表演脚本 (含泛光), 输出 PNG 序列, 或通过 ffmpeg 编码为视频并混入背景音乐.
+每帧严格推进 1/fps 秒, 渲染耗时不影响模拟: 复杂场面可以慢慢算, 不会丢帧;
+同一脚本 + 同一种子 + 同一分辨率 => 逐帧相同的画面.
+
+用法 (在 src 目录下):
+    python export.py [脚本路径] --out frames/   [--size 1920x1080] [--fps 60] [--seed 0] [--start 0] [--duration 70]
+    python export.py [脚本路径] --out show.mp4  [--audio-offset 0] [--no-audio] [--crf 18]
+    python export.py [脚本路径] --out show.mp4  --workers 8 [--segments 8]
+
+背景音乐与演出时间的对应: 演出第 0 秒对应音乐的第 audio-offset 秒, 从 --start 开始导出时音乐同步后移.
+
+--workers 大于 1 时, 时间线被切成若干片段, 每个片段由独立的进程 (各自的离屏 Panda3D 上下文) 渲染:
+进程先不渲染地逐帧模拟到片段起点 (与串行导出的状态完全相同, 接缝处没有差异), 再渲染本片段.
+PNG 序列按全局帧号直接写入同一目录; 视频则每个片段单独编码, 最后按顺序无损拼接并混入背景音乐.
+默认每个进程一个连续片段: 第 i 个进程 (共 W 个) 预模拟 i/W 场演出, 平均每个进程不到半场
+(S 个片段时每个进程平均约 S/(2W) 场). 片段数多于进程数时, 先完成的进程继续领取下一个片段,
+适合各段渲染耗时差别很大的脚本.
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from main import (
+    BGM_PATH, BGM_VOLUME, ParticleSystem, load_script, prepare_text_resources, resource_path, setup_scene
+)
+from headless import HeadlessShow
+
+from direct.showbase.ShowBase import ShowBase
+from panda3d.core import loadPrcFileData
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".mkv", ".webm")
+
+
+class PngSequence:
+    """按演出帧号逐帧写入 frame_000001.png, frame_000002.png ..."""
+    def __init__(self, directory, first=0):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.index = first
+
+    def write(self, rgb):
+        Image.fromarray(rgb).save(os.path.join(self.directory, f"frame_{self.index:06d}.png"))
+        self.index += 1
+
+    def close(self):
+        pass
+
+
+def _ffmpeg():
+    binary = shutil.which("ffmpeg")
+    if binary is None:
+        raise RuntimeError("未找到 ffmpeg, 请安装后重试, 或改为输出 PNG 序列 (--out 指定目录)")
+    return binary
+
+
+def _audio_args(audio, start):
+    """第二路输入为循环播放的背景音乐, 从 start 秒开始, 长度跟随视频"""
+    if not audio:
+        return [], []
+    return (["-stream_loop", "-1", "-ss", f"{start:.6f}", "-i", audio],
+            ["-map", "0:v", "-map", "1:a", "-af", f"volume={BGM_VOLUME}", "-c:a", "aac", "-shortest"])
+
+
+def _run_ffmpeg(cmd):
+    if subprocess.run(cmd).returncode != 0:
+        raise RuntimeError("ffmpeg 执行失败")
+
+
+class FfmpegPipe:
+    """
+    把原始 RGB 帧通过管道交给 ffmpeg 编码
+    Args:
+        path (str): 输出视频路径
+        size (tuple): (宽, 高)
+        audio (str): 背景音乐路径, None 则不含音轨
+        audio_start (float): 视频第一帧对应的音乐时间 (秒, 音乐循环播放)
+        crf (int): x264 画质 (越小越好)
+    """
+    def __init__(self, path, size, fps, audio=None, audio_start=0.0, crf=18):
+        width, height = size
+        audio_in, audio_out = _audio_args(audio, audio_start)
+        cmd = [_ffmpeg(), "-y", "-loglevel", "error",
+               "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(fps), "-i", "-"]
+        cmd += audio_in + audio_out + ["-c:v", "libx264", "-crf", str(crf), "-pix_fmt", "yuv420p", path]
+        self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+    def write(self, rgb):
+        self.process.stdin.write(rgb.tobytes())
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg 编码失败 (返回码 {self.process.returncode})")
+
+
+class OfflineExport(ShowBase):
+    """
+    离屏渲染的演出: 与窗口模式相同的场景、粒子渲染器与泛光, 由 HeadlessShow 以固定步长驱动
+    Args:
+        data (dict): 表演脚本
+        size (tuple): 输出分辨率 (宽, 高)
+    """
+    def __init__(self, data, size=(1920, 1080), fps=60, seed=0):
+        # 晚于 main 中的窗口配置加载, 覆盖其分辨率与垂直同步
+        loadPrcFileData("", f"""
+            window-type offscreen
+            win-size {size[0]} {size[1]}
+            sync-video 0
+            audio-library-name null
+        """)
+        super().__init__()
+        self.size = size
+        self.disableMouse()
+        self.filters = setup_scene(self)
+        self.camLens.setAspectRatio(size[0] / size[1])
+        self.intro_finished = False
+
+        self.show = HeadlessShow(data, seed=seed, fps=fps, app=self)
+        # 着色器路径的粒子状态取决于上传时刻, 从不同帧开始渲染会有舍入差异;
+        # 导出 (尤其是分段并行导出) 要求逐帧完全一致, 因此在 CPU 上展开粒子;
+        # 每帧按固定步长推进后立即截图, 也不使用模拟线程流水线 (画面会晚一帧)
+        ParticleSystem.setup(self.render, self.cam, self.win.getGsg(), shader=False, threaded=False)
+
+    def enable_interaction(self):
+        # 离线导出没有交互模式, 开场秀结束即停止
+        self.intro_finished = True
+
+    def capture(self):
+        """渲染当前帧并取回 RGB 像素 (高, 宽, 3)"""
+        self.graphicsEngine.renderFrame()
+        tex = self.win.getScreenshot()
+        rgb = np.frombuffer(memoryview(tex.getRamImageAs("RGB")), dtype=np.uint8)
+        # 纹理的行从下往上存放
+        return rgb.reshape(tex.getYSize(), tex.getXSize(), 3)[::-1]
+
+    def prepare(self, frame, exact=True):
+        """
+        不渲染地把演出推进到第 frame 帧
+        Args:
+            exact (bool): True 时逐帧模拟 (与从头渲染的状态完全相同),
+                          False 时用闭式解直接跳转 (更快, 但与逐帧模拟有细微差异)
+        """
+        show = self.show
+        if not exact:
+            show.seek(frame * show.dt)
+            return
+        while show.frame < frame and not show.finished:
+            show.step()
+
+    def render_frames(self, sink, last=None, progress=True):
+        """
+        从当前帧的下一帧开始逐帧渲染, 直到第 last 帧 (含) 或演出结束
+        Returns:
+            int: 写出的帧数
+        """
+        show = self.show
+        frames = 0
+        wall = time.perf_counter()
+        while not show.finished and (last is None or show.frame < last):
+            show.step()
+            ParticleSystem.renderer.update(ParticleSystem.store)
+            sink.write(self.capture())
+            frames += 1
+            if progress and frames % 300 == 0:
+                speed = frames * show.dt / (time.perf_counter() - wall)
+                print(f"[Export] 已导出 {frames} 帧 (演出时间 {show.time:.1f} s, {speed:.2f}x 实时)")
+        return frames
+
+
+def count_frames(data, seed, fps, last=None):
+    """无窗口模拟一遍, 得到演出实际结束的帧号 (不超过 last)"""
+    show = HeadlessShow(data, seed=seed, fps=fps)
+    while not show.finished and (last is None or show.frame < last):
+        show.step()
+    return show.frame
+
+
+def split_segments(first, last, count):
+    """把第 first+1 .. last 帧切成 count 段 [(起点帧, 终点帧), ...], 起点帧为片段第一帧的前一帧"""
+    bounds = np.linspace(first, last, min(count, last - first) + 1).round().astype(int)
+    return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+
+def _render_segment(job):
+    """工作进程: 模拟到片段起点, 渲染片段并写出 (每个进程只渲染一个片段, 保证 Panda3D 状态干净)"""
+    data, options, (start, end), target = job
+    prepare_text_resources(data)
+    app = OfflineExport(data, size=options["size"], fps=options["fps"], seed=options["seed"])
+    app.prepare(start)
+    if options["video"]:
+        sink = FfmpegPipe(target, options["size"], options["fps"], crf=options["crf"])
+    else:
+        sink = PngSequence(target, start + 1)
+    try:
+        frames = app.render_frames(sink, end, progress=False)
+    finally:
+        sink.close()
+    return start, end, frames
+
+
+def export_parallel(data, out, workers, segments, first, last, size, fps, seed, audio, audio_start, crf):
+    """
+    分段并行导出第 first+1 .. last 帧
+    Returns:
+        int: 写出的帧数
+    """
+    video = out.lower().endswith(VIDEO_EXTENSIONS)
+    parts = split_segments(first, last, segments)
+    options = dict(size=size, fps=fps, seed=seed, crf=crf, video=video)
+    work_dir = tempfile.mkdtemp(prefix="export_", dir=os.path.dirname(os.path.abspath(out))) if video else None
+    targets = [os.path.join(work_dir, f"part_{i:04d}.mp4") if video else out for i in range(len(parts))]
+    jobs = [(data, options, part, target) for part, target in zip(parts, targets)]
+
+    # spawn: 每个工作进程都是全新的解释器, 不继承父进程的图形上下文; 每个进程只做一个片段
+    context = multiprocessing.get_context("spawn")
+    frames = 0
+    wall = time.perf_counter()
+    try:
+        with context.Pool(workers, maxtasksperchild=1) as pool:
+            for done, (start, end, count) in enumerate(pool.imap_unordered(_render_segment, jobs), 1):
+                frames += count
+                print(f"[Export] 片段 {done}/{len(jobs)} 完成 (第 {start + 1}-{end} 帧), "
+                      f"累计 {frames} 帧, {frames / fps / (time.perf_counter() - wall):.2f}x 实时")
+        if video:
+            concat_videos(targets, out, audio, audio_start)
+    finally:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return frames
+
+
+def concat_videos(parts, out, audio=None, audio_start=0.0):
+    """按顺序无损拼接各片段 (不重新编码画面) 并混入背景音乐"""
+    listing = out + ".parts.txt"
+    with open(listing, "w", encoding="utf-8") as f:
+        for part in parts:
+            f.write(f"file '{os.path.abspath(part)}'\n")
+    audio_in, audio_out = _audio_args(audio, audio_start)
+    try:
+        _run_ffmpeg([_ffmpeg(), "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", listing]
+                    + audio_in + audio_out + ["-c:v", "copy", out])
+    finally:
+        os.remove(listing)
+
+
+def parse_size(text):
+    width, height = (int(v) for v in text.lower().split("x"))
+    return width, height
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线导出烟花演出为 PNG 序列或视频")
+    parser.add_argument("script", nargs="?", help="表演脚本路径 (默认 config/config.json)")
+    parser.add_argument("--out", required=True, help="输出目录 (PNG 序列) 或视频文件 (.mp4/.mov/.mkv/.webm)")
+    parser.add_argument("--size", type=parse_size, default=(1920, 1080), help="分辨率, 例如 1920x1080")
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=None, help="随机种子 (默认取脚本中的 seed, 否则为 0)")
+    parser.add_argument("--start", type=float, default=0.0, help="从第几秒开始导出")
+    parser.add_argument("--duration", type=float, default=None, help="最长导出秒数")
+    parser.add_argument("--audio-offset", type=float, default=0.0, help="演出第 0 秒对应的背景音乐时间 (秒)")
+    parser.add_argument("--no-audio", action="store_true", help="视频不含背景音乐")
+    parser.add_argument("--crf", type=int, default=18, help="视频画质 (x264 CRF)")
+    parser.add_argument("--fast-seek", action="store_true",
+                        help="用闭式解直接跳转到 --start (更快, 但与从头渲染的画面有细微差异)")
+    parser.add_argument("--workers", type=int, default=1, help="并行渲染的进程数")
+    parser.add_argument("--segments", type=int, default=None, help="并行时切分的片段数 (默认与进程数相同)")
+    args = parser.parse_args()
+
+    data = load_script(args.script)
+    prepare_text_resources(data)
+    seed = args.seed if args.seed is not None else data.get("seed", 0)
+
+    # 从 --start 开始时, 第一帧是 start 之后的一帧
+    first = int(round(args.start * args.fps))
+    last = first + int(round(args.duration * args.fps)) if args.duration is not None else None
+    video = args.out.lower().endswith(VIDEO_EXTENSIONS)
+    bgm = resource_path(BGM_PATH)
+    audio = None if args.no_audio or not video or not os.path.exists(bgm) else bgm
+    audio_start = args.audio_offset + (first + 1) / args.fps
+    if video:
+        _ffmpeg()  # 尽早报告缺少 ffmpeg
+
+    if args.workers > 1:
+        last = count_frames(data, seed, args.fps, last)
+        frames = export_parallel(data, args.out, args.workers, args.segments or args.workers, first, last,
+                                 args.size, args.fps, seed, audio, audio_start, args.crf)
+    else:
+        app = OfflineExport(data, size=args.size, fps=args.fps, seed=seed)
+        app.prepare(first, exact=not args.fast_seek)
+        if video:
+            sink = FfmpegPipe(args.out, args.size, args.fps, audio, audio_start, args.crf)
+        else:
+            sink = PngSequence(args.out, first + 1)
+        try:
+            frames = app.render_frames(sink, last)
+        finally:
+            sink.close()
+    print(f"[Export] 完成: {frames} 帧 ({args.size[0]}x{args.size[1]} @ {args.fps} fps, 种子 {seed}) -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
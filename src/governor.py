@@ -0,0 +1,94 @@
+"""
+模拟细节调节器 (Detail Governor)
+根据实测帧时间调整模拟细节, 使弱机器在密集场面中平滑降级而不是卡顿, 负载下降后再逐步恢复.
+
+细节系数 detail (0-1] 作用于之后生成的粒子:
+    爆炸粒子数、trace 长度 (轨迹及其死亡后的残影时长) 与尾焰发射速率都按 detail 缩放.
+
+脚本顶层的 "governor" 对象可调整参数 (target_fps 为 0 时关闭):
+    "governor": {"target_fps": 60, "min_detail": 0.25}
+"""
+
+
+class DetailGovernor:
+    """
+    帧时间 -> 细节系数, 带滞回
+    帧时间与每帧的工作耗时先做指数平滑; 连续 slow_frames 帧的帧时间超出预算 high 倍才降级,
+    连续 fast_frames 帧的工作耗时低于预算 low 倍 (且帧时间未超出预算) 才恢复 (恢复比降级更谨慎),
+    每次调整后冷却 cooldown 帧.
+    开启垂直同步时帧时间不会低于刷新间隔, 因此恢复看的是工作耗时 (空闲余量), 而不是帧时间.
+
+    Args:
+        target_fps (float): 目标帧率, 0 表示关闭
+        min_detail (float): 细节系数下限
+        step (float): 每次调整的倍率 (降级乘以 step, 恢复除以 step)
+        on_change (callable): 每次调整后以 (旧值, 新值, 平滑帧时间) 调用, 默认打印日志
+    """
+    def __init__(self, target_fps=60, min_detail=0.25, step=0.8, high=1.15, low=0.8,
+                 slow_frames=10, fast_frames=90, cooldown=30, smoothing=0.1, on_change=None):
+        self.enabled = target_fps > 0
+        self.budget = 1.0 / target_fps if self.enabled else 0.0
+        self.min_detail = min_detail
+        self.step = step
+        self.high = high
+        self.low = low
+        self.slow_frames = slow_frames
+        self.fast_frames = fast_frames
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+        self.on_change = on_change or self._log
+
+        self.detail = 1.0
+        self.frame_time = self.budget  # 平滑后的帧时间
+        self.work_time = self.budget  # 平滑后的工作耗时
+        self._slow = 0
+        self._fast = 0
+        self._hold = 0
+
+    def update(self, dt, work=None):
+        """
+        记录一帧
+        Args:
+            dt (float): 帧时间 (秒), 即相邻两帧的间隔
+            work (float): 本帧实际的工作耗时 (秒, 不含等待垂直同步), 默认等于 dt
+        Returns:
+            float: 当前细节系数
+        """
+        if not self.enabled or dt <= 0:
+            return self.detail
+        # 单帧尖峰 (加载、切换窗口) 不应主导平均值
+        dt = min(dt, self.budget * 4)
+        work = dt if work is None else min(work, self.budget * 4)
+        self.frame_time += (dt - self.frame_time) * self.smoothing
+        self.work_time += (work - self.work_time) * self.smoothing
+
+        if self._hold > 0:
+            self._hold -= 1
+            return self.detail
+
+        if self.frame_time > self.budget * self.high:
+            self._slow += 1
+            self._fast = 0
+        elif self.work_time < self.budget * self.low and self.frame_time <= self.budget * self.high:
+            self._fast += 1
+            self._slow = 0
+        else:
+            self._slow = self._fast = 0
+
+        if self._slow >= self.slow_frames and self.detail > self.min_detail:
+            self._set(max(self.detail * self.step, self.min_detail))
+        elif self._fast >= self.fast_frames and self.detail < 1.0:
+            detail = self.detail / self.step
+            self._set(1.0 if detail > 0.999 else detail)
+        return self.detail
+
+    def _set(self, detail):
+        old, self.detail = self.detail, detail
+        self._slow = self._fast = 0
+        self._hold = self.cooldown
+        self.on_change(old, detail, self.frame_time)
+
+    def _log(self, old, new, frame_time):
+        action = "降低" if new < old else "恢复"
+        print(f"[Governor] 平滑帧时间 {frame_time * 1000:.1f} ms (目标 {self.budget * 1000:.1f} ms), "
+              f"{action}细节 {old:.2f} -> {new:.2f}")
@@ -0,0 +1,165 @@
+"""
+无窗口确定性模拟 (Headless)
+以固定步长运行 ShowDirector + ParticleSystem 流水线: 不创建窗口, 不加载音频.
+同一脚本 + 同一种子 => 每一帧的状态完全相同, 用于性能分析与回归测试.
+
+用法 (在 src 目录下):
+    python headless.py [脚本路径] [--seed 0] [--fps 60] [--duration 70] [--seek 30] [--trace frames.jsonl] [--cull]
+"""
+import argparse
+import hashlib
+import json
+import math
+import time
+
+from panda3d.core import NodePath
+
+from main import ParticleSystem, ShowDirector, load_script, prepare_text_resources
+from particle_engine import view_frustum
+
+# 与窗口模式相同的镜头: 水平视角 90 度, 默认 4:3 画面
+HEADLESS_FOV = (90.0, math.degrees(2 * math.atan(math.tan(math.radians(45)) * 3 / 4)))
+
+
+class HeadlessApp:
+    """ShowDirector 所需的应用替身: 摄像机只是一个普通节点"""
+    def __init__(self):
+        self.camera = NodePath("camera")
+        self.intro_finished = False
+
+    def enable_interaction(self):
+        # 无窗口模式没有交互, 只记录开场秀已结束
+        self.intro_finished = True
+
+
+class HeadlessShow:
+    """
+    固定步长的无窗口演出
+    Args:
+        data (dict): 表演脚本
+        seed (int): 随机种子, 决定所有事件与尾焰的随机数流
+        fps (int): 模拟帧率, 每帧推进 1/fps 秒
+        cull (bool): 是否按摄像机视锥剔除爆炸的视觉更新 (会改变显示颜色, 因此默认关闭以保持摘要不变)
+        app: 提供 camera 与 enable_interaction() 的应用 (离线导出时为真正的 ShowBase), 默认为 HeadlessApp
+    """
+    def __init__(self, data, seed=0, fps=60, cull=False, app=None):
+        # 种子以参数为准 (同步模式下由主机决定), 忽略 engine 中可能写明的 seed
+        ParticleSystem.configure(**dict(data.get("engine", {}), seed=seed))
+        self.app = app or HeadlessApp()
+        self.director = ShowDirector(self.app, data, seed=seed)
+        self.dt = 1.0 / fps
+        self.frame = 0
+        self.cull = cull
+
+    @property
+    def time(self):
+        return self.frame * self.dt
+
+    @property
+    def finished(self):
+        """脚本已全部触发, 且场上没有烟花弹和粒子"""
+        return self.director.script_done and not ParticleSystem.fireworks and ParticleSystem.store.live_count == 0
+
+    def step(self, timings=None):
+        """
+        推进一帧
+        Args:
+            timings (dict): 若提供, 各阶段耗时 (秒) 累加到 director / particle / cleanup / firework 键
+        """
+        t0 = time.perf_counter()
+        self.director.update(self.dt)
+        if timings is not None:
+            timings["director"] = timings.get("director", 0.0) + (time.perf_counter() - t0)
+        if self.cull:
+            ParticleSystem.store.set_view(*self.frustum())
+        ParticleSystem.step(self.dt, timings)
+        self.frame += 1
+
+    def seek(self, t):
+        """跳转到时间 t (取整到帧), 粒子群由闭式解直接重建"""
+        self.frame = int(round(t / self.dt))
+        self.director.seek(self.time)
+        self.director.timer = self.time
+
+    def frustum(self):
+        """摄像机节点的视锥平面与位置"""
+        camera = self.app.camera
+        quat = camera.getQuat()
+        eye = tuple(camera.getPos())
+        axes = (tuple(quat.getRight()), tuple(quat.getUp()), tuple(quat.getForward()))
+        return view_frustum(eye, *axes, HEADLESS_FOV), eye
+
+    def snapshot(self):
+        """当前帧的计数与状态摘要 (摘要覆盖粒子存活、位置、速度、颜色与摄像机位置)"""
+        store = ParticleSystem.store
+        hw = store.high_water
+        digest = hashlib.sha1()
+        for arr in (store.alive[:hw], store.pos[:hw], store.vel[:hw], store.draw_color[:hw]):
+            digest.update(arr.tobytes())
+        digest.update(repr(tuple(self.app.camera.getPos())).encode())
+        snap = {
+            "frame": self.frame,
+            "time": round(self.time, 6),
+            "live": store.live_count,
+            "fireworks": len(ParticleSystem.fireworks),
+            "trails": store.trails.active_count,
+            "digest": digest.hexdigest(),
+        }
+        if self.cull:
+            snap.update(store.cull_stats)
+        return snap
+
+    def run(self, duration=None, on_frame=None):
+        """
+        运行到演出结束 (或 duration 秒)
+        Args:
+            on_frame (callable): 每帧结束后以 self 为参数调用
+        """
+        while not self.finished:
+            if duration is not None and self.time >= duration:
+                break
+            self.step()
+            if on_frame:
+                on_frame(self)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="无窗口确定性烟花模拟")
+    parser.add_argument("script", nargs="?", help="表演脚本路径 (默认 config/config.json)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--duration", type=float, default=None, help="最长模拟秒数")
+    parser.add_argument("--seek", type=float, default=0.0, help="从第几秒开始 (直接重建该时刻的状态)")
+    parser.add_argument("--trace", help="逐帧状态输出为 JSON Lines")
+    parser.add_argument("--cull", action="store_true", help="按摄像机视锥剔除爆炸的视觉更新")
+    args = parser.parse_args()
+
+    data = load_script(args.script)
+    prepare_text_resources(data)
+    show = HeadlessShow(data, seed=args.seed, fps=args.fps, cull=args.cull)
+    if args.seek:
+        show.seek(args.seek)
+
+    trace_file = open(args.trace, "w", encoding="utf-8") if args.trace else None
+    peak = {"live": 0, "fireworks": 0}
+
+    def on_frame(s):
+        if trace_file:
+            trace_file.write(json.dumps(s.snapshot()) + "\n")
+        peak["live"] = max(peak["live"], ParticleSystem.store.live_count)
+        peak["fireworks"] = max(peak["fireworks"], len(ParticleSystem.fireworks))
+
+    try:
+        show.run(args.duration, on_frame)
+    finally:
+        if trace_file:
+            trace_file.close()
+
+    summary = show.snapshot()
+    summary.update(seed=args.seed, fps=args.fps, peak_live=peak["live"], peak_fireworks=peak["fireworks"],
+                   spawned=ParticleSystem.store.spawned)
+    print(json.dumps(summary, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,13 +6,21 @@ from direct.task import Task
 from direct.filter.CommonFilters import CommonFilters
 from direct.gui.OnscreenText import OnscreenText
 from panda3d.core import (
-    Vec3, Point3, ColorBlendAttrib, Texture, PNMImage, 
-    NodePath, TransparencyAttrib, CardMaker, LColor,
+    Vec3, Point3, Texture, PNMImage, 
     loadPrcFileData,TextNode
 )
 import random
 import math
+import time
+import bisect
+import numpy as np
 import text_manager
+from particle_engine import ParticleStore, GRAVITY
+from particle_renderer import ParticleRenderer, load_sprite_shader
+from explosions import TemplateBank, compile_strategies
+from governor import DetailGovernor
+from bloom import GlslBloom, supports_cg_filters
+from pipeline import SimulationPipeline
 
 # ==========================================
 # 资源路径处理函数（必须在代码最前面添加）
@@ -56,22 +64,28 @@ text_mgr = text_manager.get_manager(resource_path)
 
 # 2. 读取脚本 (为了预扫描)
 CFG_PATH = "../config/config.json"
+BGM_PATH = "../assets/audio/bgm/bgm.mp3"
+BGM_VOLUME = 0.5
 
-with open(resource_path(CFG_PATH), "r", encoding='utf-8') as f:
-    script_data = json.load(f)
+def load_script(path=None):
+    """读取表演脚本 JSON (默认 config/config.json)"""
+    path = path or resource_path(CFG_PATH)
+    with open(path, "r", encoding='utf-8') as f:
+        return json.load(f)
 
-# 3. 预扫描并生成缺失文字 (核心需求)
-print("正在检查文字资源...")
-text_mgr.scan_script_and_update(script_data)
+def prepare_text_resources(data):
+    """3. 预扫描并生成缺失文字 (核心需求)"""
+    print("正在检查文字资源...")
+    text_mgr.scan_script_and_update(data)
 
 # ==========================================
 # 1. 资源生成 (Assets)
 # ==========================================
 
 
-def randomColor():
+def randomColor(rng=random):
     """生成随机颜色"""
-    return (random.random(), random.random(), random.random())
+    return (rng.random(), rng.random(), rng.random())
 
 def create_particle_texture():
     """生成高斯模糊纹理"""
@@ -99,143 +113,39 @@ def create_particle_texture():
 # 2. 粒子系统核心 (Core Systems)
 # ==========================================
 
-class Particle:
-    """
-    全能粒子类
-    Args:
-        pos (tuple): (x, y, z) 初始位置
-        v (tuple): (vx, vy, vz) 初始速度
-        color (tuple): (r, g, b) 颜色
-        size (float): 缩放大小
-        lifetime_ms (int): 寿命(毫秒)
-        drag_coeff (float): 空气阻力系数 (0-1)
-        trace_frames (int): 轨迹残影数量 (0=关闭). 实现为产生静止的残影粒子.
-        tail_config (tuple): 尾焰配置 (发射速率particles/sec, 喷射速度, 颜色, 寿命ms). None=关闭.
-        flash_config (tuple): 闪烁配置 (振幅0-1, 周期秒). None=关闭.
-    """
-    def __init__(self, pos, v, color, size, lifetime_ms, drag_coeff=0.0, 
-                 trace_frames=0, tail_config=None, flash_config=None):
-        
-        self.node = ParticleSystem.get_node()
-        self.node.setPos(Point3(*pos))
-        self.color = color
-        self.node.setColorScale(LColor(color[0], color[1], color[2], 1.0))
-        self.size = size
-        self.node.setScale(size)
-        
-        self.velocity = Vec3(*v)
-        self.life_max = lifetime_ms / 1000.0
-        self.life_cur = 0.0
-        self.drag = drag_coeff
-        self.gravity = Vec3(0, 0, -GRAVITY) # 默认重力
-        
-        self.trace_frames = trace_frames
-        self.tail_config = tail_config # (rate, speed, color, life_ms)
-        self.flash_config = flash_config # (amp, period)
-        
-        self.tail_timer = 0.0
-        self.base_alpha = 1.0
-        self.is_ghost = False # 标记是否为纯视觉残影
-
-    def update(self, dt):
-        self.life_cur += dt
-        if self.life_cur >= self.life_max:
-            return False # 死亡
-
-        # 1. 物理计算
-        if not self.is_ghost:
-            self.velocity += self.gravity * dt
-            if self.drag > 0:
-                self.velocity *= pow(1.0 - self.drag, dt * 10) # 修正阻力计算使其与帧率无关
-            self.node.setPos(self.node.getPos() + self.velocity * dt)
-
-        # 2. 视觉效果 (淡出)
-        life_ratio = 1.0 - (self.life_cur / self.life_max)
-        
-        current_alpha = life_ratio
-        self.node.setAlphaScale(current_alpha)
-
-        # 3. Flash (闪烁特效)
-        if self.flash_config and self.flash_config[1] > 0:
-            amp, period = self.flash_config
-            if self.life_cur % period > period * 0.7:
-                self.node.setColorScale(LColor(1-(1-self.color[0])/amp, 1-(1-self.color[1])/amp, 1-(1-self.color[2])/amp, 1.0))
-                self.node.setScale(self.size * amp)
-            else:
-                self.node.setScale(self.size)
-        
-        # 如果是残影粒子，只做淡出，不产生新东西
-        if self.is_ghost:
-            #self.node.setScale(self.node.getScale().x * life_ratio)
-            return True
-
-        curr_pos = self.node.getPos()
-
-        # 4. Trace (轨迹/残影)
-        # 逻辑：每帧在其当前位置留下一个静止的、短命的粒子
-        if self.trace_frames > 0:
-            # 残影寿命与trace数值挂钩，例如 trace=5，则残影存活约 0.1秒
-            ghost_life = self.trace_frames * 0.02 
-            ParticleSystem.spawn_ghost(curr_pos, self.node.getColorScale(), self.node.getScale(), ghost_life)
-
-        # 5. Tail (尾焰/喷射)
-        # 逻辑：主动向四周喷射微小粒子
-        if self.tail_config:
-            rate, speed, col, t_life = self.tail_config
-            interval = 1.0 / rate
-            self.tail_timer += dt
-            while self.tail_timer > interval:
-                self.tail_timer -= interval
-                # 随机喷射方向
-                rand_dir = Vec3(random.uniform(-1,1), random.uniform(-1,1), random.uniform(-1,1)).normalized()
-                # 尾焰粒子通常不具备Trace和Tail，防止递归爆炸
-                ParticleSystem.add(
-                    pos=(curr_pos.x, curr_pos.y, curr_pos.z),
-                    v=(rand_dir.x * speed, rand_dir.y * speed, rand_dir.z * speed),
-                    color=col,
-                    size=self.node.getScale().x * 0.5,
-                    lifetime_ms=t_life,
-                    drag=0.1,
-                    trace=0, tail=None, flash=None
-                )
-
-        return True
-
-    def cleanup(self):
-        self.node.removeNode()
-
-
 class Firework:
     """
     烟花弹类
+    弹体本身是粒子引擎中的一个粒子 (带轨迹与尾焰), 这里只负责计时与爆炸.
+    rng 为该烟花专属的随机数流, 爆炸时交给策略使用.
     """
-    def __init__(self, start_pos, start_v, explode_time_ms, color, size, trace_frames, tail_cfg, strategy_func):
+    def __init__(self, start_pos, start_v, explode_time_ms, color, size, trace_frames, tail_cfg, strategy_func,
+                 rng=random):
         self.pos = Vec3(*start_pos)
-        self.velocity = Vec3(*start_v)
         self.explode_time = explode_time_ms / 1000.0
         self.age = 0
         self.color = color
         self.size = size
         self.strategy = strategy_func
+        self.rng = rng
         self.exploded = False
+        self.debris = None  # 爆炸产生的粒子槽位
 
-        # 发射阶段的视觉粒子
-        self.shell_particle = Particle(
-            start_pos, start_v, color, size, explode_time_ms + 200, 
-            drag_coeff=0.0, trace_frames=trace_frames, tail_config=tail_cfg, flash_config=None
+        # 发射阶段的视觉粒子 (池满时可能为 None, 烟花仍按时在发射点上方爆炸)
+        self.shell = ParticleSystem.store.add_tracked(
+            start_pos, start_v, color, size, explode_time_ms + 200,
+            drag=0.0, trace=trace_frames, tail=tail_cfg, flash=None
         )
-        # 修改重力以适应发射
-        self.shell_particle.gravity = Vec3(0, 0, -GRAVITY) 
 
     def update(self, dt):
         if self.exploded:
             return False
 
         self.age += dt
-        # 更新绑定的粒子物理
-        self.shell_particle.update(dt)
-        self.pos = self.shell_particle.node.getPos()
-        self.velocity = self.shell_particle.velocity
+        # 读取弹体粒子的最新位置 (被粒子池回收后保持最后位置)
+        store = ParticleSystem.store
+        if store.is_alive(self.shell):
+            self.pos = Vec3(*store.pos[self.shell[0]].tolist())
 
         if self.age >= self.explode_time:
             self.explode()
@@ -244,199 +154,170 @@ class Firework:
 
     def explode(self):
         self.exploded = True
-        self.shell_particle.cleanup()
+        ParticleSystem.store.kill(self.shell)
         
         # 播放音效
         AudioManager.play("explosion")
         
         # 执行爆炸逻辑
         pos_tuple = (self.pos.x, self.pos.y, self.pos.z)
-        self.strategy(pos_tuple, self.color, self.size)
+        self.debris = self.strategy(pos_tuple, self.color, self.size, rng=self.rng)
 
 
 class ParticleSystem:
     """
     粒子管理器 (单例模式)
+    粒子数据保存在 ParticleStore 的固定容量粒子池中, 每帧整体向量化更新,
+    再由 ParticleRenderer 一次性写入同一个顶点缓冲绘制.
+    爆炸粒子取自 TemplateBank 中预采样的模板.
+    窗口演出默认由 SimulationPipeline 在专用线程上推进模拟, 与主线程的渲染重叠.
     """
-    particles = []
+    store = ParticleStore()
+    templates = TemplateBank()
     fireworks = []
-    shared_card = None
-    node_root = None
+    renderer = None
+    pipeline = None
 
     @classmethod
-    def setup(cls, render_node):
-        cls.node_root = render_node.attachNewNode("particle_root")
-        cm = CardMaker('p')
-        cm.setFrame(-0.5, 0.5, -0.5, 0.5)
-        cls.shared_card = NodePath(cm.generate())
-        cls.shared_card.setTexture(create_particle_texture())
-        cls.shared_card.setTransparency(TransparencyAttrib.M_alpha)
-        cls.shared_card.setAttrib(ColorBlendAttrib.make(ColorBlendAttrib.M_add))
-        cls.shared_card.setBillboardPointEye()
+    def configure(cls, capacity=65536, overflow="evict_oldest", trail_capacity=None, trail_length=40, seed=None,
+                  template_variants=8, template_memory_mb=32, lod_distance=250.0):
+        """按脚本中的 engine 配置重建粒子池与爆炸模板库 (用于限制展台机器的内存上限), 同时清空烟花弹"""
+        cls.store = ParticleStore(capacity, overflow, trail_capacity, trail_length, seed=seed,
+                                  lod_distance=lod_distance)
+        cls.templates = TemplateBank(template_variants, int(template_memory_mb * 1024 * 1024))
+        cls.fireworks = []
+        print(f"[ParticleSystem] 粒子池容量 {capacity}, 溢出策略 {overflow}, "
+              f"内存 {cls.store.nbytes / 1024 / 1024:.1f} MB")
 
     @classmethod
-    def get_node(cls):
-        """复制共享几何体"""
-        n = cls.shared_card.copyTo(cls.node_root)
-        return n
+    def setup(cls, render_node, camera, gsg=None, shader=True, threaded=True):
+        """
+        创建渲染器; shader 为 True 时优先用着色器计算粒子的运动、淡出与闪烁, 不支持时退回固定管线
+        threaded 为 True 时模拟在专用线程上推进 (画面晚一帧), 此时每帧需先 sync() 再 update()
+        """
+        program = load_sprite_shader(gsg) if shader else None
+        if shader and program is None:
+            print("[ParticleSystem] 当前显卡/驱动不支持 GLSL 着色器, 粒子使用固定管线渲染")
+        cls.renderer = ParticleRenderer(render_node, camera, create_particle_texture(), program)
+        if cls.pipeline is not None:
+            cls.pipeline.close()
+        cls.pipeline = SimulationPipeline(cls.step, cls.store, program is None) if threaded else None
+        # 模拟线程中触发的爆炸音效由主线程播放
+        AudioManager.deferred = [] if threaded else None
 
     @classmethod
     def add(cls, pos, v, color, size, lifetime_ms, drag=0.0, trace=0, tail=None, flash=None):
-        p = Particle(pos, v, color, size, lifetime_ms, drag, trace, tail, flash)
-        cls.particles.append(p)
+        cls.store.add(pos, v, color, size, lifetime_ms, drag, trace, tail, flash)
 
     @classmethod
-    def spawn_ghost(cls, pos, color_scale, size, duration):
-        """生成一个不动的、纯视觉的残影粒子"""
-        # 为了性能，直接复用Particle类但标记为ghost
-        p = Particle(
-            pos=(pos.x, pos.y, pos.z),
-            v=(0,0,0),
-            color=(1,1,1), # 颜色会被下面的setColorScale覆盖
-            size=size.x, # 假设均匀缩放
-            lifetime_ms=duration*1000,
-            drag_coeff=0, trace_frames=0, tail_config=None, flash_config=None
-        )
-        p.node.setColorScale(color_scale)
-        p.is_ghost = True
-        cls.particles.append(p)
-
-    @classmethod
-    def launch_firework(cls, pos, v, time, color, size, trace_frames, tail_cfg, strategy):
-        f = Firework(pos, v, time, color, size, trace_frames, tail_cfg, strategy)
+    def launch_firework(cls, pos, v, time, color, size, trace_frames, tail_cfg, strategy, rng=random):
+        f = Firework(pos, v, time, color, size, trace_frames, tail_cfg, strategy, rng)
         AudioManager.play("launch")
         cls.fireworks.append(f)
         # print(pos,v,time)
+        return f
 
     @classmethod
-    def update(cls, task):
-        dt = globalClock.getDt()
-        
-        # 更新烟花弹
-        cls.fireworks = [f for f in cls.fireworks if f.update(dt)]
-        
-        # 更新粒子
-        active_particles = []
-        for p in cls.particles:
-            if p.update(dt):
-                active_particles.append(p)
-            else:
-                p.cleanup()
-        cls.particles = active_particles
-        
-        return Task.cont
+    def clear(cls):
+        """清空所有粒子与烟花弹"""
+        cls.store.clear()
+        cls.fireworks = []
 
-# ==========================================
-# 3. 爆炸策略与导演 (Strategies & Director)
-# ==========================================
+    @classmethod
+    def seek(cls, launches, t, frame_dt=1.0 / 60):
+        """
+        直接重建时间 t 的粒子群 (闭式解, 不逐帧模拟), 耗时只与仍可能存活的烟花数有关
+        Args:
+            launches (list): 发射记录 (LaunchRecord), 按时间排序且不晚于 t
+            frame_dt (float): 轨迹历史的采样间隔
+        """
+        cls.clear()
+        store = cls.store
+        AudioManager.muted = True
+        try:
+            for record in launches:
+                age = t - record.time
+                f = record.launch()
+                shell = [f.shell[0]] if f.shell else []
+                if age < record.duration:
+                    # 仍在飞行: 弹体 (连同轨迹与尾焰) 推进到 t
+                    f.age = age
+                    store.fast_forward(shell, age, frame_dt)
+                    continue
+
+                # 已爆炸: 弹体先推进到爆炸时刻, 爆炸碎片再与弹体留下的尾焰一起推进剩余时间
+                sparks = store.fast_forward(shell, record.duration, frame_dt)
+                trail = store.trail[shell]
+                f.age = f.explode_time
+                f.update(0.0)
+                cls.fireworks.remove(f)
+                # 弹体轨迹在爆炸后开始收缩
+                dead_frames = int((age - record.duration) / frame_dt)
+                store.trails.skip(trail[trail >= 0], dead_frames)
+                store.fast_forward(np.concatenate([f.debris, sparks]), age - record.duration, frame_dt)
+        finally:
+            AudioManager.muted = False
+        if cls.renderer:
+            cls.renderer.update(store)
+        if cls.pipeline:
+            cls.pipeline.refresh()
 
-class ExplosionStrategies:
-    @staticmethod
-    def standard(pos, color, size_scale):
-        count = 100
-        for _ in range(count):
-            speed = random.uniform(10, 25)
-            # 球面随机向量
-            theta = random.uniform(0, 2*math.pi)
-            phi = random.uniform(0, math.pi)
-            vx = speed * math.sin(phi) * math.cos(theta)
-            vy = speed * math.sin(phi) * math.sin(theta)
-            vz = speed * math.cos(phi)
-            
-            # 特性：带拖尾，无Tail
-            ParticleSystem.add(
-                pos, (vx, vy, vz), color, size=0.6*size_scale, lifetime_ms=1500,
-                drag=0.05, trace=35, tail=None, flash=None
-            )
+    @classmethod
+    def sync(cls, task):
+        """流水线模式: 等待模拟线程交出上一帧; 此后到本帧 update() 之前, 导演与交互可以直接改写粒子池"""
+        cls.pipeline.sync()
+        AudioManager.flush()
+        return Task.cont
 
-    @staticmethod
-    def standard_rc(pos, color, size_scale):
-        count = 100
-        for _ in range(count):
-            speed = random.uniform(10, 25)
-            # 球面随机向量
-            theta = random.uniform(0, 2*math.pi)
-            phi = random.uniform(0, math.pi)
-            vx = speed * math.sin(phi) * math.cos(theta)
-            vy = speed * math.sin(phi) * math.sin(theta)
-            vz = speed * math.cos(phi)
-            
-            # 特性：带拖尾，无Tail
-            ParticleSystem.add(
-                pos, (vx, vy, vz), randomColor(), size=0.6*size_scale, lifetime_ms=1500,
-                drag=0.05, trace=25, tail=None, flash=None
-            )
+    @classmethod
+    def update(cls, task):
+        # 视锥外的爆炸跳过视觉更新, 远处的爆炸不再记录轨迹与闪烁
+        cls.store.set_view(*cls.renderer.frustum())
+        if cls.pipeline is None:
+            cls.step(globalClock.getDt())
+            cls.renderer.update(cls.store)
+            return Task.cont
 
-    @staticmethod
-    def heart(pos, color, size_scale):
-        count = 50
-        for theta in range(count):
-            theta = theta * 2 * math.pi / count
-            speed = 20
-            for vx in [-1, 0, 1]:
-                #vx = random.uniform(-1, 1)
-                vy = speed * (1-math.sin(theta)) * math.cos(theta)
-                vz = speed * (1-math.sin(theta)) * math.sin(theta)
-                
-                # 特性：带拖尾，无Tail
-                ParticleSystem.add(
-                    pos, (vx, vy, vz), color, size=0.6*size_scale, lifetime_ms=2400,
-                    drag=0.05, trace=0, tail=(20, 2, randomColor(), 400), flash=(1.5, 0.2)
-                )
+        # 提交前上传着色器状态 (读粒子池), 提交后只绘制上一帧的快照
+        cls.renderer.upload(cls.store)
+        cls.pipeline.submit(globalClock.getDt())
+        cls.renderer.draw(cls.pipeline.front)
+        return Task.cont
 
-    @staticmethod
-    def glitter_bomb(pos, color, size_scale):
-        """闪光弹：强闪烁，不规则运动"""
-        count = 120
-        for _ in range(count):
-            speed = random.uniform(15, 30)
-            v = Vec3(random.uniform(-1,1), random.uniform(-1,1), random.uniform(-1,1)).normalized() * speed
-            
-            ParticleSystem.add(
-                pos, (v.x, v.y, v.z), color, size=0.5*size_scale, lifetime_ms=4500,
-                drag=0.1, trace=0, tail=None, flash=(2.0, 1) # 剧烈高频闪烁
-            )
+    @classmethod
+    def step(cls, dt, timings=None):
+        """
+        推进模拟 dt 秒 (不涉及渲染, 无窗口模式直接调用)
+        Args:
+            timings (dict): 若提供, 各阶段耗时 (秒) 累加到 particle / cleanup / firework 键
+        """
+        clock = time.perf_counter
+        t0 = clock()
+        # 更新粒子 (向量化)
+        cls.store.advance(dt)
+        t1 = clock()
+        # 回收到期粒子
+        cls.store.cleanup()
+        t2 = clock()
 
-    @staticmethod
-    def text_shape_3d(pos, color, size_scale, text):
-        """文字形状"""
-        # === 修改点：使用管理器获取数据 ===
-        # points = font_data_3d[text] # 旧代码
-        points = text_manager.get_manager().get_word_data(text) # 新代码
-        
-        if not points:
-            print(f"Warning: Empty points for text '{text}'")
-            return
+        # 更新烟花弹
+        cls.fireworks = [f for f in cls.fireworks if f.update(dt)]
 
-        for i in points:
-            # i 是 (x, y, z)
-            # 这里的坐标偏移和缩放逻辑保持不变
-            v = Vec3(i[0] + random.uniform(-0.3, 0.3), 
-                     i[1] + random.uniform(-0.3, 0.3), 
-                     i[2] + random.uniform(-0.3, 0.3)) * 2 # 适当扩大间距
-            
-            # 为了让字立起来或者朝向正确，可能需要根据原来的数据调整轴向
-            # 原来的数据: i[2] 对应 -i[2]? 
-            # 你的旧代码里是: -i[2]。
-            # 我的 text_manager 生成的 z 是正向向上的 (0~15)。
-            # 如果要保持一致，可能不需要负号，或者取决于你的相机视角。
-            # 这里先按照通用逻辑写：
-            
-            # 假设字是正着立在 XY 平面上
-            final_v = Vec3(v.x, v.y, v.z)
-            
-            # 如果发现字是倒着的，可以改成:
-            # final_v = Vec3(v.x, v.y, -v.z) 
+        if timings is not None:
+            t3 = clock()
+            timings["particle"] = timings.get("particle", 0.0) + (t1 - t0)
+            timings["cleanup"] = timings.get("cleanup", 0.0) + (t2 - t1)
+            timings["firework"] = timings.get("firework", 0.0) + (t3 - t2)
 
-            ParticleSystem.add(
-                pos, (final_v.x, final_v.y, final_v.z), color, 
-                size=0.5*size_scale, lifetime_ms=4500,
-                drag=0.2, trace=0, tail=None, flash=None
-            )
+# ==========================================
+# 3. 爆炸策略与导演 (Strategies & Director)
+# ==========================================
 
 class AudioManager:
     """简单的音效管理器占位符"""
     sounds = {}
+    muted = False  # 跳转重建粒子时不播放音效
+    deferred = None  # 流水线模式下先记录, 由主线程 flush() 播放 (音效接口不保证线程安全)
     
     @classmethod
     def load(cls, loader):
@@ -446,199 +327,435 @@ class AudioManager:
 
     @classmethod
     def play(cls, name):
+        if cls.muted:
+            return
+        if cls.deferred is not None:
+            cls.deferred.append(name)
+            return
         if name in cls.sounds:
             cls.sounds[name].play()
         else:
             # print(f"[Audio] Playing {name}") # 调试用
             pass
 
+    @classmethod
+    def flush(cls):
+        """播放流水线模式下记录的音效"""
+        if not cls.deferred:
+            return
+        names, cls.deferred = cls.deferred, []
+        for name in names:
+            if name in cls.sounds:
+                cls.sounds[name].play()
+
 # ==========================================
 # 策略映射表 & 辅助函数
 # ==========================================
 
-# 1. 建立字符串到函数的映射
-STRATEGY_MAP = {
-    "standard": ExplosionStrategies.standard,
-    "standard_rc": ExplosionStrategies.standard_rc,
-    "heart": ExplosionStrategies.heart,
-    "glitter": ExplosionStrategies.glitter_bomb,
-    "text_shape_3d": ExplosionStrategies.text_shape_3d 
-}
+# 1. 内置策略 (声明见 explosions.BUILTIN_STRATEGIES), 脚本可在顶层 "strategies" 中新增或覆盖
+STRATEGY_MAP = compile_strategies()
+# 交互发射随机使用的策略
+INTERACTIVE_STRATEGIES = ["standard", "standard_rc", "glitter", "heart"]
 
 # 2. 颜色解析工具
-def parse_color(c_data):
-    """支持 [r,g,b] 列表或 "random" 字符串"""
-    if c_data == "random":
-        return randomColor()
-    return (c_data[0], c_data[1], c_data[2])
+def parse_color(c_data, rng=random):
+    """支持 [r,g,b] 列表或 "random" 字符串; 其他值抛出 TimelineError"""
+    if isinstance(c_data, str) and c_data == "random":
+        return randomColor(rng)
+    if not isinstance(c_data, (list, tuple)) or len(c_data) != 3:
+        raise TimelineError(f'颜色应为 [r, g, b] 或 "random": {c_data!r}')
+    return tuple(finite_number(c, "颜色分量") for c in c_data)
+
+
+def finite_number(value, name):
+    """转换为有限的浮点数, 否则抛出 TimelineError (脚本与外部触发中的数值都经过这里)"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise TimelineError(f"{name} 应为数值: {value!r}") from None
+    if not math.isfinite(number):
+        raise TimelineError(f"{name} 应为有限的数值: {value!r}")
+    return number
+
+# 3. 时间线编译
+def resolve_value(val, rng=random):
+    """
+    辅助函数：解析参数
+    如果参数是 {"min": a, "max": b} 格式，则返回随机值
+    如果是列表且包含 min/max，则对列表每一项做随机
+    """
+    if isinstance(val, dict) and "min" in val and "max" in val:
+        min_v = val["min"]
+        max_v = val["max"]
+
+        # 情况1: 向量/列表随机 (例如 pos: [-10, -10] 到 [10, 10])
+        if isinstance(min_v, list) and isinstance(max_v, list):
+            return [rng.uniform(a, b) for a, b in zip(min_v, max_v)]
+
+        # 情况2: 标量随机 (例如 time: 2.0 到 4.0)
+        return rng.uniform(min_v, max_v)
+
+    return val
+
+
+class TimelineError(ValueError):
+    """脚本在加载时未通过校验"""
+
+
+class LaunchRecord:
+    """一次已完全解析的发射: 触发时只需创建烟花弹"""
+    __slots__ = ("time", "pos", "velocity", "duration", "color", "size", "trace", "tail", "strategy", "seed")
+
+    def __init__(self, time, pos, velocity, duration, color, size, trace, tail, strategy, seed):
+        self.time = time
+        self.pos = pos
+        self.velocity = velocity
+        self.duration = duration
+        self.color = color
+        self.size = size
+        self.trace = trace
+        self.tail = tail
+        self.strategy = strategy
+        self.seed = seed  # 烟花弹自己的随机数流种子 (爆炸散布)
+
+    @property
+    def lifespan(self):
+        """发射后仍可能有粒子存活的最长时间 (秒)"""
+        tail_life = self.tail[3] / 1000.0 if self.tail else 0.0
+        return self.duration + max(self.strategy.lifespan, tail_life)
+
+    def launch(self):
+        return ParticleSystem.launch_firework(
+            self.pos, self.velocity, self.duration * 1000,
+            self.color, self.size, self.trace, self.tail, self.strategy,
+            random.Random(self.seed)
+        )
+
+
+class BoundStrategy:
+    """
+    策略与脚本参数绑定为 strategy(pos, color, size, rng) 形式的可调用对象
+    爆炸粒子取自 ParticleSystem 的模板库, 写入当前的粒子池, 返回其槽位
+    """
+    __slots__ = ("kernel", "args")
+
+    def __init__(self, kernel, args=()):
+        self.kernel = kernel
+        self.args = tuple(args)
+
+    @property
+    def lifespan(self):
+        return self.kernel.lifespan
+
+    def __call__(self, pos, color, size, rng=random):
+        return self.kernel(ParticleSystem.store, pos, color, size, *self.args, rng=rng,
+                           templates=ParticleSystem.templates)
+
+
+class Timeline:
+    """
+    编译后的演出时间线
+    把脚本的 firework 与 camera 两部分展开为按时间排序的扁平数组:
+    所有 min/max 随机、颜色、尾焰与策略都在加载时用固定种子解析完毕,
+    同时对脚本做校验, 错误在开演前以 TimelineError 报告.
+
+    Args:
+        data (dict): 表演脚本
+        seed (int): 随机种子, 每个事件使用由 (种子, 组序号, 事件序号) 决定的独立随机数流
+    """
+    def __init__(self, data, seed):
+        self.seed = seed
+        self.launches = []
+        self.end_time = None
+        self._strategies = {}
+        try:
+            self.kernels = compile_strategies(data.get("strategies"))
+        except (TypeError, ValueError, KeyError, SyntaxError) as e:
+            raise TimelineError(f"strategies: {e}") from e
+        self._compile_fireworks(data.get("firework", []))
+        self.launch_times = [r.time for r in self.launches]
+        # 发射后仍可能有粒子存活的最长时间
+        self.horizon = max((r.lifespan for r in self.launches), default=0.0)
+        self._compile_camera(data.get("camera", []))
+
+    @staticmethod
+    def event_rng(seed, group_idx, event_idx):
+        """脚本中第 group_idx 组第 event_idx 个事件的随机数流"""
+        return random.Random(f"{seed}-{group_idx}-{event_idx}")
+
+    def _compile_fireworks(self, groups):
+        # 结构是: [ [time, [events...]], [time, [events...]] ], 按时间稳定排序
+        groups = sorted(groups, key=lambda x: x[0])
+        for g_idx, group in enumerate(groups):
+            if not (isinstance(group, (list, tuple)) and len(group) == 2 and isinstance(group[1], list)):
+                raise TimelineError(f"firework 第 {g_idx} 组应为 [时间, [事件...]]: {group!r}")
+            trigger_time = group[0]
+            if self.end_time is not None and trigger_time > self.end_time:
+                break  # 开场秀结束后的事件永远不会触发
+            for e_idx, event in enumerate(group[1]):
+                where = f"firework[{g_idx}][{e_idx}] (t={trigger_time})"
+                try:
+                    self._compile_event(trigger_time, event, self.event_rng(self.seed, g_idx, e_idx))
+                except TimelineError:
+                    raise
+                except (TypeError, ValueError, KeyError, IndexError, OverflowError) as e:
+                    raise TimelineError(f"{where}: {e}") from e
+
+    def _compile_event(self, trigger_time, p, rng):
+        """解析单个烟花事件 (支持 repeat 和 range), 随机数的消耗顺序与逐帧解析时一致"""
+        evt_type = p.get("type", "launch_to")
+
+        if evt_type == "end":
+            if self.end_time is None:
+                self.end_time = trigger_time
+            return
+        if evt_type != "launch_to":
+            raise TimelineError(f"未知的事件类型: {evt_type}")
+
+        # 策略在所有重复之间共享
+        strat_data = p.get("strategy", {})
+        if isinstance(strat_data, str):
+            strat_name, strat_args = strat_data, []
+        elif isinstance(strat_data, dict):
+            strat_name = strat_data.get("name", "standard")
+            strat_args = strat_data.get("args", [])
+        else:
+            raise TimelineError(f'strategy 应为策略名或 {{"name": ..., "args": [...]}}: {strat_data!r}')
+        if not isinstance(strat_name, str) or not isinstance(strat_args, list):
+            raise TimelineError(f"strategy 的 name 应为字符串, args 应为列表: {strat_data!r}")
+        kernel = self.kernels.get(strat_name)
+        if kernel is None:
+            raise TimelineError(f"未知的爆炸策略: {strat_name} (可选: {', '.join(self.kernels)})")
+        if kernel.needs_text and not strat_args:
+            raise TimelineError(f"{strat_name} 需要文字参数")
+        strat_key = (strat_name, tuple(strat_args))
+        if strat_key not in self._strategies:
+            self._strategies[strat_key] = BoundStrategy(kernel, strat_args)
+        strategy = self._strategies[strat_key]
+
+        trace = int(p.get("trace", 0))
+        if not 0 <= trace < 2 ** 31:
+            raise TimelineError(f"trace 超出范围: {trace}")
+        tail_dict = p.get("tail")
+        if tail_dict and not isinstance(tail_dict, dict):
+            raise TimelineError(f"tail 应为对象: {tail_dict!r}")
+
+        for _ in range(int(p.get("repeat", 1))):
+            # 1. 位置解析 (支持 min/max 范围)
+            pos = resolve_value(p.get("pos", [0, 0, 80]), rng)
+            if len(pos) != 3:
+                raise TimelineError(f"pos 应为 [x, y, z]: {pos!r}")
+            pos_vec = (finite_number(pos[0], "pos"), finite_number(pos[1], "pos"), 0.0)  # 地面投影点
+            target_z = finite_number(pos[2], "pos")  # 目标高度
+
+            # 2. 时间解析 (支持 min/max 范围), 防止随机出 0 或负数
+            duration = max(finite_number(resolve_value(p.get("time", 2.0), rng), "time"), 0.1)
+
+            # 3. 颜色与尺寸
+            color = parse_color(p.get("color", "random"), rng)
+            size = finite_number(resolve_value(p.get("size", 0.6), rng), "size")
+
+            # 4. 尾焰
+            tail_cfg = None
+            if tail_dict:
+                tail_cfg = (
+                    finite_number(tail_dict.get("count", 20), "tail.count"),
+                    finite_number(tail_dict.get("velocity", 5), "tail.velocity"),
+                    parse_color(tail_dict.get("color", color), rng),
+                    finite_number(tail_dict.get("time", 500), "tail.time")
+                )
+
+            # 5. 物理计算: h = v0*t - 0.5*g*t^2  => v0 = h/t + 0.5*g*t
+            vz = target_z / duration + 0.5 * GRAVITY * duration
+
+            self.launches.append(LaunchRecord(
+                trigger_time, pos_vec, (0, 0, vz), duration, color, size, trace, tail_cfg, strategy,
+                rng.getrandbits(64)
+            ))
+
+    def compile_live(self, event, rng, max_repeat=32):
+        """
+        把运行时收到的 launch_to 事件 (字段与脚本相同) 解析为发射记录, 不加入时间线
+        事件来自网络, 因此文字烟花只接受词库中已有的词 (生成新词需要在渲染线程上栅格化字体),
+        新的 (策略, 参数) 组合也不会留在 strategies 中
+        Returns:
+            list: LaunchRecord, 触发时刻记为 0
+        Raises:
+            TimelineError: 事件无效
+        """
+        if not isinstance(event, dict) or event.get("type", "launch_to") != "launch_to":
+            raise TimelineError(f"只接受 launch_to 事件: {event!r}")
+        saved, self.launches = self.launches, []
+        saved_strategies, self._strategies = self._strategies, dict(self._strategies)
+        try:
+            if int(event.get("repeat", 1)) > max_repeat:
+                raise TimelineError(f"repeat 不能超过 {max_repeat}")
+            self._compile_event(0.0, event, rng)
+            for record in self.launches[:1]:  # 所有重复共享同一个策略
+                strategy = record.strategy
+                if strategy.kernel.needs_text and not text_mgr.has_word(strategy.args[0]):
+                    raise TimelineError(f"词库中没有 '{strategy.args[0]}'")
+            return self.launches
+        except TimelineError:
+            raise
+        except (TypeError, ValueError, KeyError, IndexError, OverflowError) as e:
+            raise TimelineError(str(e)) from e
+        finally:
+            self.launches = saved
+            self._strategies = saved_strategies
+
+    def _compile_camera(self, raw_cam):
+        self.cameras = []
+        for i, cam in enumerate(raw_cam):
+            try:
+                self.cameras.append({
+                    "time": float(cam["time"]),
+                    "pos": Vec3(*cam["pos"]),
+                    "look_at": Vec3(*cam["look_at"]),
+                    "up": Vec3(*cam.get("up", [0, 0, 1]))
+                })
+            except (TypeError, ValueError, KeyError) as e:
+                raise TimelineError(f"camera[{i}]: {e}") from e
+        self.cameras.sort(key=lambda x: x["time"])
+        self.camera_times = [cam["time"] for cam in self.cameras]
+
+    @property
+    def strategies(self):
+        """脚本用到的所有 (策略, 参数) 组合 (BoundStrategy)"""
+        return list(self._strategies.values())
+
+    def first_launch_after(self, t):
+        """时间 t 之后 (不含) 第一个发射记录的下标"""
+        return bisect.bisect_right(self.launch_times, t)
+
+    def launches_alive_at(self, t):
+        """时间 t 仍可能有粒子存活的发射记录 (二分查找出候选区间, 再逐条按寿命筛选)"""
+        lo = bisect.bisect_left(self.launch_times, t - self.horizon)
+        return [r for r in self.launches[lo:self.first_launch_after(t)] if t - r.time < r.lifespan]
+
+    def camera_at(self, t):
+        """
+        时间 t 的摄像机 (位置, 注视点, 上方向); 超过最后一个关键帧后返回 None (交由交互控制)
+        """
+        cams = self.cameras
+        # 与逐帧推进的旧逻辑一致: 不足两个关键帧时不运镜, 第一个关键帧之前停在第一个关键帧
+        i = max(bisect.bisect_right(self.camera_times, t) - 1, 0)
+        if i >= len(cams) - 1:
+            return None
+        f1, f2 = cams[i], cams[i + 1]
+        # 线性插值
+        factor = (t - f1["time"]) / (f2["time"] - f1["time"]) if f2["time"] > f1["time"] else 1.0
+        factor = max(0.0, min(1.0, factor))
+        pos = f1["pos"] + (f2["pos"] - f1["pos"]) * factor
+        look = f1["look_at"] + (f2["look_at"] - f1["look_at"]) * factor
+        # up 向量通常不需要插值，直接用当前的或者插值皆可，这里简单处理
+        return pos, look, f1["up"]
+
 
 class ShowDirector:
-    def __init__(self, main_app):
+    """
+    导演脚本: 按编译好的时间线发射烟花并驱动摄像机
+    Args:
+        main_app: 需提供 camera 与 enable_interaction() (无窗口模式下为替身对象)
+        data (dict): 已读取的脚本, None 则读取 CFG_PATH
+        seed (int): 随机种子, None 则使用脚本中的 "seed", 再没有则每次演出随机
+    """
+    def __init__(self, main_app, data=None, seed=None):
         self.app = main_app
         self.timer = 0
         self.active = True
-        
+
         # --- 1. 加载 JSON ---
-        try:
-            with open(resource_path(CFG_PATH), "r", encoding='utf-8') as f:
-                data = json.load(f)
-        except Exception as e:
-            print(f"读取脚本失败: {e}")
-            data = {"firework": [], "camera": []}
-
-        # --- 2. 预处理烟花数据 ---
-        # 你的结构是: [ [time, [events...]], [time, [events...]] ]
-        # 我们确保它是按时间排序的
-        self.fw_data = sorted(data.get("firework", []), key=lambda x: x[0])
-        self.fw_idx = 0
-
-        # --- 3. 预处理相机数据 ---
-        raw_cam = data.get("camera", [])
-        self.cam_script = []
-        for cam in raw_cam:
-            self.cam_script.append({
-                "time": cam["time"],
-                "pos": Vec3(*cam["pos"]),
-                "look_at": Vec3(*cam["look_at"]),
-                "up": Vec3(*cam.get("up", [0,0,1]))
-            })
-        self.cam_script.sort(key=lambda x: x["time"])
-        self.cam_idx = 0
+        if data is None:
+            try:
+                data = load_script()
+            except Exception as e:
+                print(f"读取脚本失败: {e}")
+                data = {"firework": [], "camera": []}
+
+        # 同一种子下每次运行的烟花完全一致, 且互不受触发顺序影响
+        if seed is None:
+            seed = data.get("seed", random.randrange(2**32))
+        self.seed = seed
+
+        # --- 2. 编译时间线 (解析与校验都在这里完成) ---
+        self.timeline = Timeline(data, seed)
+        self.launch_idx = 0
+
+        # --- 3. 预先采样脚本用到的爆炸模板 ---
+        for strategy in self.timeline.strategies:
+            ParticleSystem.templates.warm(strategy.kernel, strategy.args)
+
+    @property
+    def launches_done(self):
+        """所有发射记录都已触发"""
+        return self.launch_idx >= len(self.timeline.launches)
+
+    @property
+    def script_done(self):
+        """开场秀已结束 (脚本没有 end 事件时, 以最后一次发射为准)"""
+        return not self.active or (self.launches_done and self.timeline.end_time is None)
 
     def update(self, dt):
+        # 外部触发 (见 triggers.py) 在开场秀结束后的交互模式中同样有效
+        triggers = getattr(self.app, "triggers", None)
+        if triggers is not None:
+            self.launch_triggers(triggers)
         if not self.active: return
         self.timer += dt
+        timeline = self.timeline
 
-        # ==========================
-        # 1. 摄像机运镜 (插值逻辑)
-        # ==========================
-        if self.cam_idx < len(self.cam_script) - 1:
-            f1 = self.cam_script[self.cam_idx]
-            f2 = self.cam_script[self.cam_idx + 1]
-            
-            if self.timer >= f2["time"]:
-                self.cam_idx += 1
-            else:
-                # 线性插值
-                factor = (self.timer - f1["time"]) / (f2["time"] - f1["time"])
-                factor = max(0.0, min(1.0, factor))
-                
-                curr_pos = f1["pos"] + (f2["pos"] - f1["pos"]) * factor
-                curr_look = f1["look_at"] + (f2["look_at"] - f1["look_at"]) * factor
-                # up 向量通常不需要插值，直接用当前的或者插值皆可，这里简单处理
-                
-                self.app.camera.setPos(curr_pos)
-                self.app.camera.lookAt(curr_look, f1["up"])
-
-        # ==========================
-        # 2. 烟花触发逻辑
-        # ==========================
-        while self.fw_idx < len(self.fw_data):
-            # 获取当前这一组: [time, [event_dict_1, event_dict_2...]]
-            group = self.fw_data[self.fw_idx]
-            trigger_time = group[0]
-            events = group[1]
+        # 1. 摄像机运镜 (二分查找当前关键帧区间并插值)
+        self._place_camera()
 
-            if self.timer >= trigger_time:
-                # 到了时间，执行该组所有事件
-                for event in events:
-                    self.process_event(event)
-                
-                # 指针后移
-                self.fw_idx += 1
-            else:
-                # 时间未到，后面的更不用看了（因为排过序了）
-                break
+        # 2. 烟花触发: 时间线已排序, 只需从当前下标向后走
+        launches = timeline.launches
+        while self.launch_idx < len(launches) and launches[self.launch_idx].time <= self.timer:
+            launches[self.launch_idx].launch()
+            self.launch_idx += 1
 
-    # ... (前面的 __init__ 和 update 方法保持不变) ...
+        # 3. 开场秀结束
+        if timeline.end_time is not None and self.timer >= timeline.end_time:
+            self.end_intro()
 
-    def resolve_value(self, val):
+    def launch_triggers(self, queue):
+        """执行外部触发队列中本帧的发射 (每帧一次, 数量与积压由 TriggerQueue 控制)"""
+        for trigger in queue.drain():
+            rng = random.Random(f"{self.seed}-trigger-{trigger.seq}")
+            try:
+                records = self.timeline.compile_live(trigger.event, rng, queue.max_per_frame)
+            except TimelineError as e:
+                queue.reject(trigger, e)
+                continue
+            for record in records:
+                record.launch()
+            queue.record(trigger)
+
+    def _place_camera(self):
+        cam = self.timeline.camera_at(self.timer)
+        if cam is not None:
+            pos, look, up = cam
+            self.app.camera.setPos(pos)
+            self.app.camera.lookAt(look, up)
+
+    def seek(self, t):
         """
-        辅助函数：解析参数
-        如果参数是 {"min": a, "max": b} 格式，则返回随机值
-        如果是列表且包含 min/max，则对列表每一项做随机
+        跳转到演出时间 t (用于排练时快速定位)
+        摄像机与发射下标由二分查找得到, 粒子群由 ParticleSystem.seek 直接重建
         """
-        if isinstance(val, dict) and "min" in val and "max" in val:
-            min_v = val["min"]
-            max_v = val["max"]
-            
-            # 情况1: 向量/列表随机 (例如 pos: [-10, -10] 到 [10, 10])
-            if isinstance(min_v, list) and isinstance(max_v, list):
-                return [random.uniform(a, b) for a, b in zip(min_v, max_v)]
-            
-            # 情况2: 标量随机 (例如 time: 2.0 到 4.0)
-            return random.uniform(min_v, max_v)
-            
-        return val
-
-    def process_event(self, p):
-        """解析并执行单个烟花事件 (支持 repeat 和 range)"""
-        evt_type = p.get("type", "launch_to")
-
-        if evt_type == "end":
+        if not self.active: return
+        timeline = self.timeline
+        t = max(0.0, t)
+        if timeline.end_time is not None:
+            t = min(t, timeline.end_time)
+        self.timer = t
+        self.launch_idx = timeline.first_launch_after(t)
+        self._place_camera()
+        ParticleSystem.seek(timeline.launches_alive_at(t), t)
+
+        if timeline.end_time is not None and t >= timeline.end_time:
             self.end_intro()
-            return
-
-        if evt_type == "launch_to":
-            # 获取重复次数，默认为 1
-            repeat_count = p.get("repeat", 1)
-            
-            for _ in range(repeat_count):
-                # === 关键：每次循环都重新解析随机值 ===
-                
-                # 1. 位置解析 (支持 min/max 范围)
-                raw_pos = p.get("pos", [0,0,80])
-                pos = self.resolve_value(raw_pos)
-                pos_vec = (pos[0], pos[1], 0) # 地面投影点
-                target_z = pos[2] # 目标高度
-
-                # 2. 时间解析 (支持 min/max 范围)
-                raw_time = p.get("time", 2.0)
-                duration = self.resolve_value(raw_time)
-
-                # 3. 颜色解析
-                color = parse_color(p.get("color", "random"))
-                
-                # 4. 其他参数
-                size = self.resolve_value(p.get("size", 0.6))
-                trace = p.get("trace", 0)
-
-                # 5. 尾焰解析
-                tail_dict = p.get("tail")
-                tail_cfg = None
-                if tail_dict:
-                    tail_cfg = (
-                        tail_dict.get("count", 20),
-                        tail_dict.get("velocity", 5),
-                        parse_color(tail_dict.get("color", color)), 
-                        tail_dict.get("time", 500)
-                    )
-
-                # 6. 策略解析
-                strat_data = p.get("strategy", {})
-                if isinstance(strat_data, str):
-                    strat_name = strat_data
-                    strat_args = []
-                else:
-                    strat_name = strat_data.get("name", "standard")
-                    strat_args = strat_data.get("args", [])
-
-                base_func = STRATEGY_MAP.get(strat_name, ExplosionStrategies.standard)
-                # 再次封装以支持 lambda 参数传递
-                real_strategy = lambda _p, _c, _s: base_func(_p, _c, _s, *strat_args)
-
-                # 7. 物理计算并发射
-                # h = v0*t - 0.5*g*t^2  => v0 = h/t + 0.5*g*t
-                # 防止 duration 随机出 0 或负数
-                if duration <= 0.1: duration = 0.1
-                
-                vz = target_z / duration + 0.5 * GRAVITY * duration
-                v = (0, 0, vz)
 
-                ParticleSystem.launch_firework(
-                    pos_vec, v, duration * 1000, 
-                    color, size, trace, tail_cfg, real_strategy
-                )
     def end_intro(self):
         self.active = False
         self.app.enable_interaction()
@@ -648,31 +765,59 @@ class ShowDirector:
 # 4. 主程序 (Main Application)
 # ==========================================
 
+BLOOM = dict(blend=(0, 0, 0, 1), desat=-0.5, intensity=2.5, size="medium")
+
+
+def setup_scene(base):
+    """
+    窗口演出与离线导出共用的画面设置: 背景色、视角与泛光
+    驱动不支持 CommonFilters 的 Cg 着色器时 (例如 Mesa 软件渲染), 改用参数相同的 GLSL 泛光
+    Returns:
+        CommonFilters | GlslBloom: 需保持引用, 否则后期效果会被回收
+    """
+    base.setBackgroundColor(0, 0, 0.05)
+    base.camLens.setFov(90)
+    if supports_cg_filters(base.win.getGsg()):
+        filters = CommonFilters(base.win, base.cam)
+        filters.setBloom(**BLOOM)
+    else:
+        filters = GlslBloom(base.win, base.cam, **BLOOM)
+    return filters
+
+
 class FireworkShow(ShowBase):
-    def __init__(self):
+    def __init__(self, script_data):
         super().__init__()
+        self.script_data = script_data
         
         # --- 1. 环境配置 ---
-        self.setBackgroundColor(0, 0, 0.05)
         self.disableMouse() 
         # self.setFrameRateMeter(True)
-        self.camLens.setFov(90)
 
         # --- 2. 光效与后期 ---
-        self.filters = CommonFilters(self.win, self.cam)
-        self.filters.setBloom(blend=(0, 0, 0, 1), desat=-0.5, intensity=2.5, size="medium")
+        self.filters = setup_scene(self)
         
         # --- 3. 初始化子系统 ---
-        ParticleSystem.setup(render)
+        ParticleSystem.configure(**script_data.get("engine", {}))
+        ParticleSystem.setup(render, self.cam, self.win.getGsg(), **script_data.get("render", {}))
         AudioManager.load(self.loader)
-        self.director = ShowDirector(self)
+        # 按实测帧时间调整模拟细节, 保持目标帧率
+        self.governor = DetailGovernor(**script_data.get("governor", {}))
+        self.particle_time = None  # 上一帧粒子模拟与绘制的耗时 (秒), 供调节器判断空闲余量
+        self.director = ShowDirector(self, script_data)
+        # 外部触发端口 (脚本中的 "triggers" 段, 见 triggers.py)
+        self.triggers = None
+        if "triggers" in script_data:
+            from triggers import TriggerServer
+            self.trigger_server = TriggerServer(**script_data["triggers"])
+            self.triggers = self.trigger_server.queue
         self.is_paused = True
         # --- 4. 背景音乐 (新增) ---
         # 请确保目录下有 bgm.mp3 或者修改为你自己的文件名
         try:
-            self.bgm = self.loader.loadMusic(fix_panda3d_path(resource_path("../assets/audio/bgm/bgm.mp3"))) 
+            self.bgm = self.loader.loadMusic(fix_panda3d_path(resource_path(BGM_PATH))) 
             self.bgm.setLoop(True)
-            self.bgm.setVolume(0.5)
+            self.bgm.setVolume(BGM_VOLUME)
             self.bgm.play()
         except:
             pass
@@ -698,7 +843,13 @@ class FireworkShow(ShowBase):
         )
 
         # --- 6. 任务管理 ---
-        self.taskMgr.add(self.update_particles, "ParticleUpdate")
+        if ParticleSystem.pipeline is None:
+            self.taskMgr.add(self.update_particles, "ParticleUpdate")
+        else:
+            # 流水线: 帧首 (输入处理之前) 取回模拟线程的结果, 导演与交互事件 (sort 0) 随后改写粒子池,
+            # 渲染 (igLoop, sort 50) 之前再把下一帧交给模拟线程, 使模拟与渲染重叠
+            self.taskMgr.add(ParticleSystem.sync, "ParticleSync", sort=-60)
+            self.taskMgr.add(self.update_particles, "ParticleUpdate", sort=40)
         self.taskMgr.add(self.update_director, "DirectorUpdate")
         
         # --- 7. 交互状态 ---
@@ -711,6 +862,9 @@ class FireworkShow(ShowBase):
         self.accept("escape", self.start_exit_sequence)
         # 绑定跳过键
         self.accept("enter", self.director.end_intro)
+        # 排练用: 左右方向键在开场秀中快退 / 快进 5 秒
+        self.accept("arrow_left", self.seek_show, [-5.0])
+        self.accept("arrow_right", self.seek_show, [5.0])
 
         self.win.setCloseRequestEvent('window-close-attempt')
         self.accept('window-close-attempt', self.start_exit_sequence)
@@ -762,12 +916,26 @@ class FireworkShow(ShowBase):
             self.ui_text.setText("")
         # print(f"Paused: {self.is_paused}")
 
+    def seek_show(self, delta):
+        """开场秀中跳转 delta 秒"""
+        if self.interactive_mode:
+            return
+        self.director.seek(self.director.timer + delta)
+
     def update_particles(self, task):
         """粒子更新任务 (含暂停逻辑)"""
         if self.is_paused:
             return Task.cont
-            
-        return ParticleSystem.update(task)
+
+        # 细节恢复看工作耗时: 垂直同步下帧时间总是约等于刷新间隔
+        ParticleSystem.store.detail = self.governor.update(globalClock.getDt(), self.particle_time)
+        t0 = time.perf_counter()
+        ParticleSystem.update(task)
+        self.particle_time = time.perf_counter() - t0
+        if ParticleSystem.pipeline is not None:
+            # 模拟在专用线程上与渲染重叠, 以较慢的一方为准
+            self.particle_time = max(self.particle_time, ParticleSystem.pipeline.step_time)
+        return Task.cont
 
     def update_director(self, task):
         """导演脚本更新任务 (含暂停逻辑)"""
@@ -807,7 +975,7 @@ class FireworkShow(ShowBase):
         self.camera.setPos(0, -20, 25)
         self.camera.lookAt(0, 0, 40)
         
-        self.director = ShowDirector(self) # 重置导演
+        self.director = ShowDirector(self, self.script_data) # 重置导演
         # print("重播开场秀...")
 
         # 【修复】重新绑定 Enter 键到新导演的 end_intro 方法
@@ -817,22 +985,24 @@ class FireworkShow(ShowBase):
     def user_exit(self):
         sys.exit()
 
-    def launch_firework_at(self, target_pos, start_pos=None, color_tuple=None):
+    @staticmethod
+    def launch_firework_at(target_pos, start_pos=None, color_tuple=None, strategy_name=None, rng=random,
+                           kernels=None):
         """
         发射烟花打击特定目标点
         Args:
             target_pos (Vec3): 爆炸目标点
             start_pos (Vec3, optional): 发射起点. 默认为目标点在地面上的投影.
+            strategy_name (str, optional): 爆炸策略, 默认从 INTERACTIVE_STRATEGIES 中随机选择
+            rng (random.Random): 爆炸散布使用的随机数流
+            kernels (dict, optional): 策略名 -> BurstKernel, 默认为内置策略; 演出中传入当前导演编译的策略,
+                使脚本 "strategies" 中声明或覆盖的策略对交互发射同样生效
         """
         if color_tuple is None:
             color_tuple = (random.random(), random.random(), random.random())
         
-        strategy = random.choice([
-            ExplosionStrategies.standard, 
-            ExplosionStrategies.standard_rc, 
-            ExplosionStrategies.glitter_bomb,
-            ExplosionStrategies.heart
-        ])
+        kernels = STRATEGY_MAP if kernels is None else kernels
+        strategy = BoundStrategy(kernels[strategy_name or random.choice(INTERACTIVE_STRATEGIES)])
 
         # 1. 确定起点
         if start_pos is None:
@@ -871,13 +1041,13 @@ class FireworkShow(ShowBase):
             v_launch, 
             flight_time * 1000, 
             color_tuple, 
-            0.4, 10, tail_cfg, strategy
+            0.4, 10, tail_cfg, strategy, rng
         )
 
     def user_random_launch(self):
         if self.is_paused: return
         pos = Vec3(random.uniform(-40, 40), random.uniform(-40, 40), random.uniform(50, 90))
-        self.launch_firework_at(pos)
+        self.launch_firework_at(pos, kernels=self.director.timeline.kernels)
 
     def user_click_launch(self):
         """
@@ -918,9 +1088,10 @@ class FireworkShow(ShowBase):
             if launch_origin.z < 0: launch_origin.z = 0 # 地面以上
 
             # 调用通用发射函数
-            self.launch_firework_at(target_pos, start_pos=launch_origin)
+            self.launch_firework_at(target_pos, start_pos=launch_origin, kernels=self.director.timeline.kernels)
 
 if __name__ == "__main__":
-    GRAVITY = 9.8
-    app = FireworkShow()
+    script_data = load_script()
+    prepare_text_resources(script_data)
+    app = FireworkShow(script_data)
     app.run()
@@ -0,0 +1,296 @@
+"""
+多视角共享模拟 (Multi-view)
+活动现场常由一台机器驱动多台投影仪, 每台显示不同机位. 这里由一个服务进程运行 ShowDirector + ParticleSystem,
+每帧把渲染数据 (粒子的位置 / 颜色 / 尺寸与轨迹) 发布到 multiprocessing.shared_memory 中的环形缓冲;
+任意数量的观看进程零拷贝地映射同一块内存, 按各自的摄像机轨道渲染. 无论有多少个视角, 模拟只运行一次,
+所有画面中的烟花也完全相同.
+
+用法 (在 src 目录下):
+    python multiview.py serve [脚本路径] [--name fireworks] [--seed 0] [--fps 60]
+    python multiview.py view [脚本路径] [--name fireworks] [--camera 机位.json] [--size 1920x1080] [--origin 0,0]
+
+机位文件与脚本的 "camera" 部分格式相同: {"camera": [{"time": 0, "pos": [...], "look_at": [...]}, ...]},
+省略时使用脚本本身的运镜. 服务进程以实时速度按固定步长推进, 不创建窗口也不播放音频.
+"""
+import argparse
+import json
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+from direct.showbase.ShowBase import ShowBase
+from direct.task import Task
+from panda3d.core import loadPrcFileData
+
+from main import ParticleSystem, Timeline, load_script, prepare_text_resources, setup_scene
+from headless import HeadlessShow
+from pipeline import RenderSnapshot, snapshot_layout
+
+_MAGIC = 0x46697265776F726B  # "Firework"
+_ALIGN = 64
+
+# 头部 (int64): 魔数, 粒子容量, 轨迹容量, 轨迹长度, 槽位数, 最新帧号 (-1 表示尚无), 服务已结束
+_H_MAGIC, _H_CAPACITY, _H_TRAIL_CAPACITY, _H_TRAIL_LENGTH, _H_SLOTS, _H_LATEST, _H_CLOSED = range(7)
+_HEADER_SIZE = 8
+# 每个槽位的元数据 (int64): 序号 (写入中为奇数), 帧号, high_water, 轨迹数; 演出时间另存为 float64
+_M_SEQ, _M_FRAME, _M_HIGH_WATER, _M_TRAILS = range(4)
+_META_SIZE = 4
+
+
+def _layout(capacity, trail_capacity, trail_length, slots):
+    """
+    共享内存布局: [(名称, 槽位或 None, 偏移, 形状, dtype)] 与总字节数
+    """
+    entries = [("header", None, (_HEADER_SIZE,), np.int64), ("meta", None, (slots, _META_SIZE), np.int64),
+               ("time", None, (slots,), np.float64)]
+    for slot in range(slots):
+        entries += [(name, slot, shape, dtype)
+                    for name, shape, dtype in snapshot_layout(capacity, trail_capacity, trail_length)]
+    offset = 0
+    placed = []
+    for name, slot, shape, dtype in entries:
+        placed.append((name, slot, offset, shape, dtype))
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        offset += -(-size // _ALIGN) * _ALIGN
+    return placed, offset
+
+
+def _attach(name):
+    """附加到已有的共享内存, 不向 resource_tracker 登记 (否则观看进程退出时会删除服务进程的共享内存)"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python 3.13 之前没有 track 参数
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class FrameRing:
+    """
+    共享内存中的帧环形缓冲 (单写多读)
+    写入第 frame 帧时使用槽位 frame % slots. 每个槽位带一个序号 (seqlock):
+    写入前加一变为奇数, 写完再加一; 读者在读取前后比较序号, 不一致说明读取期间槽位被覆盖.
+    槽位数 >= 3 时, 读者绘制一帧期间写者要连续写完两帧才会覆盖它, 实际很少发生.
+
+    用 create() (服务进程) 或 attach() (观看进程) 构造.
+    """
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        header = np.ndarray((_HEADER_SIZE,), np.int64, shm.buf)
+        if header[_H_MAGIC] != _MAGIC:
+            raise ValueError(f"共享内存 {shm.name} 不是烟花帧缓冲")
+        self.slots = int(header[_H_SLOTS])
+        placed, self.nbytes = _layout(int(header[_H_CAPACITY]), int(header[_H_TRAIL_CAPACITY]),
+                                      int(header[_H_TRAIL_LENGTH]), self.slots)
+        arrays = [{} for _ in range(self.slots)]
+        for name, slot, offset, shape, dtype in placed:
+            view = np.ndarray(shape, dtype, shm.buf, offset)
+            if slot is None:
+                setattr(self, name, view)
+            else:
+                arrays[slot][name] = view
+        self.snapshots = [RenderSnapshot(a) for a in arrays]
+
+    @classmethod
+    def create(cls, name, store, slots=3):
+        """按粒子池的容量创建共享内存 (同名的残留共享内存会被替换)"""
+        trails = store.trails
+        _, size = _layout(store.capacity, trails.capacity, trails.max_length, slots)
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            print(f"[MultiView] 替换残留的共享内存 {name}")
+            stale = _attach(name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray((_HEADER_SIZE,), np.int64, shm.buf)
+        header[:] = 0
+        header[[_H_CAPACITY, _H_TRAIL_CAPACITY, _H_TRAIL_LENGTH, _H_SLOTS]] = (
+            store.capacity, trails.capacity, trails.max_length, slots)
+        header[_H_LATEST] = -1
+        header[_H_MAGIC] = _MAGIC
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        return cls(_attach(name), owner=False)
+
+    @property
+    def closed(self):
+        """服务进程已结束, 不会再有新帧"""
+        return bool(self.header[_H_CLOSED])
+
+    def publish(self, frame, show_time, store):
+        """把粒子池的当前状态写为第 frame 帧"""
+        slot = frame % self.slots
+        meta = self.meta[slot]
+        snapshot = self.snapshots[slot]
+        meta[_M_SEQ] += 1
+        snapshot.capture(store)
+        meta[_M_FRAME] = frame
+        meta[_M_HIGH_WATER] = snapshot.high_water
+        meta[_M_TRAILS] = snapshot.trails.count
+        self.time[slot] = show_time
+        meta[_M_SEQ] += 1
+        self.header[_H_LATEST] = frame
+
+    def acquire(self):
+        """
+        取最新的一帧 (零拷贝, 数组直接指向共享内存)
+        Returns:
+            tuple | None: (帧号, 演出时间, RenderSnapshot, 凭据); 尚无完整帧时为 None.
+                          用完后以凭据调用 intact() 确认读取期间没有被覆盖
+        """
+        frame = int(self.header[_H_LATEST])
+        if frame < 0:
+            return None
+        slot = frame % self.slots
+        meta = self.meta[slot]
+        seq = int(meta[_M_SEQ])
+        if seq % 2 or meta[_M_FRAME] != frame:
+            return None  # 恰好又被写者占用, 下一次再取
+        snapshot = self.snapshots[slot]
+        snapshot.high_water = int(meta[_M_HIGH_WATER])
+        snapshot.trails.resize(int(meta[_M_TRAILS]))
+        show_time = float(self.time[slot])
+        if meta[_M_SEQ] != seq:
+            return None
+        return frame, show_time, snapshot, (slot, seq)
+
+    def intact(self, token):
+        slot, seq = token
+        return self.meta[slot, _M_SEQ] == seq
+
+    def close(self):
+        """断开映射; 服务进程同时标记结束并删除共享内存"""
+        # 先释放指向共享内存的数组, 否则 SharedMemory.close() 会因缓冲仍被引用而失败
+        self.header = self.meta = self.time = None
+        self.snapshots = []
+        if self.owner:
+            np.ndarray((_HEADER_SIZE,), np.int64, self.shm.buf)[_H_CLOSED] = 1
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def serve(data, name="fireworks", seed=0, fps=60, slots=3):
+    """
+    服务进程: 以实时速度按固定步长模拟演出, 每帧发布到共享内存
+    模拟跟不上实时时不丢帧, 只是整体变慢 (与离线导出相同的固定步长, 画面与无窗口模式逐帧一致)
+    """
+    show = HeadlessShow(data, seed=seed, fps=fps)
+    store = ParticleSystem.store
+    ring = FrameRing.create(name, store, slots)
+    print(f"[MultiView] 共享内存 {name}: {ring.nbytes / 1024 / 1024:.1f} MB, {slots} 个槽位; "
+          f"观看进程: python multiview.py view --name {name}")
+    try:
+        ring.publish(0, 0.0, store)
+        start = time.perf_counter()
+        while not show.finished:
+            show.step()
+            ring.publish(show.frame, show.time, store)
+            delay = start + show.time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        print(f"[MultiView] 演出结束 ({show.frame} 帧, 实际用时 {time.perf_counter() - start:.1f} s)")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring.close()
+
+
+class ViewerShow(ShowBase):
+    """
+    观看进程: 映射服务进程的帧缓冲, 按自己的摄像机轨道渲染
+    Args:
+        ring (FrameRing): attach() 得到的帧缓冲
+        cameras (list): 摄像机关键帧, 格式与脚本的 "camera" 部分相同
+    """
+    def __init__(self, ring, cameras):
+        super().__init__()
+        self.ring = ring
+        self.track = Timeline({"camera": cameras}, seed=0)
+        self.frame = -1
+        self.announced = False
+        self.disableMouse()
+        self.filters = setup_scene(self)
+        # 快照只有 CPU 展开所需的数据, 不使用粒子着色器; 模拟不在本进程中运行
+        ParticleSystem.setup(self.render, self.cam, self.win.getGsg(), shader=False, threaded=False)
+        self.taskMgr.add(self.update_view, "ViewUpdate")
+        self.accept("escape", sys.exit)
+
+    def update_view(self, task):
+        # 绘制期间槽位被覆盖时换最新的一帧重画, 最多重试两次
+        for _ in range(3):
+            got = self.ring.acquire()
+            if got is None:
+                break
+            frame, show_time, snapshot, token = got
+            if frame == self.frame:
+                break
+            cam = self.track.camera_at(show_time)
+            if cam is not None:
+                pos, look, up = cam
+                self.camera.setPos(pos)
+                self.camera.lookAt(look, up)
+            ParticleSystem.renderer.draw(snapshot)
+            if self.ring.intact(token):
+                self.frame = frame
+                break
+        if self.ring.closed and not self.announced:
+            self.announced = True
+            print("[MultiView] 服务进程已结束, 保持最后一帧")
+        return Task.cont
+
+
+def main():
+    parser = argparse.ArgumentParser(description="一次模拟, 多个视角渲染")
+    sub = parser.add_subparsers(dest="mode", required=True)
+    serve_parser = sub.add_parser("serve", help="运行模拟并发布到共享内存")
+    view_parser = sub.add_parser("view", help="按自己的机位渲染共享内存中的演出")
+    for p in (serve_parser, view_parser):
+        p.add_argument("script", nargs="?", help="表演脚本路径 (默认 config/config.json)")
+        p.add_argument("--name", default="fireworks", help="共享内存名称")
+    serve_parser.add_argument("--seed", type=int, default=0)
+    serve_parser.add_argument("--fps", type=int, default=60)
+    serve_parser.add_argument("--slots", type=int, default=3, help="环形缓冲的槽位数 (至少 2)")
+    view_parser.add_argument("--camera", help="机位文件 (JSON, 含 \"camera\" 关键帧), 默认使用脚本的运镜")
+    view_parser.add_argument("--size", default=None, help="窗口尺寸, 例如 1920x1080")
+    view_parser.add_argument("--origin", default=None, help="窗口位置, 例如 1920,0 (放到第二块屏幕)")
+    view_parser.add_argument("--fullscreen", action="store_true")
+    args = parser.parse_args()
+
+    data = load_script(args.script)
+    if args.mode == "serve":
+        if args.slots < 2:
+            parser.error("--slots 至少为 2")
+        prepare_text_resources(data)
+        serve(data, args.name, args.seed, args.fps, args.slots)
+        return
+
+    cameras = data.get("camera", [])
+    if args.camera:
+        with open(args.camera, "r", encoding="utf-8") as f:
+            track = json.load(f)
+        cameras = track["camera"] if isinstance(track, dict) else track
+    config = []
+    if args.size:
+        config.append("win-size " + args.size.lower().replace("x", " "))
+    if args.origin:
+        config.append("win-origin " + args.origin.replace(",", " "))
+    if args.fullscreen:
+        config.append("fullscreen 1")
+    if config:
+        loadPrcFileData("multiview", "\n".join(config))
+    try:
+        ring = FrameRing.attach(args.name)
+    except FileNotFoundError:
+        sys.exit(f"[MultiView] 找不到共享内存 {args.name}, 请先运行 python multiview.py serve")
+    ViewerShow(ring, cameras).run()
+
+
+if __name__ == "__main__":
+    main()
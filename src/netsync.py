@@ -0,0 +1,610 @@
+"""
+多机同步 (Lockstep Sync)
+户外装置常由多台电脑各驱动一块屏幕. 各自用 globalClock.getDt() 推进 ShowDirector.timer、使用各自的随机数,
+时间一长就会错开. 同步模式下由一台主机 (master) 通过 UDP 发布演出时钟与随机种子, 其余节点 (follower)
+把时间线对齐到这个时钟:
+    - 所有节点都按固定步长 1/fps 逐帧模拟 (与无窗口模式相同), 同一种子下第 N 帧的状态在每台机器上都相同,
+      因此不需要传输粒子数据, 只同步 "现在应该模拟到第几帧"
+    - 小的漂移通过把本地时钟加快 / 减慢至多 MAX_SLEW 平滑修正; 落后较多时多模拟几帧追上;
+      相差超过 SEEK_THRESHOLD (例如中途加入) 时用闭式解直接跳转
+    - 交互发射 (点击 / 空格) 与提前结束开场秀作为小事件发给主机, 由主机定下执行的帧号 (留出 LAUNCH_LEAD
+      的提前量) 再转发给所有节点, 各节点在同一帧执行
+    - 暂停、快进 / 快退与重播只能在主机上操作
+
+协议为 UDP 上的 JSON 数据报:
+    follower -> master  {"type": "hello", "ts": ...}            每秒一次, 兼作心跳
+    master -> follower  {"type": "welcome", "ts": ...}          原样返回 ts, 用于估计往返延迟
+    master -> follower  {"type": "clock", "t", "fps", "seed", "script", "gen", "anchor", "restart", "paused",
+                         "events": [...]}                        每秒 CLOCK_RATE 次
+    follower -> master  {"type": "request", "event": {...}}     交互事件请求
+主机逐个向登记过的节点发送 (而不是广播), 因此在同一台机器上用多个进程即可测试:
+
+    python netsync.py master --headless --duration 30 --report 5
+    python netsync.py follower --master 127.0.0.1 --headless --duration 30 --report 5 --launch-every 2
+
+无窗口节点每隔 --report 秒输出一行该帧的状态摘要, 各节点同一帧的 digest 应完全相同.
+去掉 --headless 即为带窗口的演出 (主机按 Ctrl 开始).
+"""
+import argparse
+import bisect
+import hashlib
+import json
+import math
+import random
+import socket
+import time
+
+from direct.task import Task
+from panda3d.core import Vec3
+
+from main import FireworkShow, INTERACTIVE_STRATEGIES, ParticleSystem, load_script, prepare_text_resources
+from headless import HeadlessApp, HeadlessShow
+
+PORT = 47600
+CLOCK_RATE = 30         # 主机每秒发送时钟的次数
+HELLO_INTERVAL = 1.0    # 节点心跳间隔 (秒)
+FOLLOWER_TIMEOUT = 5.0  # 超过这么久没有心跳的节点不再发送
+LOST_TIMEOUT = 3.0      # 节点超过这么久没有收到时钟即提示失去联系
+LAUNCH_LEAD = 0.25      # 交互事件的提前量 (秒): 先送达所有节点, 再在同一帧执行
+MAX_SLEW = 0.05         # 平滑修正时本地时钟的最大快慢比例
+CORRECTION_GAIN = 0.5   # 每秒修正的误差比例
+SNAP_THRESHOLD = 0.25   # 误差超过此值 (秒) 时本地时钟直接对齐, 逐帧模拟追上
+SEEK_THRESHOLD = 3.0    # 误差超过此值 (秒) 时用闭式解跳转
+MAX_CATCHUP = 8         # 每次 update 最多模拟的帧数
+
+
+def script_digest(data):
+    """脚本内容的短摘要, 用于发现各节点脚本不一致"""
+    return hashlib.sha1(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _vector(value):
+    """三个有限数值组成的列表, 否则抛出 ValueError"""
+    if not isinstance(value, (list, tuple)) or len(value) != 3 or not all(_is_number(v) for v in value):
+        raise ValueError(f"应为三个数值: {value!r}")
+    return [float(v) for v in value]
+
+
+def validate_event(event):
+    """
+    检查交互事件的字段 (事件来自网络, 会在所有节点上执行)
+    Returns:
+        dict: 只含已知字段的事件
+    Raises:
+        ValueError: 事件无效
+    """
+    kind = event.get("kind")
+    if kind == "end_intro":
+        return {"kind": kind}
+    if kind != "launch":
+        raise ValueError(f"未知的事件类型: {kind!r}")
+    start = event.get("start")
+    if event.get("strategy") not in INTERACTIVE_STRATEGIES:
+        raise ValueError(f"未知的交互策略: {event.get('strategy')!r}")
+    if not _is_int(event.get("seed")):
+        raise ValueError(f"seed 应为整数: {event.get('seed')!r}")
+    return {"kind": kind, "target": _vector(event.get("target")),
+            "start": None if start is None else _vector(start), "color": _vector(event.get("color")),
+            "strategy": event["strategy"], "seed": event["seed"]}
+
+
+def _valid_clock(message):
+    """主机时钟消息的字段是否齐全且类型正确"""
+    return (_is_number(message.get("t")) and _is_int(message.get("fps")) and message["fps"] > 0
+            and _is_int(message.get("seed")) and _is_int(message.get("gen"))
+            and _is_int(message.get("anchor")) and message["anchor"] >= 0
+            and isinstance(message.get("restart"), bool) and isinstance(message.get("paused"), bool)
+            and isinstance(message.get("events", []), list))
+
+
+def parse_address(text, default_port=PORT):
+    host, _, port = text.partition(":")
+    return host, int(port) if port else default_port
+
+
+class _Endpoint:
+    """非阻塞的 UDP 套接字, 收发 JSON 数据报"""
+    def __init__(self, address):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.sock.bind(address)
+
+    def send(self, message, address):
+        try:
+            self.sock.sendto(json.dumps(message, separators=(",", ":")).encode("utf-8"), address)
+        except OSError:
+            pass  # 对方暂时不可达, UDP 本来就可能丢包
+
+    def receive(self):
+        """取出所有已到达的数据报, 忽略无法解析的"""
+        while True:
+            try:
+                data, address = self.sock.recvfrom(65536)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                continue  # Windows 上对方端口关闭会以 ConnectionResetError 报告
+            try:
+                message = json.loads(data)
+            except ValueError:
+                continue
+            if isinstance(message, dict):
+                yield message, address
+
+    def close(self):
+        self.sock.close()
+
+
+class EventQueue:
+    """按帧号排序的待执行事件, 以 id 去重 (主机会重复发送同一事件以应对丢包)"""
+    def __init__(self):
+        self.pending = []
+        self.seen = set()
+
+    def add(self, event):
+        if event["id"] in self.seen:
+            return False
+        self.seen.add(event["id"])
+        bisect.insort(self.pending, (event["frame"], event["id"], event))
+        return True
+
+    def due(self, frame):
+        """取出帧号不晚于 frame 的事件"""
+        i = bisect.bisect_right(self.pending, (frame, float("inf")))
+        due, self.pending = self.pending[:i], self.pending[i:]
+        return [event for _, _, event in due]
+
+    def clear(self):
+        self.pending = []
+
+
+class SyncMaster:
+    """
+    主机: 维护权威的演出时钟, 给事件定帧号并发给所有节点
+    Args:
+        seed (int): 演出的随机种子
+        script (str): script_digest() 的结果
+        fps (int): 所有节点共用的模拟帧率
+    """
+    role = "master"
+
+    def __init__(self, seed, script, fps=60, port=PORT, bind="0.0.0.0"):
+        self.endpoint = _Endpoint((bind, port))
+        self.seed = seed
+        self.script = script
+        self.fps = fps
+        self.ready = True
+        self.time = 0.0
+        self.paused = False
+        self.gen = 0          # 时间线代数: 重播或跳转时加一
+        self.anchor = 0       # 本代时间线的起始帧
+        self.restart = False  # 本代是否由重播开始
+        self.events = EventQueue()
+        self.followers = {}   # 地址 -> 最近一次心跳的时刻
+        self._recent = []     # 近期的事件, 随时钟重复发送
+        self._next_id = 0
+        self._last_clock = float("-inf")
+        self._reset = None
+        print(f"[Sync] 主机监听 UDP {bind}:{port}, 种子 {seed}, {fps} fps")
+
+    def poll(self, frame):
+        now = time.monotonic()
+        for message, address in self.endpoint.receive():
+            kind = message.get("type")
+            if kind == "hello":
+                if address not in self.followers:
+                    print(f"[Sync] 节点加入: {address[0]}:{address[1]}")
+                self.followers[address] = now
+                self.endpoint.send({"type": "welcome", "ts": message.get("ts")}, address)
+                self._last_clock = float("-inf")  # 新节点尽快拿到时钟
+            elif kind == "request" and isinstance(message.get("event"), dict):
+                self.request(message["event"], frame)
+        for address, seen in list(self.followers.items()):
+            if now - seen > FOLLOWER_TIMEOUT:
+                print(f"[Sync] 节点离开: {address[0]}:{address[1]}")
+                del self.followers[address]
+
+    def advance(self, dt):
+        """推进演出时钟; 主机的时钟即为基准, 从不需要跳转"""
+        if not self.paused:
+            self.time += dt
+        return None
+
+    def request(self, event, frame):
+        """
+        给事件定下执行帧 (当前帧之后 LAUNCH_LEAD 秒) 并排入队列, 随后的时钟会把它发给所有节点
+        Returns:
+            dict | None: 排入队列的事件, 无效的请求被丢弃时为 None
+        """
+        try:
+            event = validate_event(event)
+        except ValueError as e:
+            print(f"[Sync] 忽略无效请求: {e}")
+            return None
+        event.update(id=self._next_id, gen=self.gen, frame=frame + max(1, round(LAUNCH_LEAD * self.fps)))
+        self._next_id += 1
+        self.events.add(event)
+        self._recent.append(event)
+        return event
+
+    def reset(self, anchor=0, restart=False):
+        """开始新一代时间线: 重播 (restart) 或跳转到第 anchor 帧"""
+        self.gen += 1
+        self.anchor = anchor
+        self.restart = restart
+        self.time = anchor / self.fps
+        self.events.clear()
+        self._recent = []
+        self._reset = (anchor, restart)
+        self._last_clock = float("-inf")
+
+    def take_reset(self):
+        reset, self._reset = self._reset, None
+        return reset
+
+    def publish(self, frame):
+        now = time.monotonic()
+        if now - self._last_clock < 1.0 / CLOCK_RATE:
+            return
+        self._last_clock = now
+        # 已执行一段时间的事件不再重复发送
+        horizon = frame - 2 * round(LAUNCH_LEAD * self.fps)
+        self._recent = [e for e in self._recent if e["frame"] >= horizon]
+        message = {"type": "clock", "t": self.time, "fps": self.fps, "seed": self.seed, "script": self.script,
+                   "gen": self.gen, "anchor": self.anchor, "restart": self.restart, "paused": self.paused,
+                   "events": self._recent}
+        for address in self.followers:
+            self.endpoint.send(message, address)
+
+    def close(self):
+        self.endpoint.close()
+
+
+class SyncFollower:
+    """
+    从机: 跟随主机的时钟
+    Args:
+        master (tuple): 主机地址 (host, port)
+        script (str): 本机脚本的 script_digest(), 与主机不同时给出警告
+    """
+    role = "follower"
+
+    def __init__(self, master, script=None):
+        self.endpoint = _Endpoint(("0.0.0.0", 0))
+        self.master = master
+        self.script = script
+        self.ready = False  # 收到第一个时钟后才知道种子与帧率
+        self.seed = None
+        self.fps = None
+        self.time = 0.0
+        self.paused = True
+        self.gen = None
+        self.events = EventQueue()
+        self.rtt = 0.0
+        self._master_time = 0.0
+        self._received = None
+        self._last_hello = float("-inf")
+        self._lost = False
+        self._reset = None
+        self._snap = True  # 下一次 advance() 直接对齐到主机时钟
+        print(f"[Sync] 等待主机 {master[0]}:{master[1]} ...")
+
+    def poll(self, frame):
+        now = time.monotonic()
+        if now - self._last_hello > HELLO_INTERVAL:
+            self._last_hello = now
+            self.endpoint.send({"type": "hello", "ts": now}, self.master)
+        for message, _ in self.endpoint.receive():
+            kind = message.get("type")
+            if kind == "welcome" and isinstance(message.get("ts"), (int, float)):
+                sample = now - message["ts"]
+                self.rtt = sample if self.rtt == 0.0 else self.rtt * 0.8 + sample * 0.2
+            elif kind == "clock":
+                self._on_clock(message, now)
+        if self._received is not None and not self._lost and now - self._received > LOST_TIMEOUT:
+            self._lost = True
+            print("[Sync] 与主机失去联系, 按本地时钟继续")
+
+    def _on_clock(self, message, now):
+        if not _valid_clock(message):
+            return
+        if not self.ready:
+            self.ready = True
+            self.seed, self.fps = message["seed"], message["fps"]
+            print(f"[Sync] 已连接主机: 种子 {self.seed}, {self.fps} fps, 演出时间 {message['t']:.2f} s")
+            if self.script is not None and message.get("script") != self.script:
+                print("[Sync] 警告: 本机脚本与主机不同, 烟花将无法对齐")
+        if self._lost:
+            self._lost = False
+            print("[Sync] 已恢复与主机的联系")
+        if message["gen"] != self.gen:
+            if self.gen is not None:
+                self._reset = (message["anchor"], message["restart"])
+                self.time = message["anchor"] / self.fps
+                self._snap = True
+            self.gen = message["gen"]
+            self.events.clear()
+        for event in message.get("events", []):
+            if not isinstance(event, dict) or event.get("gen") != self.gen:
+                continue
+            if not (_is_int(event.get("id")) and _is_int(event.get("frame"))):
+                continue
+            try:
+                checked = validate_event(event)
+            except ValueError:
+                continue
+            self.events.add(dict(checked, id=event["id"], gen=event["gen"], frame=event["frame"]))
+        self._master_time = message["t"]
+        self._received = now
+        self.paused = message["paused"]
+
+    def advance(self, dt):
+        """
+        推进本地时钟, 平滑修正与主机的误差
+        Returns:
+            int | None: 需要用闭式解跳转到的帧号 (相差过大时), 否则 None
+        """
+        estimate = self._master_time
+        if not self.paused and not self._lost:
+            estimate += time.monotonic() - self._received + self.rtt / 2
+        error = estimate - self.time
+        if abs(error) > SEEK_THRESHOLD:
+            self.time = estimate
+            self._snap = False
+            return int(estimate * self.fps)
+        if self._snap or abs(error) > SNAP_THRESHOLD:
+            self.time = estimate
+            self._snap = False
+        elif not self.paused:
+            rate = 1.0 + max(-MAX_SLEW, min(MAX_SLEW, error * CORRECTION_GAIN))
+            self.time += dt * rate
+        return None
+
+    def request(self, event, frame):
+        """交互事件交给主机定帧号, 之后随时钟一起回到本机执行"""
+        self.endpoint.send({"type": "request", "event": event}, self.master)
+
+    def take_reset(self):
+        reset, self._reset = self._reset, None
+        return reset
+
+    def publish(self, frame):
+        pass
+
+    def close(self):
+        self.endpoint.close()
+
+
+def apply_event(event, director):
+    """在约定的帧执行一个同步事件"""
+    kind = event.get("kind")
+    if kind == "launch":
+        start = event.get("start")
+        FireworkShow.launch_firework_at(Vec3(*event["target"]), Vec3(*start) if start else None,
+                                        tuple(event["color"]), event["strategy"], random.Random(event["seed"]),
+                                        director.timeline.kernels)
+    elif kind == "end_intro" and director.active:
+        director.end_intro()
+
+
+def launch_event(target, start=None, color=None):
+    """把一次交互发射的所有随机选择定下来, 使各节点执行的结果相同"""
+    return {
+        "kind": "launch",
+        "target": [target.x, target.y, target.z],
+        "start": [start.x, start.y, start.z] if start is not None else None,
+        "color": list(color) if color is not None else [random.random(), random.random(), random.random()],
+        "strategy": random.choice(INTERACTIVE_STRATEGIES),
+        "seed": random.getrandbits(32),
+    }
+
+
+class SyncedShow:
+    """
+    按同步时钟逐帧推进的 HeadlessShow
+    Args:
+        sync (SyncMaster | SyncFollower): 时钟来源
+        data (dict): 表演脚本
+        app: 见 HeadlessShow
+        on_frame (callable): 每模拟一帧后以 HeadlessShow 为参数调用
+        on_restart (callable): 重播 (重建演出) 之后调用
+    """
+    def __init__(self, sync, data, app=None, on_frame=None, on_restart=None):
+        self.sync = sync
+        self.data = data
+        self.app = app
+        self.on_frame = on_frame
+        self.on_restart = on_restart
+        self.show = None
+        self.late = 0  # 到达时已错过执行帧的事件数
+
+    @property
+    def frame(self):
+        return self.show.frame if self.show else 0
+
+    def _start(self):
+        self.show = HeadlessShow(self.data, seed=self.sync.seed, fps=self.sync.fps, app=self.app)
+        if self.on_restart:
+            self.on_restart(self.show)
+
+    def update(self, dt):
+        """
+        处理网络消息并模拟到同步时钟对应的帧
+        Returns:
+            bool: 演出是否已开始 (节点收到主机时钟之前为 False)
+        """
+        sync = self.sync
+        sync.poll(self.frame)
+        if not sync.ready:
+            return False
+        if self.show is None:
+            self._start()
+
+        reset = sync.take_reset()
+        if reset is not None:
+            anchor, restart = reset
+            if restart:
+                self._start()
+            if not restart:
+                # 跳转 (包括回到第 0 帧); 重播时演出已重建, 无需跳转
+                self.show.seek(anchor / sync.fps)
+        jump = sync.advance(dt)
+        if jump is not None and jump != self.show.frame:
+            print(f"[Sync] 与主机相差过大, 跳转到第 {jump} 帧 (已有粒子为近似重建, 之后的烟花与主机一致)")
+            self.show.seek(jump / sync.fps)
+
+        target = int(sync.time * sync.fps + 1e-6)
+        show = self.show
+        for _ in range(MAX_CATCHUP):
+            if show.frame >= target:
+                break
+            for event in sync.events.due(show.frame + 1):
+                if event["frame"] <= show.frame:
+                    self.late += 1
+                    print(f"[Sync] 事件 {event['id']} 晚到 {show.frame + 1 - event['frame']} 帧")
+                apply_event(event, show.director)
+            show.step()
+            if self.on_frame:
+                self.on_frame(show)
+        sync.publish(show.frame)
+        return True
+
+
+class SyncedFireworkShow(FireworkShow):
+    """
+    同步模式的窗口演出: 导演与粒子按同步时钟逐帧推进 (单线程, 不调节细节, 以保证各节点结果一致)
+    """
+    def __init__(self, script_data, sync):
+        render = dict(script_data.get("render", {}), threaded=False)
+        if script_data.get("triggers"):
+            # 本地触发只作用于本节点, 会使各节点分叉; 需经主机转发的外部触发尚未支持
+            print("[Sync] 同步模式下忽略脚本中的 triggers")
+        script_data = {key: value for key, value in script_data.items() if key != "triggers"}
+        super().__init__(dict(script_data, render=render, governor={"target_fps": 0}))
+        self.sync = sync
+        self.synced = SyncedShow(sync, script_data, app=self, on_restart=self._on_restart)
+        self.taskMgr.remove("ParticleUpdate")
+        self.taskMgr.remove("DirectorUpdate")
+        self.taskMgr.add(self.update_sync, "SyncUpdate")
+        self.accept("enter", self.request_end_intro)
+        if sync.role == "follower":
+            # 暂停、跳转与重播由主机控制
+            for key in ("lcontrol", "arrow_left", "arrow_right"):
+                self.ignore(key)
+            self.is_paused = False
+            self.ui_text.setText("等待主机...")
+
+    def update_sync(self, task):
+        ParticleSystem.store.set_view(*ParticleSystem.renderer.frustum())
+        was_ready = self.synced.show is not None
+        if self.synced.update(globalClock.getDt()):
+            if not was_ready and self.sync.role == "follower":
+                self.ui_text.setText("")
+            ParticleSystem.renderer.update(ParticleSystem.store)
+        return Task.cont
+
+    def _on_restart(self, show):
+        self.director = show.director
+        if self.interactive_mode:
+            self.ignore("space")
+            self.ignore("mouse1")
+            self.ignore("r")
+            self.interactive_mode = False
+            self.disableMouse()
+
+    def toggle_pause(self):
+        super().toggle_pause()
+        self.sync.paused = self.is_paused
+
+    def seek_show(self, delta):
+        if self.interactive_mode or self.synced.show is None:
+            return
+        show = self.synced.show
+        self.sync.reset(max(0, show.frame + round(delta / show.dt)))
+
+    def restart_show(self):
+        if self.sync.role == "master":
+            self.sync.reset(0, restart=True)
+
+    def request_end_intro(self):
+        self.sync.request({"kind": "end_intro"}, self.synced.frame)
+
+    def launch_firework_at(self, target_pos, start_pos=None, color_tuple=None, kernels=None):
+        # 策略在各节点执行时由 apply_event 按本地导演的时间线解析 (各节点脚本相同)
+        self.sync.request(launch_event(target_pos, start_pos, color_tuple), self.synced.frame)
+
+
+def run_headless(sync, data, duration=None, report=5.0, launch_every=0.0):
+    """无窗口节点: 以实时速度运行, 每隔 report 秒输出一行状态摘要 (用于在本机多进程对比各节点)"""
+    def on_frame(show):
+        if show.frame % max(1, round(report * sync.fps)) == 0:
+            snap = show.snapshot()
+            print(json.dumps({"role": sync.role, "frame": snap["frame"], "time": snap["time"],
+                              "live": snap["live"], "digest": snap["digest"]}), flush=True)
+
+    synced = SyncedShow(sync, data, app=HeadlessApp(), on_frame=on_frame)
+    last = time.perf_counter()
+    next_launch = launch_every
+    try:
+        while True:
+            now = time.perf_counter()
+            dt, last = now - last, now
+            if synced.update(dt):
+                show = synced.show
+                if duration is not None and show.time >= duration:
+                    break
+                if launch_every and show.time >= next_launch:
+                    next_launch += launch_every
+                    target = Vec3(random.uniform(-40, 40), random.uniform(-40, 40), random.uniform(50, 90))
+                    sync.request(launch_event(target), show.frame)
+            time.sleep(0.004)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sync.close()
+    if synced.late:
+        print(f"[Sync] 共有 {synced.late} 个事件晚到")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多机同步演出")
+    parser.add_argument("role", choices=["master", "follower"])
+    parser.add_argument("script", nargs="?", help="表演脚本路径 (默认 config/config.json), 各节点应相同")
+    parser.add_argument("--port", type=int, default=PORT, help="主机监听的 UDP 端口")
+    parser.add_argument("--master", help="主机地址 host[:port] (follower 必填)")
+    parser.add_argument("--seed", type=int, default=None, help="主机: 随机种子, 默认使用脚本中的 seed, 再没有则随机")
+    parser.add_argument("--fps", type=int, default=60, help="主机: 所有节点的模拟帧率")
+    parser.add_argument("--headless", action="store_true", help="不创建窗口 (用于本机多进程测试)")
+    parser.add_argument("--duration", type=float, default=None, help="无窗口: 演出时间到达后退出")
+    parser.add_argument("--report", type=float, default=5.0, help="无窗口: 每隔多少秒输出状态摘要")
+    parser.add_argument("--launch-every", type=float, default=0.0, help="无窗口: 每隔多少秒模拟一次交互发射")
+    args = parser.parse_args()
+
+    data = load_script(args.script)
+    prepare_text_resources(data)
+    if args.role == "master":
+        seed = args.seed if args.seed is not None else data.get("seed", random.randrange(2**32))
+        sync = SyncMaster(seed, script_digest(data), args.fps, args.port)
+    else:
+        if not args.master:
+            parser.error("follower 需要 --master")
+        sync = SyncFollower(parse_address(args.master, args.port), script_digest(data))
+
+    if args.headless:
+        run_headless(sync, data, args.duration, args.report, args.launch_every)
+    else:
+        if sync.role == "master":
+            sync.paused = True  # 与普通演出一样, 按 Ctrl 开始
+        SyncedFireworkShow(data, sync).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,990 @@
+import random
+import numpy as np
+
+GRAVITY = 9.8
+
+# 粒子池满时的处理策略
+OVERFLOW_POLICIES = ("drop_newest", "evict_oldest", "evict_dimmest")
+
+# 尾焰粒子的固定参数
+TAIL_DRAG = 0.1
+TAIL_SIZE = 0.5  # 相对发射粒子的尺寸
+
+
+def damping_of(drag):
+    """阻力系数 (0-1) -> 衰减率 k: 速度每秒衰减为 (1 - drag)^10 = e^-k"""
+    return -10.0 * np.log1p(-np.minimum(np.asarray(drag, dtype=np.float64), 0.999999))
+
+
+def _coefficients(k, t):
+    """
+    dv/dt = -k v - g z 的积分系数: e^{-kt}, f = ∫e^{-ks}ds, h = ∫∫e^{-ks}ds
+    k -> 0 时 f, h 分别趋于 t 与 t²/2; kt 较小时用级数, 避免相消误差
+    """
+    kt = k * t
+    safe_k = np.where(k > 0, k, 1.0)
+    decay = np.exp(-kt)
+    f = np.where(k > 0, -np.expm1(-kt) / safe_k, t)
+    small = np.abs(kt) < 1e-2
+    series = t * t * (0.5 - kt / 6.0 + kt * kt / 24.0 - kt * kt * kt / 120.0)
+    h = np.where(small, series, (t - f) / safe_k)
+    return decay, f, h
+
+
+def ballistic(pos, vel, t, damping, gravity):
+    """
+    重力 + 指数阻力下的闭式解, 可逐行给定时长 (t 为负时倒推)
+    Args:
+        pos, vel (array): (..., 3) 初始状态
+        t, damping, gravity (array): (...) 时长、衰减率 (见 damping_of) 与重力加速度
+    Returns:
+        (pos, vel): t 秒后的状态 (float64)
+    """
+    decay, f, h = _coefficients(np.asarray(damping, dtype=np.float64), np.asarray(t, dtype=np.float64))
+    g = np.asarray(gravity, dtype=np.float64)
+    new_vel = vel * decay[..., None]
+    new_vel[..., 2] -= g * f
+    new_pos = pos + vel * f[..., None]
+    new_pos[..., 2] -= g * h
+    return new_pos, new_vel
+
+
+def view_frustum(eye, right, up, forward, fov, near=1.0):
+    """
+    透视摄像机的视锥平面 (法向朝内, 不含远平面)
+    Args:
+        eye, right, up, forward (array): 摄像机位置与三个方向 (世界坐标)
+        fov (tuple): 水平与垂直视角 (度)
+    Returns:
+        np.ndarray: (5, 4) 平面 (n, d), 点 p 在视锥内当且仅当所有 n·p + d >= 0
+    """
+    eye, right, up, forward = (np.asarray(v, dtype=np.float64) for v in (eye, right, up, forward))
+    a, b = np.radians(fov[0]) / 2, np.radians(fov[1]) / 2
+    normals = np.array([
+        forward * np.sin(a) + right * np.cos(a),   # 左
+        forward * np.sin(a) - right * np.cos(a),   # 右
+        forward * np.sin(b) + up * np.cos(b),      # 下
+        forward * np.sin(b) - up * np.cos(b),      # 上
+        forward,                                   # 近
+    ])
+    normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+    d = -normals @ eye
+    d[4] -= near
+    return np.column_stack([normals, d])
+
+
+# ==========================================
+# 粒子属性列定义 (Structure of Arrays)
+# 名称 -> (每行形状, 数据类型)
+# ==========================================
+_COLUMNS = {
+    "uid":          ((), np.int64),      # 全局递增编号, 用于校验槽位是否已被复用
+    "alive":        ((), bool),
+    "pos":          ((3,), np.float32),
+    "vel":          ((3,), np.float32),
+    "color":        ((3,), np.float32),
+    "size":         ((), np.float32),
+    "age":          ((), np.float32),    # 已存活时间(秒)
+    "life":         ((), np.float32),    # 寿命(秒)
+    "drag":         ((), np.float32),    # 空气阻力系数 (0-1)
+    "damping":      ((), np.float32),    # 由 drag 换算的衰减率 k (见 damping_of)
+    "gravity":      ((), np.float32),    # 0=不受重力
+    "trace":        ((), np.int32),      # 轨迹历史长度(帧) (0=关闭)
+    "trail":        ((), np.int32),      # TrailBuffer 中的槽位 (-1=无轨迹)
+    "burst":        ((), np.int32),      # BurstTable 中所属的爆炸 (-1=不属于任何爆炸)
+    "flash_amp":    ((), np.float32),
+    "flash_period": ((), np.float32),    # 0=不闪烁
+    "tail_rate":    ((), np.float32),    # 尾焰发射速率 (0=关闭)
+    "tail_speed":   ((), np.float32),
+    "tail_color":   ((3,), np.float32),
+    "tail_life":    ((), np.float32),    # 尾焰粒子寿命(毫秒)
+    "tail_timer":   ((), np.float32),
+    "draw_color":   ((4,), np.float32),  # 当前帧的显示颜色 (含闪烁与淡出), 空槽位为 0
+    "draw_size":    ((), np.float32),    # 当前帧的显示尺寸 (含闪烁), 空槽位为 0
+}
+
+
+class _FreeList:
+    """
+    空闲槽位栈
+    初始按升序弹出, 回收的槽位优先复用, 使存活粒子集中在数组前部.
+    """
+    def __init__(self, capacity):
+        self.slots = np.arange(capacity - 1, -1, -1, dtype=np.int32)
+        self.top = capacity
+
+    def pop(self, k):
+        k = min(k, self.top)
+        taken = self.slots[self.top - k:self.top][::-1].copy()
+        self.top -= k
+        return taken
+
+    def push(self, slots):
+        k = len(slots)
+        self.slots[self.top:self.top + k] = slots
+        self.top += k
+
+
+class TrailBuffer:
+    """
+    轨迹历史环形缓冲
+    每条轨迹保存其发射粒子最近 length 帧的位置 (length 即 config 中的 trace),
+    所有存储预先分配并循环复用, 轨迹本身不产生新粒子.
+    发射粒子死亡后轨迹继续收缩 length 帧再回收, 效果与旧的残影淡出一致.
+
+    Args:
+        capacity (int): 最多同时存在的轨迹数, 用尽后新粒子不再带轨迹
+        max_length (int): 单条轨迹的最大历史长度, 更长的 trace 会被截断
+    """
+    def __init__(self, capacity=4096, max_length=40):
+        self.capacity = capacity
+        self.max_length = max(max_length, 2)
+        self.active_count = 0
+        self.dropped = 0
+        self._free = _FreeList(capacity)
+
+        self.hist = np.zeros((capacity, self.max_length, 3), dtype=np.float32)
+        self.head = np.zeros(capacity, dtype=np.int32)
+        self.filled = np.zeros(capacity, dtype=np.int32)
+        self.length = np.ones(capacity, dtype=np.int32)
+        self.drain = np.zeros(capacity, dtype=np.int32)
+        self.width = np.zeros(capacity, dtype=np.float32)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.color = np.zeros((capacity, 3), dtype=np.float32)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.hist, self.head, self.filled, self.length,
+                                      self.drain, self.width, self.active, self.color))
+
+    def acquire(self, pos, length, color, width):
+        """
+        为 N 个发射粒子分配轨迹槽位
+        Returns:
+            np.ndarray: 槽位编号, 槽位用尽的部分为 -1
+        """
+        k = len(pos)
+        slots = np.full(k, -1, dtype=np.int32)
+        taken = self._free.pop(k)
+        got = len(taken)
+        self.dropped += k - got
+        if got == 0:
+            return slots
+        slots[:got] = taken
+        length = np.minimum(length[:got], self.max_length)
+
+        self.hist[taken] = pos[:got, None, :]
+        self.head[taken] = 1 % length
+        self.filled[taken] = 1
+        self.length[taken] = length
+        self.drain[taken] = -1
+        self.color[taken] = color[:got]
+        self.width[taken] = width[:got]
+        self.active[taken] = True
+        self.active_count += got
+        return slots
+
+    def push(self, slots, pos):
+        """写入一帧新位置, 覆盖最旧的记录"""
+        head = self.head[slots]
+        self.hist[slots, head] = pos
+        self.head[slots] = (head + 1) % self.length[slots]
+        self.filled[slots] = np.minimum(self.filled[slots] + 1, self.length[slots])
+
+    def reset(self, slots, pos):
+        """丢弃历史, 从 pos 重新开始记录 (暂停记录一段时间后, 避免轨迹连回旧位置)"""
+        self.hist[slots] = pos[:, None, :]
+        self.head[slots] = 1 % self.length[slots]
+        self.filled[slots] = 1
+
+    def release(self, slots):
+        """发射粒子死亡: 轨迹开始收缩, length 帧后回收"""
+        self.drain[slots] = self.length[slots]
+
+    def fill(self, slots, history, filled):
+        """
+        直接写入整段历史 (用于跳转)
+        Args:
+            history (array): (N, max_length, 3) 从新到旧的位置
+            filled (array): 每条轨迹的有效点数
+        """
+        length = self.length[slots]
+        filled = np.minimum(filled, length)
+        k = np.arange(self.max_length)
+        # 最新的点放在 length-1, 依次向前; 写指针回到 0
+        rows, cols = np.nonzero(k[None, :] < filled[:, None])
+        self.hist[slots[rows], length[rows] - 1 - cols] = history[rows, cols]
+        self.head[slots] = 0
+        self.filled[slots] = filled
+
+    def clear(self):
+        """回收全部轨迹"""
+        self.active[:] = False
+        self.active_count = 0
+        self._free = _FreeList(self.capacity)
+
+    def step(self):
+        """推进收缩中的轨迹: 重复写入最新位置, 使轨迹逐帧缩短"""
+        orphans = np.flatnonzero(self.active & (self.drain >= 0))
+        if len(orphans) == 0:
+            return
+        newest = (self.head[orphans] - 1) % self.length[orphans]
+        self.push(orphans, self.hist[orphans, newest])
+        self.drain[orphans] -= 1
+
+        self.retire(orphans[self.drain[orphans] <= 0])
+
+    def skip(self, slots, frames):
+        """收缩中的轨迹直接跳过 frames 帧 (用于跳转): 最旧的点依次丢弃, 收缩完的立即回收"""
+        remaining = self.drain[slots] - frames
+        self.drain[slots] = remaining
+        self.filled[slots] = np.clip(np.minimum(self.filled[slots], remaining), 1, None)
+        self.retire(slots[remaining <= 0])
+
+    def retire(self, slots):
+        """立即回收轨迹槽位"""
+        if len(slots):
+            self.active[slots] = False
+            self._free.push(slots)
+            self.active_count -= len(slots)
+
+
+# 爆炸的属性列: 名称 -> (每行形状, 数据类型)
+_BURST_COLUMNS = {
+    "origin":  ((3,), np.float64),  # 爆炸点
+    "speed":   ((), np.float64),    # 粒子初速度的最大值
+    "damping": ((), np.float64),
+    "gravity": ((), np.float64),
+    "margin":  ((), np.float64),    # 尾焰与粒子尺寸带来的额外半径
+    "age":     ((), np.float64),
+    "count":   ((), np.int32),      # 仍存活的粒子数, 归零时回收
+    "generation": ((), np.int64),   # 每次登记加一, 用于识别回收后被复用的行
+    "active":  ((), bool),
+    "visible": ((), bool),          # 包围球与视锥相交
+    "far":     ((), bool),          # 包围球整体超出 LOD 距离
+    "culled":  ((), bool),          # 上一帧不可见 (重新可见时轨迹需要重置)
+}
+
+
+class BurstTable:
+    """
+    爆炸分组
+    同一次爆炸的粒子初始位置、阻力与重力都相同, 因此它们的包围球有闭式解:
+    球心 = 爆炸点沿重力下落, 半径 = 最大初速度 x 阻力衰减后的位移系数 + margin.
+    每帧只需对爆炸 (而不是粒子) 做一次视锥与距离判断.
+
+    最后一行代表不属于任何爆炸的粒子 (粒子的 burst 为 -1 时正好索引到它), 永远可见、在近处.
+
+    Args:
+        capacity (int): 最多同时存在的爆炸数, 用尽后新爆炸的粒子不分组 (照常更新)
+    """
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self._free = _FreeList(capacity)
+        for name, (shape, dtype) in _BURST_COLUMNS.items():
+            setattr(self, name, np.zeros((capacity + 1,) + shape, dtype=dtype))
+        self.visible[:] = True
+        self.far_changed = np.empty(0, dtype=np.int64)  # 最近一次 classify() 中 far 有变化的爆炸
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in _BURST_COLUMNS)
+
+    @property
+    def active_count(self):
+        return self.capacity - self._free.top
+
+    def acquire(self, origin, speed, damping, gravity=GRAVITY, margin=0.0):
+        """登记一次爆炸, 返回编号 (用尽时为 -1)"""
+        taken = self._free.pop(1)
+        if len(taken) == 0:
+            return -1
+        b = int(taken[0])
+        self.generation[b] += 1
+        self.origin[b] = origin
+        self.speed[b] = speed
+        self.damping[b] = damping
+        self.gravity[b] = gravity
+        self.margin[b] = margin
+        self.age[b] = 0.0
+        self.count[b] = 0
+        self.active[b] = True
+        self.visible[b] = True
+        self.far[b] = False
+        self.culled[b] = False
+        return b
+
+    def discard(self, b):
+        """登记后一个粒子都没有生成 (粒子池已满) 的爆炸直接回收"""
+        if b >= 0 and self.count[b] == 0:
+            self.active[b] = False
+            self._free.push(np.array([b], dtype=np.int32))
+
+    def add(self, ids):
+        ids = ids[ids >= 0]
+        if len(ids):
+            np.add.at(self.count, ids, 1)
+
+    def remove(self, ids):
+        """粒子死亡; 粒子全部死亡的爆炸被回收"""
+        ids = ids[ids >= 0]
+        if len(ids) == 0:
+            return
+        np.subtract.at(self.count, ids, 1)
+        done = np.unique(ids)
+        done = done[self.count[done] <= 0]
+        if len(done):
+            self.active[done] = False
+            self._free.push(done.astype(np.int32))
+
+    def clear(self):
+        self.active[:] = False
+        self.count[:] = 0
+        self.visible[:] = True
+        self.far[:] = False
+        self.culled[:] = False
+        self._free = _FreeList(self.capacity)
+
+    def step(self, dt):
+        self.age[:self.capacity][self.active[:self.capacity]] += dt
+
+    def bounds(self, ids):
+        """爆炸的包围球 (球心, 半径)"""
+        decay, f, h = _coefficients(self.damping[ids], self.age[ids])
+        center = self.origin[ids].copy()
+        center[:, 2] -= self.gravity[ids] * h
+        return center, self.speed[ids] * f + self.margin[ids]
+
+    def classify(self, planes, eye, lod_distance):
+        """
+        按视锥与距离更新 visible / far, 返回本帧由不可见变为可见的爆炸
+        far 有变化的爆炸记录在 far_changed 中 (着色器路径据此重传其粒子的闪烁参数)
+        """
+        ids = np.flatnonzero(self.active[:self.capacity])
+        self.far_changed = ids
+        if len(ids) == 0:
+            return ids
+        center, radius = self.bounds(ids)
+        visible = ((center @ planes[:, :3].T + planes[:, 3]) >= -radius[:, None]).all(axis=1)
+        far = np.linalg.norm(center - eye, axis=1) - radius > lod_distance
+        shown = ids[visible & self.culled[ids]]
+        self.far_changed = ids[far != self.far[ids]]
+        self.visible[ids] = visible
+        self.far[ids] = far
+        self.culled[ids] = ~visible
+        return shown
+
+
+class ParticleStore:
+    """
+    向量化粒子引擎 (固定容量粒子池)
+    所有属性数组在构造时一次性分配, 粒子占用固定槽位, 死亡后槽位回到空闲栈复用.
+    重力、阻力、淡出、闪烁与死亡剔除每帧对 [0, high_water) 区间一次性完成,
+    空槽位的显示尺寸与颜色为 0, 渲染时自然不可见.
+
+    Args:
+        capacity (int): 粒子池容量 (硬上限)
+        overflow (str): 池满时的策略, 见 OVERFLOW_POLICIES
+            drop_newest   - 丢弃新粒子
+            evict_oldest  - 回收最早生成的粒子
+            evict_dimmest - 回收当前最暗的粒子
+        trail_capacity (int): 轨迹槽位数, 默认为粒子容量的 1/4
+        trail_length (int): 单条轨迹的最大历史长度
+        seed (int): 尾焰方向的随机种子, None 则不固定
+        burst_capacity (int): 最多同时跟踪的爆炸数 (见 BurstTable)
+        lod_distance (float): 超过该距离的爆炸不再记录轨迹、不再闪烁
+
+    设置 set_view() 后, 视锥外的爆炸跳过视觉更新 (物理照常), 远处的爆炸丢弃轨迹与闪烁.
+    """
+    def __init__(self, capacity=65536, overflow="evict_oldest", trail_capacity=None, trail_length=40,
+                 seed=None, burst_capacity=4096, lod_distance=250.0):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"未知的溢出策略: {overflow} (可选: {', '.join(OVERFLOW_POLICIES)})")
+        self.capacity = capacity
+        self.overflow = overflow
+        self.high_water = 0  # 曾被占用的最大槽位 + 1, 每帧只处理这个区间
+        self.live_count = 0
+        self.next_uid = 0
+        self._pending = []  # add() 逐个加入的粒子, 下一次 flush 时批量写入
+        # advance() 整批生成的尾焰火花 (pos, vel, color, size, life, burst, 爆炸的 generation), 同样等待 flush
+        self._sparks = None
+        self._expired = np.empty(0, dtype=np.int64)  # advance() 发现到期, 等待 cleanup() 回收的槽位
+        self._free = _FreeList(capacity)
+        self.rng = random.Random(seed)
+        self.detail = 1.0  # 模拟细节系数 (见 governor.DetailGovernor), 作用于之后生成的粒子
+        self.trails = TrailBuffer(trail_capacity or max(capacity // 4, 1), trail_length)
+        self.bursts = BurstTable(burst_capacity)
+        self.view = None  # (视锥平面, 摄像机位置), None 表示不剔除
+        self.lod_distance = lod_distance
+        # 上一帧剔除的统计: 跳过视觉更新的粒子数, 丢弃了轨迹与闪烁的远处粒子数
+        self.cull_stats = {"bursts": 0, "culled": 0, "far": 0}
+        self.time = 0.0  # 累计模拟时间 (秒)
+        # 状态被直接改写 (生成 / 回收 / 跳转) 的槽位, 为 None 时不记录; 见 take_changed()
+        self.changed = None
+
+        # 统计计数 (累计)
+        self.spawned = 0
+        self.dropped = 0
+        self.evicted = 0
+        self.peak_live = 0
+
+        for name, (shape, dtype) in _COLUMNS.items():
+            setattr(self, name, np.zeros((capacity,) + shape, dtype=dtype))
+        self.life[:] = 1.0  # 避免空槽位在淡出计算中除以 0
+        self.trail[:] = -1
+        self.burst[:] = -1
+
+    # ------------------------------------------
+    # 统计
+    # ------------------------------------------
+    @property
+    def usage(self):
+        """粒子池占用率 (0-1)"""
+        return self.live_count / self.capacity
+
+    @property
+    def nbytes(self):
+        """粒子池、轨迹缓冲与爆炸分组占用的内存 (字节), 构造后不再变化"""
+        return sum(getattr(self, name).nbytes for name in _COLUMNS) + self.trails.nbytes + self.bursts.nbytes
+
+    def stats(self):
+        return {
+            "live": self.live_count,
+            "capacity": self.capacity,
+            "usage": self.usage,
+            "peak_live": self.peak_live,
+            "spawned": self.spawned,
+            "dropped": self.dropped,
+            "evicted": self.evicted,
+            "trails": self.trails.active_count,
+            "trails_dropped": self.trails.dropped,
+            "memory_bytes": self.nbytes,
+        }
+
+    # ------------------------------------------
+    # 槽位管理
+    # ------------------------------------------
+    def _allocate(self, k):
+        """取 k 个空闲槽位, 不足时按溢出策略回收或丢弃; 返回的数量可能少于 k"""
+        short = k - self._free.top
+        if short > 0 and self.overflow != "drop_newest" and self.live_count:
+            live = np.flatnonzero(self.alive[:self.high_water])
+            short = min(short, len(live))
+            if self.overflow == "evict_oldest":
+                score = self.uid[live]
+            else:
+                # 按颜色与剩余寿命估算亮度: 视锥外的粒子跳过视觉更新, draw_color 不是当前值
+                fade = 1.0 - self.age[live] / np.maximum(self.life[live], 1e-6)
+                score = self.color[live].max(axis=1) * np.maximum(fade, 0.0)
+            if short < len(live):
+                victims = live[np.argpartition(score, short - 1)[:short]]
+            else:
+                victims = live
+            self._release(victims)
+            self.evicted += len(victims)
+
+        slots = self._free.pop(k)
+        self.dropped += k - len(slots)
+        return slots
+
+    def _release(self, slots):
+        """粒子死亡: 隐藏, 释放轨迹, 槽位回到空闲栈"""
+        if len(slots) == 0:
+            return
+        self.alive[slots] = False
+        self.draw_color[slots] = 0.0
+        self.draw_size[slots] = 0.0
+        trails = self.trail[slots]
+        self.trails.release(trails[trails >= 0])
+        self.trail[slots] = -1
+        self.bursts.remove(self.burst[slots])
+        self.burst[slots] = -1
+        self._free.push(slots)
+        self.live_count -= len(slots)
+        if self.changed is not None:
+            self.changed.append(slots)
+
+    # ------------------------------------------
+    # 粒子生成
+    # ------------------------------------------
+    def spawn(self, pos, vel, color, size, life, drag=0.0, gravity=GRAVITY, trace=0,
+              flash_amp=0.0, flash_period=0.0, tail_rate=0.0, tail_speed=0.0,
+              tail_color=(1, 1, 1), tail_life=0.0, burst=-1, burst_generation=None):
+        """
+        批量生成粒子, 所有参数均可为标量 (向量属性为单个三元组) 或逐行数组
+        Args:
+            pos (array): (N, 3) 初始位置
+            vel (array): (N, 3) 初始速度
+            life (array): 寿命(秒)
+            burst (int | array): 所属爆炸 (BurstTable.acquire 的返回值), -1 表示不分组
+            burst_generation (array, optional): 记录 burst 时各爆炸的 generation, 不一致 (已被复用) 的不再分组
+        Returns:
+            np.ndarray: 新粒子所在槽位 (池满被丢弃的粒子不在其中)
+        """
+        if self._pending or self._sparks is not None:
+            self.flush()  # 保证写入顺序与调用顺序一致
+        pos = np.asarray(pos, dtype=np.float32).reshape(-1, 3)
+        k = len(pos)
+        if k == 0:
+            return np.empty(0, dtype=np.int32)
+        slots = self._allocate(k)
+        got = len(slots)
+        if got == 0:
+            return slots
+
+        def rows(value, vector=False):
+            """逐行数组裁剪到实际分配到的行数, 标量原样广播"""
+            arr = np.asarray(value)
+            return arr[:got] if arr.ndim == (2 if vector else 1) else arr
+
+        # 槽位连续时 (整批爆炸的常见情况) 用切片整块写入, 避免逐列的花式索引
+        dst = slots
+        if got > 1 and slots[-1] - slots[0] == got - 1 and (np.diff(slots) == 1).all():
+            dst = slice(int(slots[0]), int(slots[-1]) + 1)
+        self.uid[dst] = np.arange(self.next_uid, self.next_uid + got, dtype=np.int64)
+        self.next_uid += got
+        self.alive[dst] = True
+        self.pos[dst] = pos[:got]
+        self.vel[dst] = rows(vel, True)
+        self.color[dst] = rows(color, True)
+        self.size[dst] = rows(size)
+        self.age[dst] = 0.0
+        self.life[dst] = rows(life)
+        self.drag[dst] = rows(drag)
+        self.damping[dst] = damping_of(self.drag[dst])
+        self.gravity[dst] = rows(gravity)
+        self.trace[dst] = rows(trace)
+        self.flash_amp[dst] = rows(flash_amp)
+        self.flash_period[dst] = rows(flash_period)
+        self.tail_rate[dst] = rows(tail_rate)
+        if self.detail < 1.0:
+            # 降级: 轨迹 (及其残影) 变短, 尾焰变稀
+            self.trace[dst] = np.ceil(self.trace[dst] * self.detail)
+            self.tail_rate[dst] *= self.detail
+        self.tail_speed[dst] = rows(tail_speed)
+        self.tail_color[dst] = rows(tail_color, True)
+        self.tail_life[dst] = rows(tail_life)
+        self.tail_timer[dst] = 0.0
+        self.burst[dst] = rows(burst)
+        self.draw_color[dst, :3] = self.color[dst]
+        self.draw_color[dst, 3] = 1.0
+        self.draw_size[dst] = self.size[dst]
+
+        # 带 trace 的粒子分配轨迹历史
+        emitters = slots[self.trace[slots] > 0]
+        if len(emitters):
+            self.trail[emitters] = self.trails.acquire(
+                self.pos[emitters], self.trace[emitters], self.color[emitters], self.size[emitters]
+            )
+
+        # 火花等待写入期间, 所属爆炸可能已随粒子被淘汰而回收 (甚至已被新爆炸复用), 这些火花不再分组
+        burst = self.burst[slots]
+        stale = (burst >= 0) & ~self.bursts.active[burst]
+        if burst_generation is not None:
+            stale |= self.bursts.generation[burst] != rows(burst_generation)
+        stale = slots[stale]
+        self.burst[stale] = -1
+        self.bursts.add(self.burst[slots])
+        if self.changed is not None:
+            self.changed.append(slots)
+        self.high_water = max(self.high_water, int(slots.max()) + 1)
+        self.live_count += got
+        self.spawned += got
+        self.peak_live = max(self.peak_live, self.live_count)
+        return slots
+
+    def add(self, pos, v, color, size, lifetime_ms, drag=0.0, trace=0, tail=None, flash=None,
+            gravity=GRAVITY):
+        """加入单个粒子 (兼容旧接口), 实际写入推迟到下一次 flush"""
+        self._pending.append((pos, v, color, size, lifetime_ms / 1000.0, drag, gravity, trace, tail, flash))
+
+    def add_tracked(self, pos, v, color, size, lifetime_ms, drag=0.0, trace=0, tail=None, flash=None,
+                    gravity=GRAVITY):
+        """
+        立即加入单个粒子并返回句柄, 供外部逐帧读取其位置 (例如烟花弹体)
+        Returns:
+            tuple | None: (槽位, uid), 池满被丢弃时为 None
+        """
+        self.add(pos, v, color, size, lifetime_ms, drag, trace, tail, flash, gravity)
+        slots = self.flush()
+        if len(slots) == 0:
+            return None
+        slot = int(slots[-1])
+        return slot, int(self.uid[slot])
+
+    def flush(self):
+        """
+        把 add() 暂存的粒子 (以及上一帧的尾焰火花) 一次性写入粒子池
+        Returns:
+            np.ndarray: add() 加入的新粒子所在槽位
+        """
+        sparks, self._sparks = self._sparks, None
+        if sparks is not None:
+            pos, vel, color, size, life, burst, generation = sparks
+            self.spawn(pos, vel, color, size, life, drag=TAIL_DRAG, burst=burst, burst_generation=generation)
+        if not self._pending:
+            return np.empty(0, dtype=np.int32)
+        pending = self._pending
+        self._pending = []
+        pos, vel, color, size, life, drag, gravity, trace, tail, flash = zip(*pending)
+        no_tail = (0.0, 0.0, (1, 1, 1), 0.0)
+        tail = [t if t else no_tail for t in tail]
+        flash = [f if f else (0.0, 0.0) for f in flash]
+        return self.spawn(
+            pos, vel, color, size, life, drag=drag, gravity=gravity, trace=trace,
+            flash_amp=[f[0] for f in flash], flash_period=[f[1] for f in flash],
+            tail_rate=[t[0] for t in tail], tail_speed=[t[1] for t in tail],
+            tail_color=[t[2] for t in tail], tail_life=[t[3] for t in tail],
+        )
+
+    def take_changed(self):
+        """
+        取出并清空自上次调用以来被生成、回收或跳转的槽位 (去重, 升序)
+        其余存活粒子的状态都可以由这些时刻的位置、速度与年龄按闭式解推出, 供着色器渲染只上传变化的行
+        """
+        if not self.changed:
+            return np.empty(0, dtype=np.int64)
+        slots = np.unique(np.concatenate(self.changed))
+        self.changed = []
+        return slots
+
+    # ------------------------------------------
+    # 句柄访问
+    # ------------------------------------------
+    def is_alive(self, handle):
+        """句柄对应的粒子是否仍然存活 (槽位未被回收或复用)"""
+        if handle is None:
+            return False
+        slot, uid = handle
+        return bool(self.alive[slot]) and int(self.uid[slot]) == uid
+
+    def kill(self, handle):
+        """立即回收句柄对应的粒子"""
+        if self.is_alive(handle):
+            self._release(np.array([handle[0]], dtype=np.int32))
+
+    def clear(self):
+        """回收全部粒子与轨迹 (统计计数保留)"""
+        self._pending = []
+        self._sparks = None
+        self._expired = np.empty(0, dtype=np.int64)
+        self._release(np.flatnonzero(self.alive[:self.high_water]))
+        self.trails.clear()
+        self.bursts.clear()
+        self.trail[:] = -1
+        self.high_water = 0
+
+    # ------------------------------------------
+    # 跳转 (闭式解)
+    # ------------------------------------------
+    def fast_forward(self, slots, dt, frame_dt=1.0 / 60):
+        """
+        把一批粒子直接推进 dt 秒, 不逐帧模拟, 耗时只与粒子数有关
+        位置与速度使用闭式解; 轨迹历史按 frame_dt 的间隔回填;
+        推进期间发射、且此刻仍存活的尾焰粒子一并补发.
+
+        Args:
+            slots (array): 粒子槽位
+            dt (float | array): 推进时长 (秒), 可逐行给定
+            frame_dt (float): 轨迹历史的采样间隔
+        Returns:
+            np.ndarray: 补发的尾焰粒子槽位
+        """
+        self.flush()
+        slots = np.asarray(slots, dtype=np.int64)
+        dt = np.broadcast_to(np.asarray(dt, dtype=np.float64), slots.shape)
+        live = self.alive[slots]
+        slots, dt = slots[live], dt[live]
+        if len(slots) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        pos0 = self.pos[slots].astype(np.float64)
+        vel0 = self.vel[slots].astype(np.float64)
+        damping, gravity = self.damping[slots], self.gravity[slots]
+        life = self.life[slots].astype(np.float64)
+        age0 = self.age[slots].astype(np.float64)
+        # 推进到寿命终点为止, 之后的粒子会在下面被回收
+        span = np.minimum(dt, np.maximum(life - age0, 0.0))
+
+        self.pos[slots], self.vel[slots] = ballistic(pos0, vel0, span, damping, gravity)
+        self.age[slots] = age0 + dt
+        if self.changed is not None:
+            self.changed.append(slots)
+        # 爆炸的包围球按其粒子的年龄计算 (同批的尾焰火花更年轻, 取最大值)
+        burst = self.burst[slots]
+        grouped = burst >= 0
+        np.maximum.at(self.bursts.age, burst[grouped], self.age[slots][grouped])
+
+        # 1. 轨迹: 从新到旧, 第 k 个点是 k 帧之前的位置 (不早于本次推进的起点)
+        rows = np.flatnonzero(self.trail[slots] >= 0)
+        if len(rows):
+            k = np.arange(self.trails.max_length)
+            back = np.maximum(span[rows, None] - k[None, :] * frame_dt, 0.0)
+            history, _ = ballistic(pos0[rows, None, :], vel0[rows, None, :], back,
+                                   damping[rows, None], gravity[rows, None])
+            filled = np.floor(span[rows] / frame_dt).astype(np.int32) + 1
+            self.trails.fill(self.trail[slots[rows]], history, filled)
+
+        # 2. 尾焰
+        sparks = self._backfill_tails(slots, span, dt)
+
+        # 3. 到期回收, 刷新显示
+        expired = slots[self.age[slots] >= self.life[slots]]
+        expired = expired[self.alive[expired]]  # 补发尾焰时可能已被溢出策略回收
+        trails = self.trail[expired]
+        dead_frames = np.floor((self.age[expired] - self.life[expired]) / frame_dt).astype(np.int32)
+        self._release(expired)
+        # 死亡已久的粒子, 其轨迹的收缩也已经 (部分) 完成
+        has_trail = trails >= 0
+        self.trails.skip(trails[has_trail], dead_frames[has_trail])
+        hw = self.high_water
+        self._update_visuals(slice(0, hw), self.alive[:hw])
+        return sparks
+
+    def _backfill_tails(self, slots, span, dt):
+        """补发 slots 在推进的前 span 秒内发射、且推进 dt 秒后仍存活的尾焰粒子"""
+        rate = self.tail_rate[slots].astype(np.float64)
+        emit = rate > 0
+        if not emit.any():
+            return np.empty(0, dtype=np.int64)
+        src, span, dt, rate = slots[emit], span[emit], dt[emit], rate[emit]
+        interval = 1.0 / rate
+        timer0 = self.tail_timer[src].astype(np.float64)
+        spark_life = self.tail_life[src] / 1000.0
+
+        # 第 j 次发射发生在推进开始后 (j+1)*interval - timer0 秒 (发射粒子死亡后不再发射);
+        # 只有推进终点前 spark_life 秒内发射的仍存活
+        total = np.floor((span + timer0) / interval).astype(np.int64)
+        first = np.maximum(np.floor((dt - spark_life + timer0) / interval), 0).astype(np.int64)
+        first = np.minimum(first, total)
+        counts = total - first
+        self.tail_timer[src] = np.mod(timer0 + span, interval)
+        n = int(counts.sum())
+        if n == 0:
+            return np.empty(0, dtype=np.int64)
+
+        owner = np.repeat(np.arange(len(src)), counts)
+        j = first[owner] + np.arange(n) - np.repeat(np.cumsum(counts) - counts, counts)
+        emitted = (j + 1) * interval[owner] - timer0[owner]
+        spark_age = dt[owner] - emitted
+
+        # 发射时刻的发射粒子位置: 从其寿命终点 (或推进终点) 的状态倒推
+        rows = src[owner]
+        origin, _ = ballistic(self.pos[rows].astype(np.float64), self.vel[rows].astype(np.float64),
+                              emitted - span[owner], self.damping[rows], self.gravity[rows])
+        velocity = self._random_directions(n) * self.tail_speed[rows, None]
+        pos, vel = ballistic(origin, velocity, spark_age, damping_of(TAIL_DRAG), GRAVITY)
+
+        sparks = self.spawn(pos, vel, self.tail_color[rows], self.size[rows] * TAIL_SIZE,
+                            spark_life[owner], drag=TAIL_DRAG, burst=self.burst[rows])
+        self.age[sparks] = spark_age[:len(sparks)]
+        return sparks
+
+    def _random_directions(self, n):
+        """n 个均匀分布的随机单位向量 (由本粒子池的随机数流决定)"""
+        gen = np.random.default_rng(self.rng.getrandbits(64))
+        dirs = gen.normal(size=(n, 3))
+        dirs /= np.maximum(np.linalg.norm(dirs, axis=1, keepdims=True), 1e-9)
+        return dirs
+
+    # ------------------------------------------
+    # 每帧更新
+    # ------------------------------------------
+    def step(self, dt):
+        """
+        推进整个粒子群 dt 秒
+        """
+        self.advance(dt)
+        self.cleanup()
+
+    def advance(self, dt):
+        """
+        模拟阶段: 寿命、物理、视觉效果、轨迹历史与尾焰
+        本帧到期的粒子只被记录下来, 由 cleanup() 统一回收
+        """
+        self.flush()
+        self.time += dt
+        hw = self.high_water
+        self._expired = np.empty(0, dtype=np.int64)
+        if hw == 0:
+            return
+
+        # 1. 寿命 (空槽位一并计算, 结果不会被使用)
+        alive = self.alive[:hw]
+        age = self.age[:hw]
+        age += dt
+        expired = alive & (age >= self.life[:hw])
+        self._expired = np.flatnonzero(expired)
+        live = alive & ~expired
+
+        # 2. 物理计算: 按闭式解推进, 与帧率无关, 也与 fast_forward() 的跳转结果一致
+        k = self.damping[:hw]
+        kt = k * np.float32(dt)
+        if hw and kt.max() < 0.1:
+            # 常见情况 (单帧): 级数展开, 全部是 float32 的原地运算
+            f = dt * (1.0 - kt * (0.5 - kt * (1.0 / 6 - kt * (1.0 / 24))))
+            h = dt * dt * (0.5 - kt * (1.0 / 6 - kt * (1.0 / 24 - kt * (1.0 / 120))))
+            decay = np.exp(-kt)
+        else:
+            decay, f, h = (c.astype(np.float32) for c in _coefficients(k.astype(np.float64), dt))
+        pos, vel, g = self.pos[:hw], self.vel[:hw], self.gravity[:hw]
+        pos += vel * f[:, None]
+        pos[:, 2] -= g * h
+        vel *= decay[:, None]
+        vel[:, 2] -= g * f
+
+        # 3. 视觉效果 (淡出 + 闪烁) 与轨迹历史
+        self.bursts.step(dt)
+        if self.view is None:
+            self._update_visuals(slice(0, hw), live)
+            self._update_trails(hw, live)
+        else:
+            self._update_culled(hw, live)
+
+        # 4. 尾焰
+        self._emit_tails(dt, live)
+
+    def set_view(self, planes, eye=None):
+        """
+        设置摄像机视锥 (见 view_frustum) 与位置, 用于按爆炸剔除视觉更新; planes 为 None 时关闭剔除
+        """
+        if planes is None:
+            if self.changed is not None and self.bursts.far.any():
+                hw = self.high_water
+                self.changed.append(np.flatnonzero(self.alive[:hw] & self.bursts.far[self.burst[:hw]]))
+            self.bursts.far[:] = False  # 不剔除时所有爆炸都按近处处理
+            self.view = None
+            self.cull_stats = {"bursts": 0, "culled": 0, "far": 0}
+            return
+        self.view = (np.asarray(planes, dtype=np.float64), np.asarray(eye, dtype=np.float64))
+
+    def cleanup(self):
+        """
+        回收阶段: 到期粒子的槽位回到空闲栈, 轨迹开始收缩, 收缩处理区间
+        """
+        expired = self._expired
+        self._release(expired[self.alive[expired]])  # 两阶段之间可能已被 kill()
+        self._expired = np.empty(0, dtype=np.int64)
+        self.trails.step()
+
+        hw = self.high_water
+        if self.live_count == 0:
+            self.high_water = 0
+        elif not self.alive[hw - 1]:
+            self.high_water = int(np.flatnonzero(self.alive[:hw])[-1]) + 1
+
+    def _update_culled(self, hw, live):
+        """
+        按爆炸剔除的视觉更新: 视锥外的爆炸跳过淡出、闪烁与轨迹记录 (位置照常推进),
+        远处的爆炸丢弃轨迹、不再闪烁; 重新进入视锥的爆炸从当前位置重新记录轨迹
+        """
+        bursts = self.bursts
+        planes, eye = self.view
+        shown = bursts.classify(planes, eye, self.lod_distance)
+        if self.changed is not None and len(bursts.far_changed):
+            # 远处的爆炸不闪烁; 着色器路径的闪烁参数只在改写时上传, 因此记为改写
+            self.changed.append(np.flatnonzero(live & np.isin(self.burst[:hw], bursts.far_changed)))
+        cap = bursts.capacity
+        if not (bursts.active[:cap] & (bursts.far[:cap] | ~bursts.visible[:cap])).any():
+            # 常见情况: 所有爆炸都在视野内的近处, 与不剔除时完全相同
+            self._update_visuals(slice(0, hw), live)
+            self._update_trails(hw, live)
+            self.cull_stats = {"bursts": bursts.active_count, "culled": 0, "far": 0}
+            return
+
+        burst = self.burst[:hw]
+        far = bursts.far[burst]
+        if (bursts.active[:cap] & ~bursts.visible[:cap]).any():
+            visible = live & bursts.visible[burst]
+            rows = np.flatnonzero(visible)
+            self._update_visuals(rows, live[rows], flash=~far[rows])
+            culled = int(np.count_nonzero(live)) - len(rows)
+        else:
+            # 只有远处的爆炸: 整段更新, 远处的粒子不闪烁
+            visible = live
+            self._update_visuals(slice(0, hw), live, flash=~far)
+            culled = 0
+
+        trail = self.trail[:hw]
+        has_trail = trail >= 0
+        dropped = np.flatnonzero(visible & far & has_trail)
+        if len(dropped):
+            self.trails.release(trail[dropped])
+            self.trail[dropped] = -1
+            has_trail[dropped] = False
+        if len(shown):
+            back = np.flatnonzero(has_trail & np.isin(burst, shown))
+            self.trails.reset(trail[back], self.pos[back])
+        self._update_trails(hw, visible & ~far)
+
+        self.cull_stats = {
+            "bursts": bursts.active_count,
+            "culled": culled,
+            "far": int(np.count_nonzero(visible & far)),
+        }
+
+    def _update_visuals(self, rows, live, flash=True):
+        """
+        计算显示颜色与尺寸
+        Args:
+            rows (slice | array): 要更新的槽位
+            live (array): 对应行是否存活 (到期的行显示为 0)
+            flash (bool | array): 为 False 的行不闪烁
+        """
+        age = self.age[rows]
+        period = self.flash_period[rows]
+        amp = self.flash_amp[rows]
+        color = self.color[rows]
+
+        # 闪烁相位: 每个周期最后 30% 的时间变亮变大
+        safe_period = np.where(period > 0, period, 1.0)
+        flashing = (period > 0) & (np.mod(age, safe_period) > safe_period * 0.7) & flash
+        safe_amp = np.where(flashing, amp, 1.0)
+
+        draw = self.draw_color[rows]
+        draw[:, :3] = np.where(flashing[:, None], 1.0 - (1.0 - color) / safe_amp[:, None], color)
+        draw[:, 3] = 1.0 - age / np.maximum(self.life[rows], 1e-6)
+        draw *= live[:, None]
+        self.draw_color[rows] = draw
+        self.draw_size[rows] = self.size[rows] * safe_amp * live
+
+    def _update_trails(self, hw, live):
+        """存活的发射粒子写入当前位置 (到期粒子的轨迹在回收时释放)"""
+        rows = np.flatnonzero(live & (self.trail[:hw] >= 0))
+        if len(rows):
+            slots = self.trail[rows]
+            trails = self.trails
+            trails.color[slots] = self.draw_color[rows, :3]
+            trails.width[slots] = self.draw_size[rows]
+            trails.push(slots, self.pos[rows])
+
+    def _emit_tails(self, dt, live):
+        """
+        尾焰: 带尾焰的粒子主动向四周喷射微小粒子
+        所有发射粒子一起计算本帧应发射的数量, 方向与速度整批生成; 计时器按时间累加, 发射速率与帧率无关.
+        新火花在下一次 flush 时写入粒子池 (本帧到期的槽位回收之后)
+        """
+        hw = self.high_water
+        emitters = np.flatnonzero(live & (self.tail_rate[:hw] > 0))
+        if len(emitters) == 0:
+            return
+        timer = self.tail_timer[emitters] + np.float32(dt)
+        interval = 1.0 / self.tail_rate[emitters]
+        # 计时器每超过一个间隔发射一次 (严格大于, 与逐次扣减的结果一致)
+        owed = np.maximum(np.ceil(timer / interval).astype(np.int64) - 1, 0)
+        self.tail_timer[emitters] = timer - owed * interval
+        n = int(owed.sum())
+        if n == 0:
+            return
+
+        # 尾焰粒子通常不具备Trace和Tail，防止递归爆炸
+        src = np.repeat(emitters, owed)
+        self._sparks = (
+            self.pos[src],
+            self._random_directions(n) * self.tail_speed[src, None],
+            self.tail_color[src],
+            self.draw_size[src] * TAIL_SIZE,
+            self.tail_life[src] / 1000.0,
+            self.burst[src],  # 火花与发射粒子同属一个爆炸
+            self.bursts.generation[self.burst[src]],
+        )
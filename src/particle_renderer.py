@@ -0,0 +1,358 @@
+import numpy as np
+from panda3d.core import (
+    Geom, GeomNode, GeomTriangles, GeomVertexArrayFormat, GeomVertexData,
+    GeomVertexFormat, InternalName, NodePath, OmniBoundingVolume, Shader,
+    ColorBlendAttrib, TransparencyAttrib
+)
+
+from particle_engine import view_frustum
+
+# 单位四边形的四个角 (x 向右, y 向上) 与对应纹理坐标
+_CORNERS = np.array([[-0.5, -0.5], [0.5, -0.5], [-0.5, 0.5], [0.5, 0.5]], dtype=np.float32)
+_TEXCOORDS = np.array([[0, 0], [1, 0], [0, 1], [1, 1]], dtype=np.float32)
+_QUAD_INDICES = np.array([0, 1, 2, 2, 1, 3], dtype=np.uint32)
+
+
+# 着色器路径的顶点属性: 粒子最近一次被改写时的状态, 之后的运动、淡出与闪烁都在顶点着色器中推算
+#   vertex    - 位置                        velocity - 速度
+#   look      - 基础颜色 rgb + 尺寸         timing   - 改写时刻, 当时的年龄, 寿命, 衰减率 k
+#   flash     - 重力, 闪烁倍率, 闪烁周期
+_SHADER_COLUMNS = (
+    (InternalName.getVertex(), 3, Geom.C_point),
+    (InternalName.make("velocity"), 3, Geom.C_vector),
+    (InternalName.make("look"), 4, Geom.C_other),
+    (InternalName.make("timing"), 4, Geom.C_other),
+    (InternalName.make("flash"), 3, Geom.C_other),
+    (InternalName.getTexcoord(), 2, Geom.C_texcoord),
+)
+
+# 与 ParticleStore.advance() 相同的闭式解 (重力 + 指数阻力), 淡出与闪烁规则与 _update_visuals() 一致
+_SPRITE_VERTEX = """
+#version 120
+uniform mat4 p3d_ModelViewMatrix;
+uniform mat4 p3d_ProjectionMatrix;
+uniform float sim_time;
+attribute vec4 p3d_Vertex;
+attribute vec2 p3d_MultiTexCoord0;
+attribute vec3 velocity;
+attribute vec4 look;
+attribute vec4 timing;
+attribute vec3 flash;
+varying vec2 uv;
+varying vec4 tint;
+
+void main() {
+    float t = sim_time - timing.x;
+    float age = timing.y + t;
+    float k = timing.w;
+    float kt = k * t;
+    float f, h;
+    if (kt < 0.1) {
+        f = t * (1.0 - kt * (0.5 - kt * (1.0 / 6.0 - kt / 24.0)));
+        h = t * t * (0.5 - kt * (1.0 / 6.0 - kt * (1.0 / 24.0 - kt / 120.0)));
+    } else {
+        f = (1.0 - exp(-kt)) / k;
+        h = (t - f) / k;
+    }
+    vec3 pos = p3d_Vertex.xyz + velocity * f;
+    pos.z -= flash.x * h;
+
+    // 闪烁相位: 每个周期最后 30% 的时间变亮变大
+    float amp = 1.0;
+    if (flash.z > 0.0 && mod(age, flash.z) > flash.z * 0.7) {
+        amp = flash.y;
+    }
+    float alive = (age >= 0.0 && age < timing.z) ? 1.0 : 0.0;
+    tint = vec4(1.0 - (1.0 - look.rgb) / amp, 1.0 - age / max(timing.z, 1e-6)) * alive;
+
+    // 公告板: 在视图空间中沿屏幕方向展开
+    vec4 center = p3d_ModelViewMatrix * vec4(pos, 1.0);
+    center.xy += (p3d_MultiTexCoord0 - 0.5) * look.w * amp * alive;
+    gl_Position = p3d_ProjectionMatrix * center;
+    uv = p3d_MultiTexCoord0;
+}
+"""
+
+_SPRITE_FRAGMENT = """
+#version 120
+uniform sampler2D p3d_Texture0;
+varying vec2 uv;
+varying vec4 tint;
+
+void main() {
+    gl_FragColor = texture2D(p3d_Texture0, uv) * tint;
+}
+"""
+
+# 模拟时间超过该值后重新设定时间原点并重传所有粒子, 避免 float32 的时间精度随运行时长下降
+_REBASE_SECONDS = 600.0
+
+
+def _make_format(columns=None):
+    """每列各占一个数组, 方便按列整块写入; 默认为 顶点 / 颜色 / 纹理坐标"""
+    fmt = GeomVertexFormat()
+    for name, n, contents in columns or (
+        (InternalName.getVertex(), 3, Geom.C_point),
+        (InternalName.getColor(), 4, Geom.C_color),
+        (InternalName.getTexcoord(), 2, Geom.C_texcoord),
+    ):
+        arr = GeomVertexArrayFormat()
+        arr.addColumn(name, n, Geom.NT_float32, contents)
+        fmt.addArray(arr)
+    return GeomVertexFormat.registerFormat(fmt)
+
+
+def _view(array_data, dtype, cols):
+    """把 Panda3D 顶点数组映射为可写的 NumPy 视图 (零拷贝)"""
+    raw = np.asarray(memoryview(array_data).cast("B"))
+    return raw.view(dtype).reshape(-1, cols)
+
+
+def _ribbon_indices(trails, length):
+    """每条轨迹 length 个历史点 -> 2*length 个顶点 -> (length-1) 段四边形"""
+    seg = np.arange(length - 1, dtype=np.uint32)[:, None] * 2 + _QUAD_INDICES[None, :]
+    base = (np.arange(trails, dtype=np.uint32) * (length * 2))[:, None]
+    return (base + seg.ravel()[None, :]).ravel()
+
+
+class _DynamicGeom:
+    """一个动态顶点缓冲 + 三角形图元, 容量按需翻倍; 纹理坐标固定为最后一列"""
+    def __init__(self, name, geom_node, columns=None):
+        self.vdata = GeomVertexData(name, _make_format(columns), Geom.UH_dynamic)
+        self.texcoord_array = self.vdata.getFormat().getNumArrays() - 1
+        self.prim = GeomTriangles(Geom.UH_dynamic)
+        self.prim.setIndexType(Geom.NT_uint32)
+        geom = Geom(self.vdata)
+        geom.addPrimitive(self.prim)
+        geom_node.addGeom(geom)
+        self.indices = np.empty(0, dtype=np.uint32)
+        self.drawn = -1
+
+    def resize(self, rows, texcoords, indices):
+        """重新分配顶点行数, 纹理坐标与索引只在这里写一次"""
+        self.vdata.setNumRows(rows)
+        _view(self.vdata.modifyArray(self.texcoord_array), np.float32, 2)[:] = texcoords
+        self.indices = indices
+        self.drawn = -1
+
+    def vertices(self, rows):
+        return _view(self.vdata.modifyArray(0), np.float32, 3)[:rows]
+
+    def colors(self, rows):
+        return _view(self.vdata.modifyArray(1), np.float32, 4)[:rows]
+
+    def column(self, index, cols):
+        """第 index 列的全部行"""
+        return _view(self.vdata.modifyArray(index), np.float32, cols)
+
+    def draw(self, index_count):
+        """只绘制前 index_count 个索引"""
+        if index_count == self.drawn:
+            return
+        handle = self.prim.modifyVertices()
+        handle.setNumRows(index_count)
+        if index_count:
+            _view(handle, np.uint32, 1)[:, 0] = self.indices[:index_count]
+        self.drawn = index_count
+
+
+def load_sprite_shader(gsg):
+    """
+    编译粒子着色器 (GLSL 1.20, Mesa 的软件渲染 llvmpipe 也支持)
+    Returns:
+        Shader | None: 显卡 / 驱动不支持或编译失败时为 None
+    """
+    if gsg is None or not gsg.getSupportsGlsl():
+        return None
+    shader = Shader.make(Shader.SL_GLSL, _SPRITE_VERTEX, _SPRITE_FRAGMENT)
+    if shader is None or shader.getErrorFlag():
+        return None
+    return shader
+
+
+class ParticleRenderer:
+    """
+    批量粒子渲染器
+    所有粒子展开为面向摄像机的四边形, 所有轨迹展开为渐隐的条带,
+    分别写入两个动态 GeomVertexData. 无论粒子多少, 每帧只有两次绘制调用.
+
+    提供着色器时, 粒子只在生成 / 回收 / 跳转时上传一次状态 (位置、速度、颜色、尺寸、寿命与闪烁参数),
+    之后的运动、公告板、淡出与闪烁由顶点着色器根据时间 uniform 计算, 每帧不再改写粒子顶点.
+    轨迹条带始终由 CPU 展开.
+
+    Args:
+        parent (NodePath): 挂载点 (通常是 render)
+        camera (NodePath): 用于计算公告板朝向的摄像机
+        texture (Texture): 粒子纹理
+        shader (Shader): load_sprite_shader() 的结果, None 则使用固定管线
+    """
+    def __init__(self, parent, camera, texture, shader=None):
+        self.camera = camera
+        self.capacity = 0
+        self.trail_capacity = 0
+        self.trail_length = 0
+        self.shader = shader
+        self._store = None  # 着色器路径: 已上传状态所属的粒子池
+        self._epoch = 0.0   # 着色器路径: 时间 uniform 的原点 (模拟时间)
+
+        self.geom_node = GeomNode("particle_batch")
+        if shader is None:
+            self.sprites = _DynamicGeom("particles", self.geom_node)
+        else:
+            sprite_node = GeomNode("particle_shader")
+            self.sprites = _DynamicGeom("particles", sprite_node, _SHADER_COLUMNS)
+            sprite_node.setBounds(OmniBoundingVolume())
+            sprite_node.setFinal(True)
+        self.ribbons = _DynamicGeom("trails", self.geom_node)
+        # 顶点每帧都在变, 不计算包围盒, 也不参与视锥剔除
+        self.geom_node.setBounds(OmniBoundingVolume())
+        self.geom_node.setFinal(True)
+
+        self.node = NodePath(self.geom_node)
+        if shader is not None:
+            self.sprite_node = self.node.attachNewNode(sprite_node)
+            self.sprite_node.setShader(shader)
+            self.sprite_node.setShaderInput("sim_time", 0.0)
+        self.node.reparentTo(parent)
+        self.node.setTexture(texture)
+        self.node.setTransparency(TransparencyAttrib.M_alpha)
+        self.node.setAttrib(ColorBlendAttrib.make(ColorBlendAttrib.M_add))
+        self.node.setDepthWrite(False)
+        self.node.setTwoSided(True)
+        self.node.setLightOff()
+
+    def _reserve(self, count):
+        """扩容粒子缓冲 (翻倍)"""
+        if count <= self.capacity:
+            return
+        cap = max(self.capacity, 1024)
+        while cap < count:
+            cap *= 2
+        base = (np.arange(cap, dtype=np.uint32) * 4)[:, None]
+        self.sprites.resize(cap * 4, np.tile(_TEXCOORDS, (cap, 1)), (base + _QUAD_INDICES[None, :]).ravel())
+        self.capacity = cap
+
+    def _reserve_trails(self, count, length):
+        """扩容轨迹缓冲; 条带横向使用纹理的中线, 边缘自然变暗"""
+        if count <= self.trail_capacity and length == self.trail_length:
+            return
+        cap = max(self.trail_capacity, 256)
+        while cap < count:
+            cap *= 2
+        texcoords = np.tile(np.array([[0, 0.5], [1, 0.5]], dtype=np.float32), (cap * length, 1))
+        self.ribbons.resize(cap * length * 2, texcoords, _ribbon_indices(cap, length))
+        self.trail_capacity, self.trail_length = cap, length
+
+    def _camera_axes(self):
+        """摄像机在挂载点坐标系下的 右 / 上 / 前 方向"""
+        quat = self.camera.getQuat(self.node)
+        return np.array([tuple(quat.getRight()), tuple(quat.getUp()), tuple(quat.getForward())],
+                        dtype=np.float32)
+
+    def frustum(self):
+        """
+        摄像机在挂载点坐标系下的视锥平面与位置, 供 ParticleStore.set_view() 剔除
+        """
+        lens = self.camera.node().getLens()
+        eye = np.array(tuple(self.camera.getPos(self.node)), dtype=np.float64)
+        right, up, forward = self._camera_axes()
+        fov = lens.getFov()
+        return view_frustum(eye, right, up, forward, (fov[0], fov[1]), lens.getNear()), eye
+
+    def update(self, store):
+        """把粒子引擎当前帧的位置 / 颜色 / 尺寸整块写入顶点缓冲"""
+        self.upload(store)
+        self.draw(store)
+
+    def upload(self, store):
+        """着色器路径: 上传状态被直接改写过的槽位, 需在粒子池不被其他线程修改时调用; 固定管线无事可做"""
+        if self.shader is not None:
+            self._update_shader_sprites(store)
+
+    def draw(self, frame):
+        """
+        由 CPU 展开的部分 (固定管线的粒子与所有轨迹) 写入顶点缓冲
+        Args:
+            frame: 粒子池本身, 或模拟线程交出的 pipeline.RenderSnapshot
+        """
+        axes = self._camera_axes()
+        if self.shader is None:
+            self._update_sprites(frame, axes)
+        self._update_ribbons(frame.trails, axes[2])
+
+    def _update_sprites(self, store, axes):
+        # 空槽位的尺寸与颜色为 0, 直接整段绘制 [0, high_water)
+        n = store.high_water
+        self._reserve(n)
+        if n:
+            # 公告板: 四边形沿摄像机的右/上方向展开
+            offsets = _CORNERS @ axes[:2]  # (4, 3)
+            verts = self.sprites.vertices(n * 4).reshape(n, 4, 3)
+            np.multiply(store.draw_size[:n, None, None], offsets[None, :, :], out=verts)
+            verts += store.pos[:n, None, :]
+
+            colors = self.sprites.colors(n * 4).reshape(n, 4, 4)
+            colors[:] = store.draw_color[:n, None, :]
+        self.sprites.draw(n * 6)
+
+    def _update_shader_sprites(self, store):
+        # 只上传状态被直接改写过的槽位, 其余粒子由着色器按闭式解推算
+        n = store.high_water
+        now = store.time - self._epoch
+        if store is not self._store or now > _REBASE_SECONDS:
+            self._store = store
+            self._epoch, now = store.time, 0.0
+            store.changed = []
+            slots = np.arange(n)
+        else:
+            slots = store.take_changed()
+        self._reserve(max(n, int(slots[-1]) + 1 if len(slots) else 0))
+
+        if len(slots):
+            live = store.alive[slots]
+            timing = np.column_stack([
+                np.full(len(slots), now), store.age[slots], store.life[slots] * live, store.damping[slots],
+            ])
+            values = (
+                store.pos[slots], store.vel[slots],
+                np.column_stack([store.color[slots], store.size[slots]]), timing,
+                # 与 CPU 路径一致: 远处 (LOD) 爆炸的粒子不闪烁, 周期记为 0
+                np.column_stack([store.gravity[slots], store.flash_amp[slots],
+                                 store.flash_period[slots] * ~store.bursts.far[store.burst[slots]]]),
+            )
+            for index, value in enumerate(values):
+                cols = value.shape[1]
+                self.sprites.column(index, cols).reshape(-1, 4, cols)[slots] = value[:, None, :]
+        self.sprite_node.setShaderInput("sim_time", now)
+        self.sprites.draw(n * 6)
+
+    def _update_ribbons(self, trails, forward):
+        slots = np.flatnonzero(trails.active)
+        t, h = len(slots), trails.max_length
+        self._reserve_trails(t, h)
+        if t:
+            # 按从新到旧的顺序展开环形缓冲, 超出有效长度的点钉在最旧的记录上
+            k = np.arange(h)
+            length = trails.length[slots][:, None]
+            filled = trails.filled[slots][:, None]
+            idx = (trails.head[slots][:, None] - 1 - np.minimum(k, filled - 1)) % length
+            pts = trails.hist[slots[:, None], idx]  # (t, h, 3)
+            fade = np.clip(1.0 - k / length, 0.0, 1.0) * (k < filled)
+
+            # 条带宽度方向 = 轨迹切线 x 视线方向
+            tangent = np.empty_like(pts)
+            tangent[:, :-1] = pts[:, :-1] - pts[:, 1:]
+            tangent[:, -1] = tangent[:, -2]
+            side = np.cross(tangent, forward)
+            side /= np.maximum(np.linalg.norm(side, axis=2, keepdims=True), 1e-6)
+            side *= (trails.width[slots][:, None] * 0.5 * fade)[:, :, None]
+
+            verts = self.ribbons.vertices(t * h * 2).reshape(t, h, 2, 3)
+            np.subtract(pts, side, out=verts[:, :, 0])
+            np.add(pts, side, out=verts[:, :, 1])
+
+            # 叠加混合下 alpha 不起作用, 因此淡出直接乘进颜色
+            colors = self.ribbons.colors(t * h * 2).reshape(t, h, 2, 4)
+            colors[:, :, :, :3] = (trails.color[slots][:, None, :] * fade[:, :, None])[:, :, None, :]
+            colors[:, :, :, 3] = fade[:, :, None]
+        self.ribbons.draw(t * (h - 1) * 6)
@@ -0,0 +1,181 @@
+"""
+模拟线程流水线 (Simulation Pipeline)
+单线程时每帧的模拟耗时直接叠加在渲染与泛光之上. 流水线模式下模拟在专用线程上推进:
+主线程渲染第 N 帧的同时, 模拟线程计算第 N+1 帧, 两者通过双缓冲的 RenderSnapshot 交换
+粒子的位置 / 颜色 / 尺寸与轨迹. NumPy 的大块运算与 Panda3D 的 render_frame 都会释放 GIL,
+因此两边的工作可以真正重叠. 画面比模拟晚一帧.
+
+每帧的顺序 (见 main.FireworkShow):
+    sync()    等待模拟线程交出上一次提交的帧并交换快照; 之后粒子池只归主线程所有,
+              导演脚本、交互发射与跳转可以直接改写
+    submit()  模拟线程开始推进下一帧; 之后到下一次 sync() 之前主线程不得读写粒子池,
+              只绘制 front 快照
+
+脚本中 "render": {"threaded": false} 可退回单线程路径 (便于调试).
+"""
+import threading
+import time
+
+import numpy as np
+
+
+_TRAIL_FIELDS = ("hist", "head", "filled", "length", "width", "color")
+
+
+def snapshot_layout(capacity, trail_capacity, trail_length, sprites=True):
+    """
+    RenderSnapshot 各数组的 [(名称, 形状, dtype)]
+    粒子字段与 ParticleStore 同名, 轨迹字段为 TrailBuffer 的字段名加 "trail_" 前缀
+    """
+    layout = []
+    if sprites:
+        layout += [("pos", (capacity, 3), np.float32), ("draw_color", (capacity, 4), np.float32),
+                   ("draw_size", (capacity,), np.float32)]
+    layout += [("trail_hist", (trail_capacity, trail_length, 3), np.float32),
+               ("trail_head", (trail_capacity,), np.int32), ("trail_filled", (trail_capacity,), np.int32),
+               ("trail_length", (trail_capacity,), np.int32), ("trail_width", (trail_capacity,), np.float32),
+               ("trail_color", (trail_capacity, 3), np.float32)]
+    return layout
+
+
+class _TrailSnapshot:
+    """
+    活动轨迹的紧凑拷贝, 字段与 TrailBuffer 相同 (供 ParticleRenderer 直接读取)
+    前 count 个槽位依次对应拷贝时的活动轨迹, active 为长度 count 的全 True 视图
+    """
+    def __init__(self, arrays):
+        for name in _TRAIL_FIELDS:
+            setattr(self, name, arrays["trail_" + name])
+        self.max_length = self.hist.shape[1]
+        self._ones = np.ones(len(self.hist), dtype=bool)
+        self.active = self._ones[:0]
+
+    @property
+    def count(self):
+        return len(self.active)
+
+    def resize(self, count):
+        self.active = self._ones[:count]
+
+    def capture(self, trails):
+        slots = np.flatnonzero(trails.active)
+        t = len(slots)
+        for name in _TRAIL_FIELDS:
+            np.take(getattr(trails, name), slots, axis=0, out=getattr(self, name)[:t])
+        self.resize(t)
+
+
+class RenderSnapshot:
+    """
+    一帧的渲染数据, 字段是 ParticleStore 中 ParticleRenderer.draw() 所读取的子集
+    数组按粒子池容量预先分配 (也可以是共享内存上的视图, 见 multiview), 每次只拷贝 [0, high_water) 区间
+
+    Args:
+        arrays (dict): 名称 -> 数组, 按 snapshot_layout() 分配; 不含 pos 时只有轨迹 (着色器路径)
+    """
+    def __init__(self, arrays):
+        self.sprites = "pos" in arrays
+        self.high_water = 0
+        if self.sprites:
+            self.pos = arrays["pos"]
+            self.draw_color = arrays["draw_color"]
+            self.draw_size = arrays["draw_size"]
+        self.trails = _TrailSnapshot(arrays)
+
+    @classmethod
+    def for_store(cls, store, sprites=True):
+        """按粒子池的容量分配一份快照"""
+        trails = store.trails
+        layout = snapshot_layout(store.capacity, trails.capacity, trails.max_length, sprites)
+        return cls({name: np.zeros(shape, dtype) for name, shape, dtype in layout})
+
+    def capture(self, store):
+        n = store.high_water
+        self.high_water = n
+        if self.sprites:
+            np.copyto(self.pos[:n], store.pos[:n])
+            np.copyto(self.draw_color[:n], store.draw_color[:n])
+            np.copyto(self.draw_size[:n], store.draw_size[:n])
+        self.trails.capture(store.trails)
+
+
+class SimulationPipeline:
+    """
+    在专用线程上推进模拟, 与主线程的渲染重叠
+    Args:
+        step (callable): 以 dt 推进模拟一帧 (ParticleSystem.step)
+        store (ParticleStore): step 所推进的粒子池
+        sprites (bool): 快照是否包含粒子的位置 / 颜色 / 尺寸, 见 RenderSnapshot
+    """
+    def __init__(self, step, store, sprites=True):
+        self.step = step
+        self.store = store
+        self.front = RenderSnapshot.for_store(store, sprites)  # 主线程正在绘制的帧
+        self._back = RenderSnapshot.for_store(store, sprites)  # 模拟线程正在写入的帧
+        self.front.capture(store)
+
+        self.step_time = 0.0  # 最近一帧模拟线程的耗时 (秒)
+        self.wait_time = 0.0  # 最近一次 sync() 中主线程的等待时间 (秒)
+        self._dt = 0.0
+        self._busy = False
+        self._closed = False
+        self._error = None
+        self._start = threading.Event()
+        self._done = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="SimulationPipeline", daemon=True)
+        self.thread.start()
+
+    def submit(self, dt):
+        """模拟线程开始推进 dt 秒; 到下一次 sync() 返回之前, 主线程不得读写粒子池"""
+        if self._busy:
+            raise RuntimeError("上一帧尚未 sync()")
+        self._dt = dt
+        self._busy = True
+        self._done.clear()
+        self._start.set()
+
+    def sync(self):
+        """
+        等待模拟线程完成并交换快照, 模拟线程中的异常在这里重新抛出
+        Returns:
+            RenderSnapshot: 刚完成的一帧 (即新的 front)
+        """
+        if not self._busy:
+            return self.front
+        t0 = time.perf_counter()
+        self._done.wait()
+        self.wait_time = time.perf_counter() - t0
+        self._busy = False
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+        self.front, self._back = self._back, self.front
+        return self.front
+
+    def refresh(self):
+        """主线程直接改写了粒子池 (例如跳转) 后, 用当前状态覆盖 front, 不再显示改写前的画面"""
+        self.sync()
+        self.front.capture(self.store)
+
+    def close(self):
+        """等待当前帧完成并结束模拟线程"""
+        self.sync()
+        self._closed = True
+        self._start.set()
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            self._start.wait()
+            self._start.clear()
+            if self._closed:
+                return
+            t0 = time.perf_counter()
+            try:
+                self.step(self._dt)
+                self._back.capture(self.store)
+            except BaseException as e:  # 交给主线程在 sync() 中处理
+                self._error = e
+            self.step_time = time.perf_counter() - t0
+            self._done.set()
+
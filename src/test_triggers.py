@@ -0,0 +1,128 @@
+"""
+外部触发的回归测试: 来自网络的任意数据都不能在渲染线程上抛出异常
+
+运行 (在 src 目录下):
+    python -m pytest -q test_triggers.py
+"""
+import json
+import random
+import socket
+import time
+
+import pytest
+
+from headless import HeadlessApp, HeadlessShow
+from main import ParticleSystem, Timeline, TimelineError
+from triggers import TriggerQueue, TriggerServer, encode_osc, parse_datagram
+
+# 每个事件都曾在 HeadlessShow.step() 或接收线程中抛出异常
+HOSTILE_EVENTS = [
+    {"pos": [0, 0, 80], "color": "zzz"},
+    {"pos": [0, 0, 80], "color": [1, "x", 0]},
+    {"pos": [0, 0, 80], "color": 5},
+    {"pos": [0, 0, 80], "strategy": ["text", "zzz"]},
+    {"pos": [0, 0, 80], "strategy": {"name": ["standard"]}},
+    {"pos": [0, 0, 80], "strategy": {"name": "standard", "args": [{}]}},
+    {"pos": [0, 0, 80], "strategy": {"name": "text_shape_3d", "args": ["not-in-the-word-bank"]}},
+    {"pos": [0, 0, 80], "strategy": {"name": "text_shape_3d", "args": [["a"]]}},
+    {"pos": [0, 0, 80], "tail": [1, 2, 3]},
+    {"pos": [0, 0, 80], "tail": {"count": "many"}},
+    {"pos": [0, 0, 80], "tail": {"color": "zzz"}},
+    {"pos": [0, 0, float("nan")]},
+    {"pos": [0, 0, 80], "time": float("inf")},
+    {"pos": [0, 0, 80], "size": "big"},
+    {"pos": [0, 0, 80], "trace": 1e400},
+    {"pos": [0, 0, 80], "trace": -1},
+    {"pos": "up"},
+    {"pos": [0, 0, 80], "type": "camera"},
+]
+
+VALID_EVENT = {"pos": [0, 0, 80], "time": 1.0, "color": [1, 0.5, 0.2], "strategy": "glitter",
+               "tail": {"count": 10, "velocity": 2, "time": 300}}
+
+
+@pytest.fixture
+def show():
+    data = {"firework": [], "camera": []}
+    app = HeadlessApp()
+    app.triggers = TriggerQueue(report_interval=0)
+    return HeadlessShow(data, seed=1, app=app)
+
+
+@pytest.mark.parametrize("event", HOSTILE_EVENTS)
+def test_compile_live_rejects(event):
+    timeline = Timeline({"firework": []}, 0)
+    with pytest.raises(TimelineError):
+        timeline.compile_live(event, random.Random(0))
+
+
+def test_hostile_triggers_do_not_break_the_show(show):
+    queue = show.app.triggers
+    for event in HOSTILE_EVENTS + [VALID_EVENT]:
+        queue.push(event, time.perf_counter())
+    for _ in range(120):
+        show.step()
+    assert queue.stats["rejected"] == len(HOSTILE_EVENTS)
+    assert queue.stats["launched"] == 1
+    assert ParticleSystem.store.live_count > 0
+
+
+@pytest.mark.parametrize("data", [
+    b'{"cue": [1]}',
+    b'{"cue": true}',
+    b'{"cue": {"a": 1}}',
+    b'{"repeat": "x"}',
+    b'{"repeat": 0}',
+    b'{"repeat": 1e400}',
+    b"[" * 60000,
+    b'{"events": 5}',
+    b"[1, 2]",
+    b"not json",
+    b"/launch\0",
+    encode_osc("/nowhere", [1.0, 2.0, 3.0]),
+])
+def test_parse_datagram_rejects(data):
+    with pytest.raises(Exception):
+        parse_datagram(data)
+
+
+def test_parse_datagram_osc():
+    event = {"pos": [1, 2, 3], "cue": "A1"}
+    assert parse_datagram(encode_osc("/launch", [json.dumps(event)])) == [event]
+    assert parse_datagram(encode_osc("/launch", [1.0, 2.0, 3.0, 1.5])) == [{"pos": [1.0, 2.0, 3.0], "time": 1.5}]
+
+
+def test_server_survives_hostile_datagrams():
+    server = TriggerServer(0, host="127.0.0.1", report_interval=0)
+    try:
+        address = server.sock.getsockname()
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        for data in (b"[" * 60000, b'{"cue": [1]}', b"\xff\xfe", b'{"cue": "A", "pos": [0, 0, 60]}'):
+            sender.sendto(data, address)
+        sender.close()
+        deadline = time.perf_counter() + 2.0
+        while len(server.queue) < 1 and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        assert server.thread.is_alive()
+        assert server.queue.stats["invalid"] == 3
+        assert len(server.queue) == 1
+    finally:
+        server.close()
+
+
+def test_drain_budgets_repeats_and_carries_over():
+    queue = TriggerQueue(max_per_frame=32, report_interval=0)
+    now = time.perf_counter()
+    for _ in range(5):
+        queue.push({"repeat": 20}, now)
+    assert [sum(t.cost for t in queue.drain()) for _ in range(6)] == [20, 20, 20, 20, 20, 0]
+
+
+def test_drain_coalesces_cues_and_drops_stale():
+    queue = TriggerQueue(max_delay=0.5, report_interval=0)
+    now = time.perf_counter()
+    queue.push({"cue": "old"}, now - 1.0)
+    for cue in ("A", "A", 1, "B", 1):
+        queue.push({"cue": cue}, now)
+    assert [t.event["cue"] for t in queue.drain()] == ["A", 1, "B"]
+    assert queue.stats["stale"] == 1 and queue.stats["coalesced"] == 2
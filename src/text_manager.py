@@ -1,9 +1,15 @@
 import os
 import sys
-import pickle as pkl
+import hashlib
 import platform
+import argparse
+import json
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 from PIL import Image, ImageFont, ImageDraw
 
+from word_bank import WordBank
+
 # ==========================================
 # 核心逻辑：字模生成 (恢复大画布裁剪逻辑)
 # ==========================================
@@ -21,6 +27,21 @@ class CharToBitmap:
             except:
                 print("Error: 无法加载任何字体，文字生成将失败。")
                 self.font = None
+        self.font_hash = self._hash_font()
+
+    def _hash_font(self):
+        """实际加载的字体文件的内容摘要, 用作字模缓存的键"""
+        if not self.font:
+            return "none"
+        path = getattr(self.font, "path", None)
+        digest = hashlib.sha1()
+        if isinstance(path, str) and os.path.exists(path):
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+        else:
+            digest.update(str(path).encode("utf-8"))
+        return digest.hexdigest()
 
     def _get_default_font(self):
         """自动寻找系统字体"""
@@ -38,174 +59,351 @@ class CharToBitmap:
                 return p
         return "arial.ttf"
 
+    def get_mask(self, char):
+        """
+        获取单字的布尔位图 (size x size, 下标为 [y, x], y 向下)
+        【关键修复】使用大画布绘制+裁剪+居中逻辑，防止边缘被切
+        """
+        size = self.size
+        mask = np.zeros((size, size), dtype=bool)
+        if not self.font: return mask
+
+        # 1. 创建 3 倍大小的临时画布，防止字画出界, 随意画在画布中间
+        temp_img = Image.new("1", (size * 3, size * 3), 0)
+        ImageDraw.Draw(temp_img).text((size, size), char, font=self.font, fill=1)
+        pixels = np.array(temp_img, dtype=bool)
+
+        # 2. 内容的实际边界 (Bounding Box)
+        rows = np.flatnonzero(pixels.any(axis=1))
+        cols = np.flatnonzero(pixels.any(axis=0))
+        if len(rows) == 0:
+            return mask
+        glyph = pixels[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+        h, w = glyph.shape
+
+        # 3. 绝对居中贴到目标画布 (超出画布的部分被裁掉)
+        top, left = (size - h) // 2, (size - w) // 2
+        y0, x0 = max(top, 0), max(left, 0)
+        y1, x1 = min(top + h, size), min(left + w, size)
+        mask[y0:y1, x0:x1] = glyph[y0 - top:y1 - top, x0 - left:x1 - left]
+        return mask
+
     def get_coordinates_set(self, char):
         """
         获取汉字所有“亮点”的坐标集合 (set格式，方便查询)
-        【关键修复】使用大画布绘制+裁剪+居中逻辑，防止边缘被切
         Returns: set of (x, y)
         """
-        if not self.font: return set()
-
-        # 1. 创建 3 倍大小的临时画布，防止字画出界
-        temp_size = self.size * 3
-        temp_img = Image.new("1", (temp_size, temp_size), 0)
-        draw = ImageDraw.Draw(temp_img)
-        
-        # 2. 随意画在画布中间
-        draw.text((self.size, self.size), char, font=self.font, fill=1)
-        
-        # 3. 获取内容的实际边界 (Bounding Box)
-        bbox = temp_img.getbbox()
-        if not bbox:
-            return set()
-            
-        # 4. 裁剪出只有字的最小矩形
-        cropped = temp_img.crop(bbox)
-        w, h = cropped.size
-        
-        # 5. 创建最终的目标画布
-        final_img = Image.new("1", (self.size, self.size), 0)
-        
-        # 6. 计算绝对居中位置
-        paste_x = (self.size - w) // 2
-        paste_y = (self.size - h) // 2
-        
-        # 7. 贴上去
-        final_img.paste(cropped, (paste_x, paste_y))
-
-        # 8. 提取坐标
-        coords = set()
-        for py in range(self.size):
-            for px in range(self.size):
-                if final_img.getpixel((px, py)) > 0:
-                    coords.add((px, py)) 
-        return coords
+        ys, xs = np.nonzero(self.get_mask(char))
+        return set(zip(xs.tolist(), ys.tolist()))
+
+
+class GlyphCache:
+    """
+    磁盘字模缓存: 每个 (字体文件, 字号) 一个 .npz 文件, 每个字一条按位压缩的位图
+    同一字体下每个字只需要光栅化一次, 换字体或字号自动使用另一个文件
+    Args:
+        folder (str): 缓存目录
+        font_hash (str): 字体文件内容摘要
+        size (int): 字号
+    """
+    def __init__(self, folder, font_hash, size):
+        self.path = os.path.join(folder, f"{font_hash[:16]}_{size}.npz")
+        self.size = size
+        self.unsaved = {}
+        self._archive = None
+        if os.path.exists(self.path):
+            try:
+                self._archive = np.load(self.path, allow_pickle=False)
+            except Exception as e:
+                print(f"[TextManager] 字模缓存损坏，将重新生成: {e}")
+
+    @staticmethod
+    def _name(char):
+        return "u" + "_".join(f"{ord(c):x}" for c in char)
+
+    def get(self, char):
+        """Returns: np.ndarray | None, [y, x] 布尔位图"""
+        name = self._name(char)
+        if name in self.unsaved:
+            bits = self.unsaved[name]
+        elif self._archive is not None and name in self._archive.files:
+            bits = self._archive[name]
+        else:
+            return None
+        n = self.size * self.size
+        return np.unpackbits(bits, count=n).astype(bool).reshape(self.size, self.size)
+
+    def put(self, char, mask):
+        self.unsaved[self._name(char)] = np.packbits(mask)
+
+    def save(self):
+        """合并已有字模与新字模, 写入临时文件后替换"""
+        if not self.unsaved:
+            return
+        glyphs = {}
+        if self._archive is not None:
+            glyphs = {name: self._archive[name] for name in self._archive.files}
+            self._archive.close()
+            self._archive = None
+        glyphs.update(self.unsaved)
+        folder = os.path.dirname(self.path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        tmp = self.path + ".tmp.npz"
+        np.savez(tmp, **glyphs)
+        os.replace(tmp, self.path)
+        self.unsaved = {}
+        self._archive = np.load(self.path, allow_pickle=False)
+
+# ==========================================
+# 核心逻辑：3D 几何生成
+# ==========================================
+FONT_PATH = "../assets/fonts/SourceHanSansSC-Normal.otf"
+
+# 缺失词条少于该数量时直接在主进程生成 (进程池启动本身也有开销)
+PARALLEL_THRESHOLD = 8
+
+# 几何生成逻辑的版本号: 修改 WordGenerator.generate 的输出时加一, 已缓存的词条会按需重新生成
+GENERATOR_VERSION = 2
+
+# 垃圾 (被覆盖或已失效的记录) 超过词库文件的这一比例时, 保存后自动压缩
+GC_RATIO = 0.5
+
+
+class WordGenerator:
+    """
+    字模光栅化 + 3D 体素生成, 不涉及词库文件, 可在工作进程中独立使用
+    Args:
+        font_path (str): 字体文件
+        font_size (int): 字号 (即体素分辨率)
+        glyph_folder (str): 磁盘字模缓存目录
+    """
+    def __init__(self, font_path=FONT_PATH, font_size=16, glyph_folder="glyph_cache"):
+        self.font_size = font_size
+        self.converter = CharToBitmap(size=font_size, font_path=font_path)
+        self.glyph_cache = GlyphCache(glyph_folder, self.converter.font_hash, font_size)
+        self.data_2d_cache = {}  # 字 -> [x, z] 布尔字模
+        self.fingerprint = self._fingerprint()
+
+    def _fingerprint(self):
+        """字体文件摘要 + 字号 + 生成器版本 -> 64 位指纹 (0 保留给来源未知的旧词条)"""
+        text = f"{self.converter.font_hash}:{self.font_size}:{GENERATOR_VERSION}"
+        return int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "little") or 1
+
+    @property
+    def can_generate(self):
+        """字体加载失败时无法生成, 已缓存的词条即使过期也继续使用"""
+        return self.converter.font is not None
+
+    def _get_mask(self, char):
+        """
+        获取单字的布尔字模, 下标为 [x, z]
+        z 已翻转为向上 (图像的 y 向下, 0 在上面)
+        查找顺序: 运行时缓存 -> 磁盘字模缓存 -> 光栅化
+        """
+        if char not in self.data_2d_cache:
+            glyph = self.glyph_cache.get(char)
+            if glyph is None:
+                glyph = self.converter.get_mask(char)
+                self.glyph_cache.put(char, glyph)
+            self.data_2d_cache[char] = glyph.T[:, ::-1]
+        return self.data_2d_cache[char]
+
+    def generate(self, key):
+        """
+        执行 3D 几何生成的数学逻辑
+        字模均为 [x, z] 布尔数组, 体素由广播一次算出, 适用于任意 font_size
+        Returns: np.ndarray (N, 3) int32
+        """
+        parts = key.split("-")
+
+        # --- 模式 1: 单字 (挤压拉伸, y 方向厚度 3) ---
+        if len(parts) == 1:
+            xz = np.argwhere(self._get_mask(parts[0]))  # (N, 2)
+            points = np.empty((len(xz), 3, 3), dtype=np.int32)
+            points[:, :, 0] = xz[:, None, 0]
+            points[:, :, 1] = (0, 1, -1)
+            points[:, :, 2] = xz[:, None, 1]
+            return points.reshape(-1, 3)
+
+        # --- 模式 2: 双字 (正交交叉): 第一个字是 xz 面的投影, 第二个字是 yz 面的投影 ---
+        if len(parts) == 2:
+            mask_x, mask_y = (self._get_mask(c) for c in parts)
+            volume = mask_x[:, None, :] & mask_y[None, :, :]  # [x, y, z]
+
+        # --- 模式 3: 三字 (三视图交叉): 第三个字是 xy 面的俯视图 (字的上方朝 +y) ---
+        elif len(parts) == 3:
+            mask_1, mask_2, mask_3 = (self._get_mask(c) for c in parts)
+            volume = mask_1[:, None, :] & mask_2[None, :, :] & mask_3[:, :, None]
+
+        else:
+            return np.empty((0, 3), dtype=np.int32)
+
+        return np.argwhere(volume).astype(np.int32)
+
+
+# ==========================================
+# 工作进程 (每个进程只加载一次字体与字模缓存)
+# ==========================================
+_worker = None
+
+def _init_worker(font_path, font_size, glyph_folder):
+    global _worker
+    _worker = WordGenerator(font_path, font_size, glyph_folder)
+
+def _generate_batch(keys):
+    """Returns: ({键: 坐标}, {字模名: 位图}) 新光栅化的字模交回主进程统一保存"""
+    points = {key: _worker.generate(key) for key in keys}
+    glyphs = _worker.glyph_cache.unsaved
+    _worker.glyph_cache.unsaved = {}
+    return points, glyphs
+
 
 # ==========================================
-# 核心逻辑：3D 转换与缓存管理 (保持不变)
+# 核心逻辑：3D 词库管理
 # ==========================================
+def collect_script_keys(json_data):
+    """脚本中所有文字形状策略 (text_shape_3d 及脚本声明的 "points": "text" 策略) 需要的文字"""
+    needed_keys = set()
+    text_strategies = {"text_shape_3d"}
+    for name, spec in json_data.get("strategies", {}).items():
+        if isinstance(spec, dict) and spec.get("points") == "text":
+            text_strategies.add(name)
+        else:
+            text_strategies.discard(name)
+    if "firework" in json_data:
+        for group in json_data["firework"]:
+            events = group[1]
+            for event in events:
+                strategy = event.get("strategy")
+                if isinstance(strategy, dict):
+                    if strategy.get("name") in text_strategies:
+                        args = strategy.get("args", [])
+                        if args:
+                            needed_keys.add(args[0])
+    return needed_keys
+
+def read_word_list(path):
+    """纯文本词表: 每行一个词条, 空行与 # 开头的行被忽略"""
+    with open(path, "r", encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")}
+
+
 class Text3DManager:
-    def __init__(self, cache_file="../assets/models/word_bank_3d.pkl", font_size=16):
+    def __init__(self, cache_file="../assets/models/word_bank_3d.bin", font_size=16, font_path=FONT_PATH):
         self.cache_file = cache_file
         self.font_size = font_size
-        self.converter = CharToBitmap(size=font_size, font_path="../assets/fonts/SourceHanSansSC-Normal.otf")
-        self.data_3d = {}
-        self.data_2d_cache = {} 
+        self.font_path = font_path
+        self.glyph_folder = os.path.join(os.path.dirname(cache_file), "glyph_cache")
+        self.generator = WordGenerator(font_path, font_size, self.glyph_folder)
+        self.bank = WordBank(cache_file)
+        self.data_3d = {}   # 已解码或新生成的词条
+        self.unsaved = {}   # 新生成、尚未写入词库文件的词条
         self.load_cache()
 
     def load_cache(self):
-        """加载本地缓存"""
+        """映射本地词库 (只建立索引, 词条在 get_word_data 时才解码)"""
         if os.path.exists(self.cache_file):
             try:
-                with open(self.cache_file, "rb") as f:
-                    self.data_3d = pkl.load(f)
-                print(f"[TextManager] 已加载缓存: {len(self.data_3d)} 个词条")
+                self.bank.open()
+                print(f"[TextManager] 已加载缓存: {len(self.bank)} 个词条")
             except Exception as e:
                 print(f"[TextManager] 缓存损坏，将重新生成: {e}")
-                self.data_3d = {}
         else:
             print("[TextManager] 无缓存文件，初始化为空。")
 
     def save_cache(self):
-        """保存缓存到本地"""
+        """把新词条追加到本地词库 (不重写已有内容), 同时保存新光栅化的字模"""
         try:
-            folder = os.path.dirname(self.cache_file)
-            if folder and not os.path.exists(folder):
-                os.makedirs(folder)
-            
-            with open(self.cache_file, "wb") as f:
-                pkl.dump(self.data_3d, f)
+            self.generator.glyph_cache.save()
+        except Exception as e:
+            print(f"[TextManager] 保存字模缓存失败: {e}")
+        if not self.unsaved:
+            return
+        try:
+            self.bank.append(self.unsaved, self.generator.fingerprint)
+            self.unsaved = {}
             print(f"[TextManager] 缓存已保存至 {self.cache_file}")
         except Exception as e:
             print(f"[TextManager] 保存缓存失败: {e}")
+            return
+        if self.bank.garbage > self.bank.end * GC_RATIO:
+            self.collect_garbage()
 
-    def _get_2d_points(self, char):
-        """获取单字的 2D 点集 (带运行时缓存)"""
-        if char not in self.data_2d_cache:
-            self.data_2d_cache[char] = self.converter.get_coordinates_set(char)
-        return self.data_2d_cache[char]
+    def is_fresh(self, key):
+        """词库中的词条是否由当前的字体、字号与生成器生成"""
+        fingerprint = self.bank.fingerprint(key)
+        if fingerprint is None:
+            return False
+        return fingerprint == self.generator.fingerprint or not self.generator.can_generate
+
+    def has_word(self, key):
+        return key in self.data_3d or self.is_fresh(key)
+
+    def collect_garbage(self):
+        """压缩词库: 删除被覆盖的旧记录与已失效的词条 (失效词条下次使用时重新生成)"""
+        try:
+            freed = self.bank.compact(keep=lambda key, fingerprint: self.is_fresh(key))
+            print(f"[TextManager] 词库已压缩, 回收 {freed / 1024:.1f} KB, 剩余 {len(self.bank)} 个词条")
+        except Exception as e:
+            print(f"[TextManager] 压缩词库失败: {e}")
 
     def get_word_data(self, key):
-        """获取 3D 点数据。如果不存在，则自动生成。"""
+        """
+        获取 3D 点数据。如果不存在，则自动生成。
+        Returns: np.ndarray (N, 3) int32
+        """
         if key in self.data_3d:
             return self.data_3d[key]
-        
-        print(f"[TextManager] 生成新词条: '{key}' ...")
-        points_3d = self._generate_3d_geometry(key)
+
+        points_3d = self.bank.get(key) if self.is_fresh(key) else None
+        if points_3d is None:
+            if key in self.bank:
+                print(f"[TextManager] 词条已过期, 重新生成: '{key}' ...")
+            else:
+                print(f"[TextManager] 生成新词条: '{key}' ...")
+            points_3d = self.generator.generate(key)
+            self.unsaved[key] = points_3d
         self.data_3d[key] = points_3d
         return points_3d
 
-    def _generate_3d_geometry(self, key):
-        """执行 3D 几何生成的数学逻辑"""
-        parts = key.split("-")
-        points = []
-        fs = self.font_size
+    def generate_missing(self, keys, workers=None):
+        """
+        生成词库中缺失或已过期的词条, 数量较多时分发到进程池, 最后一次性写入词库
+        Args:
+            keys (iterable): 需要的词条
+            workers (int): 进程数, 默认为 CPU 核数; 1 表示只在主进程生成
+        Returns:
+            int: 新生成的词条数
+        """
+        missing = sorted(key for key in set(keys) if not self.has_word(key))
+        if not missing:
+            return 0
 
-        # --- 模式 1: 单字 (挤压拉伸) ---
-        if len(parts) == 1:
-            char = parts[0]
-            pixels = self._get_2d_points(char)
-            # 2D图的 y 是向下的 (0在上面)，翻转一下变成 z 向上
-            for x, z in pixels:
-                real_z = (fs - 1) - z 
-                points.append((x, 0, real_z))
-                points.append((x, 1, real_z))
-                points.append((x, -1, real_z))
-
-        # --- 模式 2: 双字 (正交交叉) ---
-        elif len(parts) == 2:
-            char_x = parts[0]
-            char_y = parts[1]
-            set_x = self._get_2d_points(char_x)
-            set_y = self._get_2d_points(char_y)
-
-            for i in range(fs): # x
-                for j in range(fs): # y
-                    for k in range(fs): # z (raw image y)
-                        if (i, k) in set_x and (j, k) in set_y:
-                            real_z = (fs - 1) - k
-                            points.append((i, j, real_z))
-
-        # --- 模式 3: 三字 (三视图交叉) ---
-        elif len(parts) == 3:
-            char_1 = parts[0]
-            char_2 = parts[1]
-            char_3 = parts[2]
-            set_1 = self._get_2d_points(char_1)
-            set_2 = self._get_2d_points(char_2)
-            set_3 = self._get_2d_points(char_3)
-            
-            for i in range(fs):
-                for j in range(fs):
-                    for k in range(fs):
-                        if (i, k) in set_1 and (j, k) in set_2 and (i, 15-j) in set_3:
-                            real_z = (fs - 1) - k
-                            points.append((i, j, real_z))
+        workers = workers or os.cpu_count() or 1
+        # 打包后的程序不使用多进程 (工作进程无法重新启动入口脚本)
+        if workers <= 1 or len(missing) < PARALLEL_THRESHOLD or getattr(sys, "frozen", False):
+            for key in missing:
+                self.get_word_data(key)
+        else:
+            print(f"[TextManager] 使用 {workers} 个进程生成 {len(missing)} 个新词条 ...")
+            # 按键排序后切成连续的块, 共用汉字的词条落在同一进程, 字模复用率更高
+            step = -(-len(missing) // (workers * 4))
+            chunks = [missing[i:i + step] for i in range(0, len(missing), step)]
+            glyph_cache = self.generator.glyph_cache
+            with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                     initargs=(self.font_path, self.font_size, self.glyph_folder)) as pool:
+                for points, glyphs in pool.map(_generate_batch, chunks):
+                    self.data_3d.update(points)
+                    self.unsaved.update(points)
+                    glyph_cache.unsaved.update(glyphs)
 
-        return points
+        self.save_cache()
+        return len(missing)
 
-    def scan_script_and_update(self, json_data):
+    def scan_script_and_update(self, json_data, workers=None):
         """扫描脚本 JSON，找出所有需要的文字，检查缺失并自动生成。"""
-        needed_keys = set()
-        if "firework" in json_data:
-            for group in json_data["firework"]:
-                events = group[1]
-                for event in events:
-                    strategy = event.get("strategy")
-                    if isinstance(strategy, dict):
-                        if strategy.get("name") == "text_shape_3d":
-                            args = strategy.get("args", [])
-                            if args:
-                                needed_keys.add(args[0])
-
-        dirty = False
-        for key in needed_keys:
-            if key not in self.data_3d:
-                self.get_word_data(key)
-                dirty = True
-        
-        if dirty:
-            self.save_cache()
+        if self.generate_missing(collect_script_keys(json_data), workers):
             print("[TextManager] 发现新词条，缓存已更新。")
         else:
             print("[TextManager] 所有词条完整，无需更新。")
@@ -214,13 +412,36 @@ _instance = None
 def get_manager(resource_path_func=None):
     global _instance
     if _instance is None:
-        path = "word_bank_3d.pkl"
+        path = "word_bank_3d.bin"
         if resource_path_func:
-            path = resource_path_func("word_bank_3d.pkl")
+            path = resource_path_func("word_bank_3d.bin")
         _instance = Text3DManager(path)
     return _instance
 
+def main():
+    parser = argparse.ArgumentParser(description="预生成 3D 文字词库")
+    parser.add_argument("sources", nargs="*",
+                        help="表演脚本 (.json) 或纯文本词表 (每行一个词条), 默认 ../config/config.json")
+    parser.add_argument("--bank", default="word_bank_3d.bin", help="词库文件路径")
+    parser.add_argument("--font", default=FONT_PATH, help="字体文件路径")
+    parser.add_argument("--font-size", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=None, help="进程数, 默认为 CPU 核数")
+    parser.add_argument("--gc", action="store_true", help="完成后压缩词库, 删除旧记录与失效词条")
+    args = parser.parse_args()
+
+    keys = set()
+    for path in args.sources or ["../config/config.json"]:
+        if path.endswith(".json"):
+            with open(path, "r", encoding="utf-8") as f:
+                keys |= collect_script_keys(json.load(f))
+        else:
+            keys |= read_word_list(path)
+
+    mgr = Text3DManager(args.bank, font_size=args.font_size, font_path=args.font)
+    count = mgr.generate_missing(keys, args.workers)
+    print(f"[TextManager] 共需要 {len(keys)} 个词条, 新生成 {count} 个, 词库现有 {len(mgr.bank)} 个")
+    if args.gc:
+        mgr.collect_garbage()
+
 if __name__ == "__main__":
-    mgr = Text3DManager()
-    mgr.get_word_data("测试")
-    mgr.save_cache()
+    main()
@@ -0,0 +1,380 @@
+"""
+外部触发 (Triggers)
+灯光台等外部设备通过 UDP 实时发射烟花. 后台线程接收数据报并解析, 放入 TriggerQueue;
+ShowDirector 每帧取出一批执行 (见 ShowDirector.launch_triggers), 网络收发与解析都不占用渲染线程.
+
+数据报格式 (两种都接受):
+    JSON: 一个 launch_to 事件, 字段与脚本相同, 例如
+          {"pos": [0, 0, 80], "time": 2.0, "color": "random", "strategy": "glitter", "cue": "A1"}
+          也可以是事件数组, 或 {"events": [...]}
+    OSC:  地址 /launch, 参数为一个 JSON 字符串 (同上), 或 x y z [time] 数值; 支持 OSC bundle
+
+积压控制:
+    - 队列满 (capacity) 时新触发直接丢弃 (背压), 不会让内存与延迟无限增长
+    - 每帧最多发射 max_per_frame 个烟花弹 (各触发的 repeat 之和), 其余触发留到下一帧
+    - 同一帧内 "cue" 相同的触发合并为一次 (灯光台重复发送同一个 cue)
+    - 等待超过 max_delay 秒的触发视为过期丢弃
+从收到数据报到烟花弹生成的延迟逐个记录, 每 report_interval 秒输出一次统计.
+
+脚本顶层的 "triggers" 对象开启窗口演出中的触发端口:
+    "triggers": {"port": 9000, "max_per_frame": 32}
+
+测试 (在 src 目录下):
+    python triggers.py listen [脚本路径] [--port 9000] [--duration 30]    无窗口实时演出 + 触发端口
+    python triggers.py send [--port 9000] [--rate 500] [--count 2000] [--osc] [--cues 8]
+"""
+import argparse
+import json
+import random
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+PORT = 9000
+OSC_ADDRESSES = ("/launch", "/firework/launch")
+
+
+class Trigger:
+    """一个已解析的触发: 事件, 收到的时刻 (perf_counter), 序号与要发射的烟花弹数"""
+    __slots__ = ("event", "received", "seq", "cost")
+
+    def __init__(self, event, received, seq):
+        self.event = event
+        self.received = received
+        self.seq = seq
+        self.cost = max(int(event.get("repeat", 1)), 1)
+
+
+class TriggerQueue:
+    """
+    网络线程 -> 主线程的触发队列
+    只有一个生产者 (接收线程) 与一个消费者 (ShowDirector), collections.deque 的 append / popleft
+    在 CPython 中是原子操作, 因此两边都不需要加锁. 计数器按键分属两侧, 各自只写自己的键.
+
+    Args:
+        capacity (int): 队列上限, 满后新触发被丢弃
+        max_per_frame (int): 每帧最多发射的烟花弹数, 按各触发的 repeat 之和计 (单个触发的 repeat 不能超过它)
+        max_delay (float): 等待超过此时间 (秒) 的触发被丢弃
+        report_interval (float): 统计输出间隔 (秒), 0 表示不输出
+    """
+    def __init__(self, capacity=2048, max_per_frame=32, max_delay=0.5, report_interval=10.0):
+        self.capacity = capacity
+        self.max_per_frame = max_per_frame
+        self.max_delay = max_delay
+        self.report_interval = report_interval
+        self._items = deque()
+        self._seq = 0
+        # 接收线程写: received / dropped / invalid; 主线程写: 其余
+        self.stats = dict.fromkeys(("received", "dropped", "invalid", "stale", "coalesced", "rejected",
+                                    "launched"), 0)
+        self.latency = deque(maxlen=4096)  # 最近的触发 -> 发射延迟 (秒)
+        self._last_report = time.perf_counter()
+        self._reported = dict(self.stats)
+
+    def __len__(self):
+        return len(self._items)
+
+    def push(self, event, received):
+        """(接收线程) 放入一个触发 (已由 parse_datagram 检查); 队列已满时丢弃并返回 False"""
+        self.stats["received"] += 1
+        if len(self._items) >= self.capacity:
+            self.stats["dropped"] += 1
+            return False
+        self._items.append(Trigger(event, received, self._seq))
+        self._seq += 1
+        return True
+
+    def drain(self):
+        """
+        (主线程, 每帧一次) 取出本帧要执行的触发: 跳过过期的, 合并同一 cue 的,
+        发射数之和不超过 max_per_frame; 放不下的触发留在队首, 下一帧优先执行
+        """
+        now = time.perf_counter()
+        if self.report_interval and now - self._last_report >= self.report_interval:
+            self._report(now)
+        batch = []
+        cues = set()
+        items = self._items
+        budget = self.max_per_frame
+        while items and budget > 0:
+            trigger = items[0]
+            if now - trigger.received > self.max_delay:
+                items.popleft()
+                self.stats["stale"] += 1
+                continue
+            cue = trigger.event.get("cue")
+            if cue is not None and cue in cues:
+                items.popleft()
+                self.stats["coalesced"] += 1
+                continue
+            # 超出预算的触发由 compile_live 拒绝, 单独成批以免卡住队列
+            if trigger.cost > budget and batch:
+                break
+            items.popleft()
+            if cue is not None:
+                cues.add(cue)
+            budget -= trigger.cost
+            batch.append(trigger)
+        return batch
+
+    def record(self, trigger):
+        """(主线程) 触发已发射, 记录延迟"""
+        self.stats["launched"] += 1
+        self.latency.append(time.perf_counter() - trigger.received)
+
+    def reject(self, trigger, error):
+        self.stats["rejected"] += 1
+        print(f"[Trigger] 忽略无效事件: {error}")
+
+    def summary(self):
+        """累计计数与最近延迟的分位数 (毫秒)"""
+        result = dict(self.stats, queued=len(self._items))
+        if self.latency:
+            ms = np.array(self.latency) * 1000
+            result.update(latency_p50=round(float(np.percentile(ms, 50)), 2),
+                          latency_p99=round(float(np.percentile(ms, 99)), 2),
+                          latency_max=round(float(ms.max()), 2))
+        return result
+
+    def _report(self, now):
+        delta = {key: self.stats[key] - self._reported[key] for key in self.stats}
+        self._last_report = now
+        self._reported = dict(self.stats)
+        if not delta["received"]:
+            return
+        line = (f"[Trigger] {self.report_interval:.0f} s 内收到 {delta['received']}, 发射 {delta['launched']}, "
+                f"合并 {delta['coalesced']}, 丢弃 {delta['dropped'] + delta['stale']} "
+                f"(队列满 {delta['dropped']}, 过期 {delta['stale']}), 无效 {delta['invalid'] + delta['rejected']}")
+        if self.latency:
+            ms = np.array(self.latency) * 1000
+            line += f"; 延迟 p50 {np.percentile(ms, 50):.1f} ms, p99 {np.percentile(ms, 99):.1f} ms"
+        print(line)
+
+
+def _osc_string(data, i):
+    end = data.index(b"\0", i)
+    return data[i:end].decode("utf-8"), (end + 4) & ~3
+
+
+def parse_osc(data):
+    """
+    解析 OSC 消息或 bundle (只支持常用的参数类型)
+    Returns:
+        list: [(地址, 参数列表)]
+    """
+    if data.startswith(b"#bundle\0"):
+        messages = []
+        i = 16  # "#bundle\0" + 8 字节时间标签
+        while i + 4 <= len(data):
+            size = struct.unpack_from(">i", data, i)[0]
+            messages += parse_osc(data[i + 4:i + 4 + size])
+            i += 4 + size
+        return messages
+
+    address, i = _osc_string(data, 0)
+    tags, i = _osc_string(data, i)
+    args = []
+    for tag in tags[1:]:
+        if tag in "if":
+            args.append(struct.unpack_from(">" + tag, data, i)[0])
+            i += 4
+        elif tag in "hd":
+            args.append(struct.unpack_from(">q" if tag == "h" else ">d", data, i)[0])
+            i += 8
+        elif tag == "s":
+            value, i = _osc_string(data, i)
+            args.append(value)
+        elif tag == "b":
+            size = struct.unpack_from(">i", data, i)[0]
+            i += 4 + ((size + 3) & ~3)
+        elif tag in "TFN":
+            args.append({"T": True, "F": False, "N": None}[tag])
+        else:
+            raise ValueError(f"不支持的 OSC 参数类型 {tag}")
+    return [(address, args)]
+
+
+def encode_osc(address, args):
+    """编码一条 OSC 消息 (参数为 str / int / float), 供测试发送端使用"""
+    def pad(raw):
+        raw += b"\0"
+        return raw + b"\0" * (-len(raw) % 4)
+    tags, body = ",", b""
+    for arg in args:
+        if isinstance(arg, str):
+            tags += "s"
+            body += pad(arg.encode("utf-8"))
+        elif isinstance(arg, int):
+            tags += "i"
+            body += struct.pack(">i", arg)
+        else:
+            tags += "f"
+            body += struct.pack(">f", arg)
+    return pad(address.encode("utf-8")) + pad(tags.encode("utf-8")) + body
+
+
+def parse_datagram(data):
+    """
+    把一个数据报解析为事件列表 (只检查结构, 字段由 Timeline.compile_live 校验)
+    Raises:
+        ValueError: 无法解析
+    """
+    if data[:1] in (b"/", b"#"):
+        events = []
+        for address, args in parse_osc(data):
+            if address not in OSC_ADDRESSES:
+                raise ValueError(f"未知的 OSC 地址 {address}")
+            if args and isinstance(args[0], str):
+                events.append(json.loads(args[0]))
+            elif len(args) >= 3:
+                event = {"pos": [float(a) for a in args[:3]]}
+                if len(args) > 3:
+                    event["time"] = float(args[3])
+                events.append(event)
+            else:
+                raise ValueError("OSC /launch 需要 JSON 字符串或 x y z [time]")
+    else:
+        obj = json.loads(data)
+        events = obj.get("events", [obj]) if isinstance(obj, dict) else obj
+    if not isinstance(events, list) or not all(isinstance(e, dict) for e in events):
+        raise ValueError("事件应为 JSON 对象")
+    for event in events:
+        # 在接收线程上先检查队列自身要用的字段, 其余字段由 Timeline.compile_live 校验
+        cue = event.get("cue")
+        if cue is not None and (isinstance(cue, bool) or not isinstance(cue, (str, int))):
+            raise ValueError(f"cue 应为字符串或整数: {cue!r}")
+        repeat = event.get("repeat", 1)
+        if isinstance(repeat, bool) or not isinstance(repeat, (int, float)) or not 1 <= repeat < 2 ** 31:
+            raise ValueError(f"repeat 应为正整数: {repeat!r}")
+    return events
+
+
+class TriggerServer:
+    """
+    后台线程上的 UDP 触发端口
+    Args:
+        port (int): 监听端口
+        host (str): 监听地址
+        **options: 传给 TriggerQueue
+    """
+    def __init__(self, port=PORT, host="0.0.0.0", **options):
+        self.queue = TriggerQueue(**options)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self.sock.bind((host, port))
+        self.sock.settimeout(0.2)  # 定期检查是否已关闭
+        self._running = True
+        self.thread = threading.Thread(target=self._run, name="TriggerServer", daemon=True)
+        self.thread.start()
+        print(f"[Trigger] 监听 UDP {host}:{port} (JSON 或 OSC {OSC_ADDRESSES[0]})")
+
+    def _run(self):
+        queue = self.queue
+        while self._running:
+            try:
+                data = self.sock.recv(65536)
+            except socket.timeout:
+                continue
+            except OSError:
+                if not self._running:
+                    break
+                continue
+            received = time.perf_counter()
+            try:
+                events = parse_datagram(data)
+            except Exception:  # 来自网络的任意数据 (包括嵌套过深的 JSON) 都不能结束接收线程
+                queue.stats["invalid"] += 1
+                continue
+            for event in events:
+                queue.push(event, received)
+
+    def close(self):
+        self._running = False
+        self.thread.join()
+        self.sock.close()
+
+
+def send(host="127.0.0.1", port=PORT, rate=200.0, count=1000, osc=False, cues=0):
+    """测试发送端: 以 rate 个/秒发送 count 个随机 launch_to 事件; cues > 0 时在这么多个 cue 中轮换"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    start = time.perf_counter()
+    for i in range(count):
+        event = {"pos": [random.uniform(-40, 40), random.uniform(-40, 40), random.uniform(50, 90)],
+                 "time": random.uniform(1.5, 2.5), "color": "random",
+                 "strategy": random.choice(["standard", "glitter", "standard_rc"])}
+        if cues:
+            event["cue"] = f"cue{i % cues}"
+        payload = json.dumps(event)
+        sock.sendto(encode_osc(OSC_ADDRESSES[0], [payload]) if osc else payload.encode("utf-8"), (host, port))
+        delay = start + (i + 1) / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    print(f"[Trigger] 已发送 {count} 个触发 ({time.perf_counter() - start:.2f} s)")
+
+
+def listen(data, port=PORT, duration=30.0, fps=60, seed=0, **options):
+    """无窗口实时演出 + 触发端口, 结束时输出累计统计 (用于测量延迟)"""
+    from headless import HeadlessApp, HeadlessShow
+    from main import ParticleSystem
+
+    server = TriggerServer(port, **options)
+    app = HeadlessApp()
+    app.triggers = server.queue
+    show = HeadlessShow(data, seed=seed, fps=fps, app=app)
+    start = time.perf_counter()
+    frame_cost = []
+    try:
+        while show.time < duration:
+            t0 = time.perf_counter()
+            show.step()
+            frame_cost.append(time.perf_counter() - t0)
+            delay = start + show.time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    summary = server.queue.summary()
+    cost = np.array(frame_cost) * 1000
+    summary.update(frames=len(cost), frame_p50_ms=round(float(np.percentile(cost, 50)), 2),
+                   frame_p99_ms=round(float(np.percentile(cost, 99)), 2),
+                   peak_live=int(ParticleSystem.store.peak_live))
+    print(json.dumps(summary, ensure_ascii=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="外部触发端口与测试发送端")
+    sub = parser.add_subparsers(dest="mode", required=True)
+    listen_parser = sub.add_parser("listen", help="无窗口实时演出并接收触发")
+    listen_parser.add_argument("script", nargs="?", help="表演脚本路径 (默认 config/config.json)")
+    listen_parser.add_argument("--port", type=int, default=PORT)
+    listen_parser.add_argument("--duration", type=float, default=30.0)
+    listen_parser.add_argument("--seed", type=int, default=0)
+    listen_parser.add_argument("--max-per-frame", type=int, default=32)
+    listen_parser.add_argument("--capacity", type=int, default=2048)
+    send_parser = sub.add_parser("send", help="发送随机 launch_to 事件")
+    send_parser.add_argument("--host", default="127.0.0.1")
+    send_parser.add_argument("--port", type=int, default=PORT)
+    send_parser.add_argument("--rate", type=float, default=200.0, help="每秒发送数")
+    send_parser.add_argument("--count", type=int, default=1000)
+    send_parser.add_argument("--osc", action="store_true", help="以 OSC /launch 消息发送")
+    send_parser.add_argument("--cues", type=int, default=0, help="在这么多个 cue 中轮换 (测试合并)")
+    args = parser.parse_args()
+
+    if args.mode == "send":
+        send(args.host, args.port, args.rate, args.count, args.osc, args.cues)
+        return
+    from main import load_script, prepare_text_resources
+    data = load_script(args.script)
+    prepare_text_resources(data)
+    listen(data, args.port, args.duration, seed=args.seed, max_per_frame=args.max_per_frame,
+           capacity=args.capacity)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+词库二进制格式 (Word Bank)
+取代 pickle: 文件可被 mmap 打开, 只在需要时解码单个词条, 新词条直接追加到文件末尾.
+
+文件布局 (小端):
+    文件头: MAGIC(4s) 版本(u16) 保留(u16)
+    记录 * N: 键长度(u16) 数据类型(u8) 保留(u8) 点数(u32) 指纹(u64) | 键 (UTF-8) | 坐标 (点数 x 3, int8 或 int16)
+
+指纹标记生成该词条时的输入 (字体、字号、生成器版本), 0 表示来源未知.
+同一个键出现多次时以最后一条记录为准, 被覆盖的记录成为垃圾, 由 compact() 回收.
+打开时只扫描记录头建立 键 -> 偏移 索引, 末尾不完整的记录 (写入中断) 会被忽略, 并在下一次追加时覆盖.
+
+用法 (在 src 目录下, 把旧版 pickle 词库转换为新格式):
+    python word_bank.py word_bank_3d.pkl word_bank_3d.bin
+"""
+import mmap
+import os
+import struct
+import sys
+
+import numpy as np
+
+MAGIC = b"FWWB"
+VERSION = 2
+
+_HEADER = struct.Struct("<4sHH")
+_RECORD = struct.Struct("<HBBIQ")
+# 数据类型编号 -> 坐标存储类型
+_DTYPES = {1: np.dtype("<i1"), 2: np.dtype("<i2")}
+
+
+def _encode(key, points, fingerprint=0):
+    """把一个词条编码为一条记录, 坐标按取值范围选用 int8 或 int16"""
+    pts = np.asarray(points, dtype=np.int64).reshape(-1, 3)
+    key_bytes = key.encode("utf-8")
+    if len(key_bytes) > 0xFFFF:
+        raise ValueError(f"词条的键过长: {key[:20]}...")
+    for code, dtype in _DTYPES.items():
+        info = np.iinfo(dtype)
+        if len(pts) == 0 or (pts.min() >= info.min and pts.max() <= info.max):
+            break
+    else:
+        raise ValueError(f"词条 '{key}' 的坐标超出 int16 范围")
+    header = _RECORD.pack(len(key_bytes), code, 0, len(pts), fingerprint)
+    return header + key_bytes + pts.astype(dtype).tobytes()
+
+
+class WordBank:
+    """
+    只追加的 3D 词库文件
+    Args:
+        path (str): 词库文件路径, 不存在时在第一次追加时创建
+    构造后需调用 open() 映射已有文件
+    """
+    def __init__(self, path):
+        self.path = path
+        self.index = {}  # 键 -> (记录偏移, 坐标偏移, 点数, 存储类型, 指纹)
+        self.end = 0     # 最后一条完整记录的结尾 (0 = 需要写入文件头)
+        self.garbage = 0 # 被覆盖的旧记录占用的字节数
+        self._file = None
+        self._mm = None
+
+    def open(self):
+        """
+        (重新) 映射文件并建立索引
+        文件头无效时抛出 ValueError, 此时词库视为空, 下一次追加会重写整个文件
+        """
+        self.close()
+        self.index = {}
+        self.end = 0
+        self.garbage = 0
+        if not os.path.exists(self.path) or os.path.getsize(self.path) < _HEADER.size:
+            return
+        self._file = open(self.path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _ = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"不是有效的词库文件 (版本 {VERSION}): {self.path}")
+        self._scan(_HEADER.size)
+
+    def _scan(self, offset):
+        """从 offset 开始扫描记录头, 不解码坐标"""
+        mm = self._mm
+        size = len(mm)
+        while offset + _RECORD.size <= size:
+            key_len, code, _, count, fingerprint = _RECORD.unpack_from(mm, offset)
+            dtype = _DTYPES.get(code)
+            if dtype is None:
+                break
+            start = offset + _RECORD.size + key_len
+            end = start + count * 3 * dtype.itemsize
+            if end > size:
+                break
+            try:
+                key = mm[offset + _RECORD.size:start].decode("utf-8")
+            except UnicodeDecodeError:
+                break  # 与不完整的记录相同: 之前的记录有效, 下一次追加从这里覆盖
+            old = self.index.get(key)
+            if old is not None:
+                self.garbage += self._record_size(old)
+            self.index[key] = (offset, start, count, dtype, fingerprint)
+            offset = end
+        self.end = offset
+
+    @staticmethod
+    def _record_size(entry):
+        offset, start, count, dtype, _ = entry
+        return start - offset + count * 3 * dtype.itemsize
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def keys(self):
+        return self.index.keys()
+
+    def fingerprint(self, key):
+        """词条的指纹, 词条不存在时为 None"""
+        entry = self.index.get(key)
+        return None if entry is None else entry[4]
+
+    def get(self, key):
+        """
+        解码单个词条
+        Returns:
+            np.ndarray | None: (N, 3) int32 坐标, 词条不存在时为 None
+        """
+        entry = self.index.get(key)
+        if entry is None:
+            return None
+        _, start, count, dtype, _ = entry
+        # astype 产生独立副本, 不保留对 mmap 的引用 (否则无法重新映射)
+        return np.frombuffer(self._mm, dtype, count * 3, start).reshape(count, 3).astype(np.int32)
+
+    def append(self, entries, fingerprint=0):
+        """
+        把 {键: 坐标} 追加到文件末尾, 已有内容不会被重写
+        Args:
+            fingerprint (int): 这批词条的指纹
+        """
+        if not entries:
+            return
+        records = b"".join(_encode(key, points, fingerprint) for key, points in entries.items())
+        old_end = self.end
+        self.close()  # 部分平台不允许截断仍在映射中的文件
+
+        folder = os.path.dirname(self.path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        mode = "r+b" if old_end else "wb"
+        with open(self.path, mode) as f:
+            if old_end:
+                f.seek(old_end)
+                f.truncate()  # 丢弃末尾不完整的记录
+            else:
+                f.write(_HEADER.pack(MAGIC, VERSION, 0))
+            f.write(records)
+
+        # 重新映射, 只扫描新追加的部分 (已有索引保持不变)
+        self._file = open(self.path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._scan(old_end or _HEADER.size)
+
+    def compact(self, keep=None):
+        """
+        回收垃圾: 只保留每个键的最新记录 (且 keep(键, 指纹) 为真), 写入临时文件后替换
+        记录按原样复制, 不解码坐标
+        Returns:
+            int: 回收的字节数
+        """
+        if not self.end:
+            return 0
+        mm = self._mm
+        records = [mm[entry[0]:entry[0] + self._record_size(entry)]
+                   for key, entry in sorted(self.index.items(), key=lambda item: item[1][0])
+                   if keep is None or keep(key, entry[4])]
+        old_size = self.end
+        self.close()
+
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, 0))
+            f.write(b"".join(records))
+        os.replace(tmp, self.path)
+        self.open()
+        return old_size - self.end
+
+
+def import_pickle(pkl_path, bank_path):
+    """
+    把旧版 pickle 词库转换为新格式
+    注意: pickle 加载可以执行任意代码, 只转换自己生成的可信文件
+    """
+    import pickle as pkl
+    with open(pkl_path, "rb") as f:
+        data = pkl.load(f)
+    bank = WordBank(bank_path)
+    bank.open()
+    # 旧词库不记录生成条件, 指纹为 0 (来源未知)
+    bank.append({key: points for key, points in data.items() if key not in bank})
+    print(f"[WordBank] 已转换 {len(data)} 个词条 -> {bank_path}")
+    bank.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("用法: python word_bank.py <旧词库.pkl> <新词库.bin>")
+        sys.exit(1)
+    import_pickle(sys.argv[1], sys.argv[2])